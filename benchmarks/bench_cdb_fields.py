@@ -0,0 +1,66 @@
+"""
+CDB 필드 접근 microbenchmark
+
+READ(16) 의 LBA 와 TRANSFER LENGTH 를 설정하는 비용을 cffi 를 거치던
+이전 방식과 `CDBField` / `Command.set()` 으로 비교한다.
+
+    python benchmarks/bench_cdb_fields.py -n 1000000
+"""
+from pysg import _pysg
+from pysg.cmd import Command
+import argparse
+import timeit
+
+
+class Read16(Command):
+    lba = Command.command_property(2, 9)
+    transfer_length = Command.command_property(10, 13)
+    fua = Command.command_property((1, 3))
+
+
+class LegacyRead16(object):
+    # 이전 `command_property` 가 하던 것처럼 cdata 를 cast 하고
+    # htobe/betoh 를 호출해서 필드를 설정한다.
+    def __init__(self):
+        self._cdb = _pysg.ffi.new('uint8_t[16]', b'\x88')
+
+    def set(self, lba, transfer_length):
+        cast = _pysg.ffi.cast
+        lib = _pysg.lib
+        p = cast('uint64_t *', self._cdb[2:10])
+        p[0] = lib.htobe64(lib.be64toh(p[0]) & 0 | lba)
+        p = cast('uint32_t *', self._cdb[10:14])
+        p[0] = lib.htobe32(lib.be32toh(p[0]) & 0 | transfer_length)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    legacy = LegacyRead16()
+    cmd = Read16(b'\x88')
+
+    def set_legacy():
+        legacy.set(0x12345678, 8)
+
+    def set_props():
+        cmd.lba = 0x12345678
+        cmd.transfer_length = 8
+
+    def set_bulk():
+        cmd.set(lba=0x12345678, transfer_length=8)
+
+    def get_props():
+        return cmd.lba, cmd.transfer_length
+
+    for name, fn in (('legacy cffi set', set_legacy),
+                     ('property set', set_props),
+                     ('Command.set()', set_bulk),
+                     ('property get', get_props)):
+        t = timeit.timeit(fn, number=args.count)
+        print("{:16s} {:8.1f} ns/op".format(name, t / args.count * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+`pysg.cmd.command()` 의 CDB 해석 속도 benchmark
+
+vendor specific opcode (0xc0 ~ 0xff) 마다 service action 별 하위 command 를
+등록한 큰 catalog 를 만들고, 무작위로 만든 CDB trace 를 이전의 선형 탐색
+방식과 색인을 사용하는 현재 방식으로 해석하는 데 걸리는 시간을 비교한다.
+
+    python benchmarks/bench_cmd_dispatch.py -n 100000
+"""
+from pysg.cmd import Command, command
+import argparse
+import random
+import time
+
+
+def build_catalog(service_actions: int):
+    for op in range(0xc0, 0x100):
+        parent = type('Vendor{:02x}'.format(op), (Command,), {
+            'service_action': Command.command_property((1, 4), 1),
+            'lba': Command.command_property(2, 9),
+        })
+        Command.register(opcode=op)(parent)
+        for sa in range(service_actions):
+            child = type('Vendor{:02x}_{:02x}'.format(op, sa), (parent,), {})
+            parent.register(service_action=sa)(child)
+
+
+def legacy_command(seq, peri_type=0):
+    # 색인이 추가되기 전의 `command()`
+    cmd = Command(seq, peri_type)
+    ok = True
+    while cmd._command_map and ok:
+        ok = True
+        for cond, c in cmd._command_map:
+            ok = True
+            for k, v in cond:
+                if not hasattr(v, '__contains__'):
+                    v = (v,)
+                if getattr(cmd, k) not in v:
+                    ok = False
+                    break
+            if ok:
+                cmd = c(seq=seq, peri_type=peri_type)
+                break
+    return cmd
+
+
+def make_trace(count: int, service_actions: int):
+    rnd = random.Random(0)
+    trace = []
+    for _ in range(count):
+        op = rnd.randrange(0xc0, 0x100)
+        sa = rnd.randrange(service_actions)
+        trace.append(bytes([op, sa]) + rnd.getrandbits(64).to_bytes(8, 'big') +
+                     bytes(6))
+    return trace
+
+
+def run(fn, trace) -> float:
+    start = time.perf_counter()
+    for seq in trace:
+        fn(seq)
+    return len(trace) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=50000)
+    parser.add_argument('-s', '--service-actions', type=int, default=32)
+    args = parser.parse_args()
+
+    build_catalog(args.service_actions)
+    trace = make_trace(args.count, args.service_actions)
+    assert all(type(command(seq)) is type(legacy_command(seq))
+               for seq in trace[:1000])
+
+    legacy = run(legacy_command, trace)
+    indexed = run(command, trace)
+    print("linear scan: {:10.1f} CDBs/s".format(legacy))
+    print("indexed:     {:10.1f} CDBs/s ({:.1f}x)".format(indexed,
+                                                         indexed / legacy))
+
+
+if __name__ == '__main__':
+    main()
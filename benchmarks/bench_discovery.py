@@ -0,0 +1,68 @@
+"""
+`pysg.discovery.discover()` benchmark
+
+지연 시간이 있는 `EmulatedTarget` 장치 N 개를 한 thread 에서 차례로
+`identify()` 하는 경우, `discover()` 로 동시에 조사하는 경우, inventory
+cache 가 있는 상태에서 다시 `discover()` 하는 경우의 시간을 비교한다.
+cache 가 장치 파일을 stat 할 수 있도록 임시 디렉토리에 빈 파일을 만들어
+경로로 사용한다.
+
+    python benchmarks/bench_discovery.py --devices 60 --latency 0.005
+"""
+from pysg.discovery import discover, identify
+from pysg.emulation import EmulatedTarget
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help="target 의 command 처리 시간 (초)")
+    parser.add_argument('--changed', type=int, default=1,
+                        help="cache 를 만든 뒤 바뀐 것으로 표시할 장치 수")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = {}
+        for i in range(args.devices):
+            path = os.path.join(tmp, 'sg{}'.format(i))
+            open(path, 'w').close()
+            targets[path] = EmulatedTarget(blocks=1 << 20, latency=args.latency,
+                                           serial='EMU{:08d}'.format(i))
+        opened = []
+
+        def factory(path, **kwargs):
+            opened.append(path)
+            return targets[path].device(path)
+
+        start = time.perf_counter()
+        for path in targets:
+            with factory(path) as dev:
+                identify(dev)
+        serial = time.perf_counter() - start
+
+        cache = os.path.join(tmp, 'inventory.json')
+        start = time.perf_counter()
+        first = discover(targets, device_factory=factory, cache=cache)
+        parallel = time.perf_counter() - start
+
+        for path in list(targets)[:args.changed]:
+            os.utime(path)
+        del opened[:]
+        start = time.perf_counter()
+        second = discover(targets, device_factory=factory, cache=cache)
+        cached = time.perf_counter() - start
+        assert first == second
+
+    print("{:24s} {:10.3f} s".format('serial identify()', serial))
+    print("{:24s} {:10.3f} s {:7.1f}x".format('discover()', parallel, serial / parallel))
+    print("{:24s} {:10.3f} s {:7.1f}x  ({} re-probed)".format(
+          'discover() with cache', cached, serial / cached, len(opened)))
+
+
+if __name__ == '__main__':
+    main()
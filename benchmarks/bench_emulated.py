@@ -0,0 +1,173 @@
+"""
+`pysg.emulation.EmulatedTarget` 을 사용하는 benchmark 모음
+
+실제 장치 없이 `Device`, `PTObject`, `Sense`, `CommandQueue` 를 통과하는
+비용만 측정한다. 시나리오마다 command/s, latency 백분위, tracemalloc 으로
+잰 command 당 남은 메모리 블록 수와 최대 메모리 사용량을 출력한다.
+
+`--json` 으로 결과를 저장하고 `--baseline` 으로 이전 결과와 비교하면
+command/s 가 `--tolerance` 이상 떨어진 시나리오가 있을 때 1 로 종료한다.
+
+    python benchmarks/bench_emulated.py -n 20000 --json before.json
+    python benchmarks/bench_emulated.py -n 20000 --baseline before.json
+"""
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.enum import SenseKeyCodes
+from pysg.metrics import LatencyHistogram
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+
+def read16(lba: int, blocks: int):
+    return command(b'\x88\x00' + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def sync_loop(dev, make, count: int, data_in=None, release=False, try_=False):
+    hist = LatencyHistogram()
+    run = dev.try_command if try_ else dev.command
+    clock = time.perf_counter_ns
+    start = clock()
+    for i in range(count):
+        t = clock()
+        obj = run(make(i), data_in=data_in)
+        hist.record((clock() - t) // 1000)
+        if release:
+            (obj.obj if try_ else obj).release()
+    return count / ((clock() - start) / 1e9), hist
+
+
+def scenario_tur(target, count):
+    with target.device() as dev:
+        tur = command(b'\x00' * 6)
+        return sync_loop(dev, lambda i: tur, count)
+
+
+def scenario_read(target, count, pool=False, quiet=False):
+    with target.device() as dev:
+        if pool:
+            dev.enable_pt_pool()
+        dev.quiet = quiet
+        buf = bytearray(8 * target.block_size)
+        blocks = target.blocks - 8
+        return sync_loop(dev, lambda i: read16(i * 8 % blocks, 8), count,
+                         data_in=buf, release=pool)
+
+
+def scenario_check_condition(target, count):
+    # 매 command 가 CHECK CONDITION 으로 실패하는 polling 상황
+    with target.device() as dev:
+        target.inject(SenseKeyCodes.NOT_READY, 0x04, 0x01, opcode=0x00, count=count)
+        tur = command(b'\x00' * 6)
+        try:
+            return sync_loop(dev, lambda i: tur, count, try_=True)
+        finally:
+            target.clear_injections()
+
+
+def scenario_queue(target, count, depth=32):
+    with target.device() as dev:
+        queue = dev.command_queue(depth)
+        bufs = [bytearray(8 * target.block_size) for _ in range(depth)]
+        blocks = target.blocks - 8
+        hist = LatencyHistogram()
+        submitted = {}
+        clock = time.perf_counter_ns
+        start = clock()
+        issued = done = 0
+        free = list(range(depth))
+        while done < count:
+            while free and issued < count:
+                slot = free.pop()
+                req = queue.submit(read16(issued * 8 % blocks, 8), data_in=bufs[slot])
+                submitted[id(req)] = (slot, clock())
+                issued += 1
+            for req in queue.reap(1):
+                slot, t = submitted.pop(id(req))
+                hist.record((clock() - t) // 1000)
+                free.append(slot)
+                done += 1
+        return count / ((clock() - start) / 1e9), hist
+
+
+SCENARIOS = {
+    'tur': scenario_tur,
+    'read4k': scenario_read,
+    'read4k-pool-quiet': lambda t, n: scenario_read(t, n, pool=True, quiet=True),
+    'check-condition': scenario_check_condition,
+    'read4k-queue32': scenario_queue,
+}
+
+
+def allocations(fn, target, count: int):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn(target, count)
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    blocks = sum(s.count_diff for s in after.compare_to(before, 'filename'))
+    return blocks / count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="target 의 command 처리 시간 (초)")
+    parser.add_argument('--json', help="결과를 저장할 파일")
+    parser.add_argument('--baseline', help="비교할 이전 결과")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    target = EmulatedTarget(blocks=1 << 16, latency=args.latency)
+    results = {}
+    print("{:20s} {:>12s} {:>9s} {:>9s} {:>9s} {:>12s} {:>10s}".format(
+          'scenario', 'commands/s', 'p50 us', 'p99 us', 'max us',
+          'blocks/cmd', 'peak KiB'))
+    for name in args.scenarios:
+        fn = SCENARIOS[name]
+        fn(target, min(args.count, 1000))
+        rate, hist = fn(target, args.count)
+        blocks, peak = allocations(fn, target, min(args.count, 2000))
+        results[name] = {
+            'commands_per_sec': rate,
+            'p50_us': hist.percentile(50),
+            'p99_us': hist.percentile(99),
+            'max_us': hist.max,
+            'blocks_per_command': blocks,
+            'peak_bytes': peak,
+        }
+        print("{:20s} {:12.1f} {:9d} {:9d} {:9d} {:12.3f} {:10.1f}".format(
+              name, rate, hist.percentile(50), hist.percentile(99), hist.max,
+              blocks, peak / 1024))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, res in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]['commands_per_sec']
+            change = res['commands_per_sec'] / before - 1
+            slow = change < -args.tolerance
+            failed = failed or slow
+            print("{:20s} {:+7.1f}%{}".format(name, change * 100,
+                                              ' REGRESSION' if slow else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
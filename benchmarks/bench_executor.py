@@ -0,0 +1,68 @@
+"""
+`pysg.executor.DevicePool` scaling benchmark
+
+지연 시간이 있는 `EmulatedTarget` 장치 1 ~ N 개에 READ(16) 을 보내면서,
+한 thread 에서 장치들을 차례로 사용하는 경우와 `DevicePool` 로 장치마다
+worker 를 두는 경우의 전체 command/s 를 비교한다.
+
+    python benchmarks/bench_executor.py -n 200 --latency 0.001 --max-devices 32
+"""
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.executor import DevicePool
+import argparse
+import time
+
+
+def read16(lba: int, blocks: int):
+    return command(b'\x88\x00' + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def run_commands(dev, count: int):
+    buf = bytearray(4096)
+    for i in range(count):
+        dev.command(read16(i * 8 % 4096, 8), data_in=buf)
+    return count
+
+
+def serial(devices, count: int) -> float:
+    start = time.perf_counter()
+    for dev in devices:
+        run_commands(dev, count)
+    return len(devices) * count / (time.perf_counter() - start)
+
+
+def pooled(devices, count: int) -> float:
+    with DevicePool(devices) as pool:
+        start = time.perf_counter()
+        futures = pool.map(run_commands, count)
+        total = sum(f.result() for f in futures.values())
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=200,
+                        help="장치 당 command 수")
+    parser.add_argument('--latency', type=float, default=0.001)
+    parser.add_argument('--max-devices', type=int, default=16)
+    args = parser.parse_args()
+
+    print("{:>8s} {:>14s} {:>14s} {:>8s}".format('devices', 'serial cmd/s',
+                                                 'pool cmd/s', 'speedup'))
+    n = 1
+    while n <= args.max_devices:
+        targets = [EmulatedTarget(blocks=4096 + 8, latency=args.latency,
+                                  serial='EMU{:08d}'.format(i)) for i in range(n)]
+        devices = [t.device('emulated{}'.format(i)) for i, t in enumerate(targets)]
+        s = serial(devices, args.count)
+        p = pooled(devices, args.count)
+        for dev in devices:
+            dev.close()
+        print("{:8d} {:14.1f} {:14.1f} {:7.1f}x".format(n, s, p, p / s))
+        n *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+`import pysg` 시작 시간 benchmark
+
+새 Python process 에서 module 을 import 하는 데 걸리는 시간을 여러 번 재서
+중간값을 출력한다. `--max-ms` 를 주면 그보다 느린 module 이 있을 때 0 이
+아닌 값으로 종료하므로 CI 에서 회귀 검사용으로 사용할 수 있다.
+
+    python benchmarks/bench_import.py -n 20 --max-ms 50
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(module: str, count: int) -> float:
+    samples = []
+    for _ in range(count):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       _SCRIPT.format(module=module)])
+        samples.append(float(out.decode().split()[-1]) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help="이보다 느리면 실패로 처리한다")
+    parser.add_argument('modules', nargs='*',
+                        default=['pysg', 'pysg.enum', 'pysg.device'])
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        ms = measure(module, args.count)
+        slow = args.max_ms is not None and ms > args.max_ms
+        failed = failed or slow
+        print("{:16s} {:8.2f} ms{}".format(module, ms, ' (too slow)' if slow else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+`pysg.metrics` 의 기록 비용 benchmark
+
+`LatencyHistogram.record()` 와 `DeviceMetrics.record()` 한 번에 드는 시간을
+재서 `BareDevice.metrics` 를 켰을 때 command 마다 추가되는 비용을 보여준다.
+장치 경로를 주면 실제 장치에 TEST UNIT READY 를 보내면서 켠 경우와 끈
+경우의 command/s 도 비교한다.
+
+    python benchmarks/bench_metrics.py -n 1000000
+    python benchmarks/bench_metrics.py -n 100000 /dev/sg0
+"""
+from pysg.cmd import command
+from pysg.enum import PTResult, StatusCodes
+from pysg.metrics import DeviceMetrics, LatencyHistogram
+import argparse
+import random
+import time
+import timeit
+
+
+class _Result(object):
+    # `DeviceMetrics.record()` 가 사용하는 `PTObject` 의 property 들만 흉내낸다.
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.result_category = PTResult.GOOD
+        self.status_response = StatusCodes.GOOD
+        self.sense = None
+        self.resid = 0
+        self._data_in = bytearray(4096)
+        self._data_out = None
+
+
+def run_device(path: str, count: int, metrics: bool) -> float:
+    from pysg.device import Device
+
+    with Device(path, readonly=True) as dev:
+        if metrics:
+            dev.enable_metrics()
+        tur = command(b'\x00')
+        start = time.perf_counter()
+        for _ in range(count):
+            dev.try_command(tur)
+        return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=200000)
+    parser.add_argument('device', nargs='?')
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    values = [int(rnd.lognormvariate(5, 1.5)) for _ in range(4096)]
+    hist = LatencyHistogram()
+    it = iter(values * (args.count // len(values) + 1))
+    t = timeit.timeit(lambda: hist.record(next(it)), number=args.count)
+    print("LatencyHistogram.record  {:8.1f} ns/op".format(t / args.count * 1e9))
+
+    metrics = DeviceMetrics('bench')
+    result = _Result(command(b'\x28' + bytes(9)))
+    t = timeit.timeit(lambda: metrics.record(result, 123456), number=args.count)
+    print("DeviceMetrics.record     {:8.1f} ns/op".format(t / args.count * 1e9))
+
+    if args.device:
+        off = run_device(args.device, args.count, False)
+        on = run_device(args.device, args.count, True)
+        print("metrics off: {:10.1f} commands/s".format(off))
+        print("metrics on:  {:10.1f} commands/s ({:+.1f}%)".format(
+            on, (on / off - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+mmap reserved-buffer IO benchmark
+
+실제 sg 장치에서 같은 크기의 READ (16) 을 일반 `Buffer` 로 실행하는 경우와
+`enable_mmap_io()` 가 반환한 reserved buffer 로 실행하는 경우의 MiB/s 를
+비교한다. 읽은 data 를 hash 하는 시간도 포함한다. mmap IO 를 쓸 수 없는
+장치면 그 사실을 출력하고 일반 경로만 측정한다.
+
+    python benchmarks/bench_mmap.py /dev/sg1 -n 2000 --size 512
+"""
+from pysg import Buffer
+from pysg.cmd import command
+from pysg.device import Device
+import argparse
+import hashlib
+import time
+
+
+def read16(lba: int, blocks: int):
+    return command(b'\x88\x00' + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def run(dev, buf, count: int, blocks: int) -> float:
+    cmd = read16(0, blocks)
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.command(cmd, data_in=buf)
+        hashlib.blake2b(buf.buffer).digest()
+    return count * len(buf) / (time.perf_counter() - start) / (1 << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=512, help="전송 크기 (KiB)")
+    parser.add_argument('--block-size', type=int, default=512)
+    args = parser.parse_args()
+
+    size = args.size * 1024
+    blocks = size // args.block_size
+    with Device(args.path, readonly=True) as dev:
+        normal = run(dev, Buffer(size=size), args.count, blocks)
+        print("{:16s} {:10.1f} MiB/s".format('normal', normal))
+        buf = dev.enable_mmap_io(size)
+        if dev.mmap_io is None:
+            print("mmap IO is not available on {}".format(args.path))
+            return
+        if len(buf) < size:
+            print("reserved buffer is limited to {} bytes".format(len(buf)))
+            blocks = len(buf) // args.block_size
+            buf = buf.prefix(blocks * args.block_size)
+        mapped = run(dev, buf, args.count, blocks)
+        print("{:16s} {:10.1f} MiB/s {:7.2f}x".format('mmap', mapped, mapped / normal))
+
+
+if __name__ == '__main__':
+    main()
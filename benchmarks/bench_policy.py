@@ -0,0 +1,111 @@
+"""
+`Device.enable_retry_policy()` benchmark
+
+`EmulatedTarget` 에 일정 비율로 UNIT ATTENTION 과 NOT READY (becoming
+ready) 를 주입하면서 READ (16) 을 실행한다. 예외를 잡아 메시지를 만들고
+다시 시도하는 loop 와 `RetryPolicy` 의 command 당 시간을 비교하고, 정책의
+counter 와 학습한 timeout 을 출력한다. 다시 시도하면 안 되는 실패
+(MEDIUM ERROR) 를 다시 시도하거나 예외로 알리지 않으면 종료 코드 1 로
+끝난다.
+
+    python benchmarks/bench_policy.py --count 20000 --every 10
+"""
+from pysg.cmd import command
+from pysg.device import CheckConditionError
+from pysg.emulation import EmulatedTarget
+from pysg.enum import SenseKeyCodes
+import argparse
+import sys
+import time
+
+
+def read16(lba: int, blocks: int):
+    return command(b'\x88\x00' + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def inject(target, i: int, every: int):
+    if i % every == 0:
+        if (i // every) % 2:
+            target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        else:
+            target.inject(SenseKeyCodes.NOT_READY, 0x04, 0x01, count=2)
+
+
+def manual(target, dev, count: int, every: int):
+    buf = bytearray(8 * 512)
+    for i in range(count):
+        inject(target, i, every)
+        for attempt in range(4):
+            try:
+                dev.command(read16(i % 1024 * 8, 8), data_in=buf)
+                break
+            except CheckConditionError as e:
+                message = "{} (attempt {})".format(e, attempt)
+                sense = e.sense
+                if sense.sense_key != SenseKeyCodes.UNIT_ATTENTION and \
+                        sense.sense_key != SenseKeyCodes.NOT_READY:
+                    raise RuntimeError(message)
+                if sense.sense_key == SenseKeyCodes.NOT_READY:
+                    time.sleep(0.0001 * (1 << attempt))
+
+
+def policy(target, dev, count: int, every: int):
+    buf = bytearray(8 * 512)
+    for i in range(count):
+        inject(target, i, every)
+        dev.command(read16(i % 1024 * 8, 8), data_in=buf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--every', type=int, default=10,
+                        help="이 수의 command 마다 실패를 하나 주입한다.")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="target 의 command 처리 시간 (초)")
+    args = parser.parse_args()
+
+    target = EmulatedTarget(latency=args.latency)
+    failed = False
+    with target.device() as dev:
+        dev.quiet = True
+        start = time.perf_counter()
+        manual(target, dev, args.count, args.every)
+        base = (time.perf_counter() - start) / args.count * 1e6
+
+        retry = dev.enable_retry_policy(backoff=0.0001)
+        start = time.perf_counter()
+        policy(target, dev, args.count, args.every)
+        elapsed = (time.perf_counter() - start) / args.count * 1e6
+        print("{:24s} {:8.2f} us/cmd".format('manual retry', base))
+        print("{:24s} {:8.2f} us/cmd".format('RetryPolicy', elapsed))
+
+        snapshot = retry.snapshot()
+        print("counters", snapshot['counters'])
+        print("reasons ", snapshot['reasons'])
+        print("timeouts", snapshot['timeouts'])
+        if snapshot['counters'].get('commands') != args.count or \
+                snapshot['counters'].get('exhausted'):
+            failed = True
+
+        # MEDIUM ERROR 는 다시 시도하지 않고 바로 실패해야 한다.
+        retries = retry.counters['retries']
+        target.inject(SenseKeyCodes.MEDIUM_ERROR, 0x11, 0x00)
+        try:
+            dev.command(read16(0, 8), data_in=bytearray(8 * 512))
+        except CheckConditionError:
+            pass
+        else:
+            print("MEDIUM ERROR was not reported")
+            failed = True
+        if retry.counters['retries'] != retries:
+            print("MEDIUM ERROR was retried")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
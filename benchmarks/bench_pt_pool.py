@@ -0,0 +1,47 @@
+"""
+`PTObjectPool` 사용 여부에 따른 초당 command 수 비교
+
+    python benchmarks/bench_pt_pool.py /dev/sg0 -n 20000
+"""
+from pysg.device import Device
+from pysg.cmd import Command
+import argparse
+import time
+
+
+TEST_UNIT_READY = bytes(6)
+
+
+def run(dev: Device, count: int, pooled: bool) -> float:
+    cmd = Command(TEST_UNIT_READY)
+    start = time.perf_counter()
+    if pooled:
+        for _ in range(count):
+            dev.command(cmd).release()
+    else:
+        for _ in range(count):
+            dev.command(cmd)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('device')
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    dev = Device(args.device, verbose=False)
+    try:
+        before = run(dev, args.count, False)
+        dev.enable_pt_pool()
+        after = run(dev, args.count, True)
+    finally:
+        dev.close()
+
+    print("without pool: {:10.1f} cmds/s".format(before))
+    print("with pool:    {:10.1f} cmds/s ({:+.1f}%)".format(
+        after, (after / before - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+sense log 일괄 해석 benchmark
+
+무작위로 만든 fixed / descriptor 형식 sense 들을 `Sense` 로 하나씩 감싸서
+해석하는 방식과 `pysg.senselog.SenseLog` 로 한 번에 해석하는 방식을 비교한다.
+
+    python benchmarks/bench_senselog.py -n 1000000
+"""
+from pysg.sense import Sense
+from pysg.senselog import SenseLog
+import argparse
+import numpy as np
+import time
+
+
+def make_log(count: int, stride: int) -> np.ndarray:
+    rnd = np.random.default_rng(0)
+    raw = np.zeros((count, stride), dtype=np.uint8)
+    fixed = rnd.random(count) < 0.5
+    raw[fixed, 0] = 0xf0
+    raw[fixed, 2] = rnd.choice([2, 3, 5, 6], fixed.sum())
+    raw[fixed, 7] = 10
+    raw[fixed, 12] = rnd.integers(0, 0x40, fixed.sum())
+    raw[fixed, 13] = rnd.integers(0, 4, fixed.sum())
+    raw[fixed, 3:7] = rnd.integers(0, 256, (fixed.sum(), 4))
+    desc = ~fixed
+    raw[desc, 0] = 0x72
+    raw[desc, 1] = rnd.choice([2, 3, 5, 6], desc.sum())
+    raw[desc, 2] = rnd.integers(0, 0x40, desc.sum())
+    raw[desc, 3] = rnd.integers(0, 4, desc.sum())
+    raw[desc, 7] = 12
+    raw[desc, 9] = 10
+    raw[desc, 10] = 0x80
+    raw[desc, 12:20] = rnd.integers(0, 256, (desc.sum(), 8))
+    return raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    parser.add_argument('-s', '--stride', type=int, default=32)
+    args = parser.parse_args()
+
+    raw = make_log(args.count, args.stride)
+
+    sample = raw[:min(len(raw), 20000)]
+    start = time.perf_counter()
+    for row in sample:
+        s = Sense(init=row.tobytes())
+        s.sense_key, s.asc_ascq_desc, s.information, s.progress
+    single = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    log = SenseLog(raw)
+    log.histogram()
+    bulk = len(raw) / (time.perf_counter() - start)
+
+    print("Sense one by one: {:12.1f} buffers/s".format(single))
+    print("SenseLog:         {:12.1f} buffers/s ({:.1f}x)".format(bulk,
+                                                                 bulk / single))
+
+
+if __name__ == '__main__':
+    main()
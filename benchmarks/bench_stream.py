@@ -0,0 +1,82 @@
+"""
+`Device.read_stream()` / `Device.write_stream()` throughput benchmark
+
+지연 시간이 있는 `EmulatedTarget` 전체를 chunk 마다 `Command` 와 buffer 를
+만들어 `command()` 로 하나씩 읽고 쓰는 loop 와, stream API 로 여러 depth
+에서 읽고 쓰는 경우의 MiB/s 를 비교한다.
+
+    python benchmarks/bench_stream.py --size 256 --latency 0.0002 --depths 1 4 16
+"""
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+import argparse
+import time
+
+
+def rw16(opcode: int, lba: int, blocks: int):
+    return command(bytes([opcode, 0]) + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def naive_read(dev, blocks: int, chunk: int, block_size: int):
+    for lba in range(0, blocks, chunk):
+        n = min(chunk, blocks - lba)
+        buf = bytearray(n * block_size)
+        dev.command(rw16(0x88, lba, n), data_in=buf)
+
+
+def naive_write(dev, blocks: int, chunk: int, block_size: int):
+    data = bytes(chunk * block_size)
+    for lba in range(0, blocks, chunk):
+        n = min(chunk, blocks - lba)
+        dev.command(rw16(0x8a, lba, n), data_out=data[:n * block_size])
+
+
+def stream_read(dev, depth: int, chunk_size: int):
+    for _ in dev.read_stream(depth=depth, chunk_size=chunk_size):
+        pass
+
+
+def stream_write(dev, depth: int, chunk_size: int, total: int):
+    data = memoryview(bytes(chunk_size))
+    with dev.write_stream(depth=depth, chunk_size=chunk_size) as sink:
+        for offset in range(0, total, chunk_size):
+            sink.write(data[:min(chunk_size, total - offset)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=256, help="장치 크기 (MiB)")
+    parser.add_argument('--chunk', type=int, default=256, help="chunk 크기 (KiB)")
+    parser.add_argument('--latency', type=float, default=0.0002,
+                        help="target 의 command 처리 시간 (초)")
+    parser.add_argument('--depths', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    block_size = 512
+    blocks = args.size * (1 << 20) // block_size
+    chunk_size = args.chunk * 1024
+    target = EmulatedTarget(blocks=blocks, block_size=block_size,
+                            latency=args.latency,
+                            max_transfer_blocks=chunk_size // block_size)
+    total = blocks * block_size
+
+    def report(name, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print("{:24s} {:10.1f} MiB/s".format(name, total / elapsed / (1 << 20)))
+
+    with target.device() as dev:
+        chunk = chunk_size // block_size
+        report('command() read', lambda: naive_read(dev, blocks, chunk, block_size))
+        report('command() write', lambda: naive_write(dev, blocks, chunk, block_size))
+        for depth in args.depths:
+            report('read_stream depth={}'.format(depth),
+                   lambda: stream_read(dev, depth, chunk_size))
+            report('write_stream depth={}'.format(depth),
+                   lambda: stream_write(dev, depth, chunk_size, total))
+
+
+if __name__ == '__main__':
+    main()
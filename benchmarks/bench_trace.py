@@ -0,0 +1,93 @@
+"""
+`Device.enable_trace()` 기록 부담과 `pysg.trace.replay()` benchmark
+
+`EmulatedTarget` 에 READ (16) 과 TEST UNIT READY 를 섞어 실행하면서 trace
+를 켜지 않은 경우와 켠 경우의 command 당 시간을 비교하고, 기록한 trace 를
+`Trace` 로 읽어 여러 depth 에서 최대한 빨리, 그리고 기록된 간격대로 다시
+실행한다. 재실행한 status 가 기록과 다르면 종료 코드 1 로 끝난다.
+
+    python benchmarks/bench_trace.py --count 20000 --depths 1 4 16
+"""
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.trace import Trace, replay
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+def workload(dev, count: int, blocks: int):
+    buf = bytearray(8 * 512)
+    tur = command(b'\x00' * 6)
+    for i in range(count):
+        if i % 8 == 7:
+            dev.try_command(tur)
+            continue
+        lba = (i * 97) % (blocks - 8)
+        dev.command(command(b'\x88\x00' + lba.to_bytes(8, 'big') +
+                            (8).to_bytes(4, 'big') + b'\x00\x00'), data_in=buf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="target 의 command 처리 시간 (초)")
+    parser.add_argument('--depths', type=int, nargs='*', default=[1, 4, 16])
+    parser.add_argument('--paced', type=int, default=2000,
+                        help="기록된 간격대로 다시 실행할 record 수")
+    args = parser.parse_args()
+
+    blocks = 1 << 16
+    target = EmulatedTarget(blocks=blocks, latency=args.latency)
+    path = os.path.join(tempfile.mkdtemp(), 'trace.bin')
+    failed = False
+
+    with target.device() as dev:
+        start = time.perf_counter()
+        workload(dev, args.count, blocks)
+        base = (time.perf_counter() - start) / args.count * 1e6
+
+        dev.enable_trace(path)
+        start = time.perf_counter()
+        workload(dev, args.count, blocks)
+        traced = (time.perf_counter() - start) / args.count * 1e6
+        dev.stop_trace()
+        print("{:24s} {:8.2f} us/cmd".format('no trace', base))
+        print("{:24s} {:8.2f} us/cmd ({:+.1f}%)".format(
+              'trace', traced, (traced - base) / base * 100))
+
+        start = time.perf_counter()
+        trace = Trace(path)
+        print("{:24s} {:8.2f} ms ({} records, {} bytes)".format(
+              'load', (time.perf_counter() - start) * 1e3, len(trace),
+              os.path.getsize(path)))
+
+        for depth in args.depths:
+            res = replay(trace, dev, speed=None, depth=depth)
+            bad = len(res.mismatches(trace))
+            failed |= bad != 0
+            print("{:24s} {:8.0f} cmd/s, {} mismatches".format(
+                  'replay depth={}'.format(depth), res.issued.sum() / res.elapsed, bad))
+
+    # 기록된 간격대로 재현하는지 앞쪽 일부로 확인한다.
+    with target.device() as dev:
+        dev.enable_trace(path)
+        workload(dev, args.paced, blocks)
+        dev.stop_trace()
+        trace = Trace(path)
+        span = (int(trace.t_ns[-1]) - int(trace.t_ns[0])) / 1e9
+        res = replay(trace, dev, speed=1.0)
+        failed |= len(res.mismatches(trace)) != 0
+        print("{:24s} {:8.1f} ms recorded, {:.1f} ms replayed".format(
+              'paced', span * 1e3, res.elapsed * 1e3))
+
+    os.unlink(path)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+scatter-gather (iovec) 전송 확인과 benchmark
+
+`EmulatedTarget` 에 여러 buffer 의 list 로 WRITE 한 뒤 다시 list 로 READ
+하면서, `command()` (bounce buffer) 와 `CommandQueue` / `Batch` (sg iovec)
+경로 모두에서 data 가 올바른 위치에 들어가는지 확인한다. 하나라도 틀리면
+1 로 종료한다. 이어서 buffer 들을 직접 이어 붙여 보내는 경우와 list 로
+보내는 경우의 command/s 를 비교한다.
+
+    python benchmarks/check_iovec.py -n 2000 --segments 16
+"""
+from pysg.batch import Batch
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+import argparse
+import os
+import random
+import sys
+import time
+
+
+def rw16(opcode: int, lba: int, blocks: int):
+    return command(bytes([opcode, 0]) + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def split(total: int, count: int, rng: random.Random):
+    # 합이 `total` 인 임의 크기 `count` 개 (0 byte segment 포함)
+    cuts = sorted(rng.randrange(total + 1) for _ in range(count - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+def check(target, rounds: int, segments: int, block_size: int) -> list:
+    rng = random.Random(0)
+    errors = []
+    with target.device() as dev:
+        queue = dev.command_queue(8)
+        for i in range(rounds):
+            blocks = rng.randrange(1, 16)
+            lba = rng.randrange(target.blocks - blocks)
+            total = blocks * block_size
+            data = os.urandom(total)
+            sizes = split(total, segments, rng)
+            offsets = [sum(sizes[:k]) for k in range(len(sizes))]
+            out = [data[o:o + n] for o, n in zip(offsets, sizes)]
+            ins = [bytearray(n) for n in sizes]
+
+            # 쓰기와 읽기 경로를 번갈아 바꿔 가며 확인한다.
+            if i % 2:
+                dev.command(rw16(0x8a, lba, blocks), data_out=out)
+            else:
+                queue.command(rw16(0x8a, lba, blocks), data_out=out)
+            mode = i % 3
+            if mode == 0:
+                dev.command(rw16(0x88, lba, blocks), data_in=ins)
+            elif mode == 1:
+                queue.command(rw16(0x88, lba, blocks), data_in=ins)
+            else:
+                batch = Batch(1)
+                batch.add(rw16(0x88, lba, blocks), data_in=ins)
+                queue.run_batch(batch).check()
+            if b''.join(ins) != data:
+                errors.append('round {} (mode {}): data mismatch'.format(i, mode))
+    return errors
+
+
+def bench(target, count: int, segments: int, block_size: int):
+    seg = block_size
+    parts = [bytes(seg) for _ in range(segments)]
+    blocks = segments * seg // block_size
+    with target.device() as dev:
+        cmd = rw16(0x8a, 0, blocks)
+        start = time.perf_counter()
+        for _ in range(count):
+            dev.command(cmd, data_out=b''.join(parts))
+        joined = count / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            dev.command(cmd, data_out=parts)
+        gathered = count / (time.perf_counter() - start)
+
+        queue = dev.command_queue(8)
+        start = time.perf_counter()
+        for _ in range(count):
+            queue.command(cmd, data_out=parts)
+        iovec = count / (time.perf_counter() - start)
+    print("{:28s} {:10.1f} commands/s".format('join + command()', joined))
+    print("{:28s} {:10.1f} commands/s".format('list + command() (bounce)', gathered))
+    print("{:28s} {:10.1f} commands/s".format('list + queue (sg iovec)', iovec))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=2000)
+    parser.add_argument('--segments', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=300)
+    args = parser.parse_args()
+
+    target = EmulatedTarget(blocks=4096)
+    errors = check(target, args.rounds, args.segments, target.block_size)
+    print("data placement: {}".format(
+          'ok' if not errors else '{} errors, e.g. {}'.format(len(errors), errors[0])))
+    bench(target, args.count, args.segments, target.block_size)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
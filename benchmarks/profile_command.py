@@ -0,0 +1,53 @@
+"""
+`BareDevice.command()` 단계별 시간 분석
+
+장치에 READ(10) 또는 TEST UNIT READY 를 반복해서 보내면서
+`pysg.profile.CommandProfiler` 로 command 생성, `PTObject` 준비, ioctl,
+`sg_cmds_process_resp()`, 결과 해석에 걸린 시간을 나누어 출력한다.
+
+    python benchmarks/profile_command.py -n 10000 /dev/sg0
+    python benchmarks/profile_command.py -n 10000 --pool --quiet --read 8 /dev/sg0
+"""
+from pysg import Buffer
+from pysg.device import Device
+from pysg.cmd.sbc import Read10
+from pysg.cmd.spc import TestUnitReady
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    parser.add_argument('--read', type=int, default=0, metavar='BLOCKS',
+                        help="TEST UNIT READY 대신 READ(10) 을 보낸다")
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--pool', action='store_true',
+                        help="PTObjectPool 을 사용한다")
+    parser.add_argument('--quiet', action='store_true',
+                        help="sg_cmds_process_resp() 를 건너뛴다")
+    parser.add_argument('device')
+    args = parser.parse_args()
+
+    with Device(args.device, readonly=True) as dev:
+        if args.pool:
+            dev.enable_pt_pool()
+        dev.quiet = args.quiet
+        prof = dev.enable_profiler()
+        buf = Buffer(size=max(1, args.read) * args.block_size) if args.read else None
+
+        for i in range(args.count):
+            with prof.measure('command'):
+                if args.read:
+                    cmd = Read10(b'\x28' + bytes(9))
+                    cmd.set(lba=i * args.read, transfer_length=args.read)
+                else:
+                    cmd = TestUnitReady(b'\x00' * 6)
+            obj = dev.command(cmd, data_in=buf)
+            if args.pool:
+                obj.release()
+
+        print(prof.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
-from ._common import aligned_new
+from ._common import aligned_new, clear_caches
 from typing import Optional
-from . import _pysg, sg_lib
+from . import _pysg
+import importlib
 import sys
 
 
@@ -20,6 +21,54 @@ class Buffer(object):
                 size = len(init)
             self._ptr = aligned_new('{}[{}]'.format(item, size), init)
 
+    @classmethod
+    def from_buffer(cls, obj, writable: bool=False,
+                    alignment: Optional[int]=None) -> 'Buffer':
+        """
+        `bytearray`, `memoryview`, `mmap`, NumPy array 등 buffer protocol 을
+        지원하는 객체의 메모리를 복사하지 않고 사용하는 `Buffer` 를 만든다.
+
+        :param obj: 연속된 메모리를 가진 buffer protocol 객체
+        :param writable: 장치에서 읽은 data 를 받을 buffer 인 경우 True
+        :type writable: bool
+        :param alignment: 요구하는 주소 정렬 단위. 정렬되어 있지 않으면 정렬된
+                          `BounceBuffer` 를 대신 반환한다. SG_IO 는 정렬되지
+                          않은 주소도 받으므로 (필요하면 커널이 복사한다)
+                          기본값 None 은 정렬을 요구하지 않는다.
+        :type alignment: Optional[int]
+        :rtype: Buffer
+
+        .. note::
+            반환된 `Buffer` 가 사용되는 동안 `obj` 의 크기를 바꾸면 안 된다.
+        """
+        view = memoryview(obj)
+        if not view.c_contiguous:
+            raise ValueError("Buffer must be C-contiguous")
+        view = view.cast('B')
+        if writable and view.readonly:
+            raise TypeError("Buffer is read-only")
+
+        item = 'char[]' if cls.signed else 'unsigned char[]'
+        ptr = _pysg.ffi.from_buffer(item, view, writable)
+        if alignment and int(_pysg.ffi.cast('uintptr_t', ptr)) % alignment:
+            return BounceBuffer(view, writable)
+
+        buf = cls.__new__(cls)
+        buf._ptr = ptr
+        return buf
+
+    def flush(self, length: Optional[int]=None, offset: int=0):
+        """
+        command 가 끝난 뒤 data 를 원래 메모리로 돌려놓는다.
+        `BounceBuffer` 가 아니면 아무 일도 하지 않는다.
+
+        :param length: 돌려놓을 byte 수. None 이면 `offset` 부터 끝까지
+        :type length: Optional[int]
+        :param offset: 돌려놓을 영역의 시작 위치
+        :type offset: int
+        """
+        pass
+
     @property
     def ptr(self):
         return self._ptr
@@ -36,7 +85,107 @@ class SignedBuffer(Buffer):
     signed = True
 
 
+class BounceBuffer(Buffer):
+    """
+    정렬되지 않은 사용자 메모리 대신 command 에 사용되는 정렬된 buffer
+
+    data 를 보내는 경우 생성할 때 복사하고, 받는 경우 `flush()` 할 때
+    원래 메모리로 복사한다.
+    """
+
+    def __init__(self, target: memoryview, writable: bool):
+        super().__init__(size=len(target))
+        self._target = target
+        self._writable = writable
+        if not writable:
+            _pysg.ffi.memmove(self._ptr, target, len(target))
+
+    def flush(self, length: Optional[int]=None, offset: int=0):
+        if not self._writable:
+            return
+        if length is None:
+            length = len(self._target) - offset
+        _pysg.ffi.memmove(self._target[offset:offset + length], self._ptr + offset,
+                          length)
+
+
+def _segments(objs, writable: bool) -> list:
+    # iovec 으로 사용할 buffer protocol 객체들을 byte 단위 memoryview 로 바꾼다.
+    views = []
+    for obj in objs:
+        view = memoryview(obj)
+        if not view.c_contiguous:
+            raise ValueError("Buffer must be C-contiguous")
+        view = view.cast('B')
+        if writable and view.readonly:
+            raise TypeError("Buffer is read-only")
+        views.append(view)
+    return views
+
+
+class ScatterGatherBuffer(Buffer):
+    """
+    여러 buffer 를 이어 붙인 하나의 정렬된 buffer
+
+    sg_pt 처럼 iovec 을 지원하지 않는 경로에서 scatter-gather 전송 대신
+    사용한다. data 를 보내는 경우 생성할 때 각 buffer 의 내용을 순서대로
+    모으고, 받는 경우 `flush()` 할 때 받은 만큼 각 buffer 로 나누어 복사한다.
+    """
+
+    def __init__(self, targets, writable: bool):
+        targets = _segments(targets, writable)
+        super().__init__(size=sum(len(t) for t in targets))
+        self._targets = targets
+        self._writable = writable
+        if not writable:
+            view = memoryview(self.buffer)
+            offset = 0
+            for t in targets:
+                view[offset:offset + len(t)] = t
+                offset += len(t)
+
+    @property
+    def segments(self) -> list:
+        return self._targets
+
+    def flush(self, length: Optional[int]=None, offset: int=0):
+        if not self._writable:
+            return
+        end = len(self) if length is None else offset + length
+        view = memoryview(self.buffer)
+        pos = 0
+        for t in self._targets:
+            if pos >= end:
+                break
+            lo = max(pos, offset)
+            hi = min(pos + len(t), end)
+            if lo < hi:
+                t[lo - pos:hi - pos] = view[lo:hi]
+            pos += len(t)
+
+
+def as_buffer(obj, writable: bool=False) -> Optional[Buffer]:
+    """
+    `Buffer` 가 아닌 buffer protocol 객체를 `Buffer.from_buffer()` 로 감싼다.
+    list 나 tuple 로 주어진 여러 buffer 는 `ScatterGatherBuffer` 로 모으고,
+    정수는 그 크기의 새 `Buffer` 로 만든다.
+    """
+    if obj is None or isinstance(obj, Buffer):
+        return obj
+    if isinstance(obj, int):
+        return Buffer(size=obj)
+    if isinstance(obj, (list, tuple)):
+        return ScatterGatherBuffer(obj, writable)
+    return Buffer.from_buffer(obj, writable)
+
+
+_output_redirected = False
+
+
 def redirect_output(fd_or_file):
+    global _output_redirected
+    from . import sg_lib
+
     if hasattr(fd_or_file, 'fileno'):
         fd = fd_or_file.fileno()
     else:
@@ -45,6 +194,35 @@ def redirect_output(fd_or_file):
     fp = _pysg.lib.fdopen(fd, b'w')
     _pysg.lib.setbuf(fp, _pysg.ffi.NULL)
     sg_lib.lib.sg_set_warnings_strm(fp)
+    _output_redirected = True
+
+
+def _default_output():
+    # import 할 때가 아니라 처음 장치를 열 때 sg_lib 의 출력을 stderr 로
+    # 설정한다. 이미 `redirect_output()` 이 호출되었다면 그대로 둔다.
+    if not _output_redirected:
+        redirect_output(sys.stderr)
+
+
+# `import pysg` 만으로 하위 module 들을 불러오지 않도록, 자주 쓰는 이름들은
+# 처음 접근할 때 import 한다.
+_lazy_attrs = {
+    'BareDevice': 'device',
+    'Device': 'device',
+    'PTObject': 'device',
+    'Sense': 'sense',
+    'Command': 'cmd',
+}
+_submodules = ('aio', 'batch', 'cmd', 'device', 'discovery', 'emulation', 'enum', 'executor',
+               'metrics', 'mmapio', 'policy', 'pool', 'profile', 'sense', 'senselog', 'sg_cmds',
+               'sg_lib', 'sg_pt', 'sgio', 'stream', 'trace', 'transport')
+
 
-redirect_output(sys.stderr)
+def __getattr__(name):
+    if name in _lazy_attrs:
+        mod = importlib.import_module('.' + _lazy_attrs[name], __name__)
+        return getattr(mod, name)
+    elif name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
@@ -1,16 +1,30 @@
-from . import _pysg, sg_lib
+from . import _pysg
 import enum
 import re
+import weakref
 
 aligned_new = _pysg.ffi.new_allocator(_pysg.lib.aligned_malloc, _pysg.lib.aligned_free, True)
 
 
+_lib_names = {}
+
+
+def lib_names(lib) -> tuple:
+    """
+    cffi lib 의 이름 목록. `dir()` 은 비싸므로 lib 마다 한 번만 구한다.
+    """
+    names = _lib_names.get(id(lib))
+    if names is None:
+        names = _lib_names[id(lib)] = tuple(sorted(dir(lib)))
+    return names
+
+
 # Internal uses
 def enumize(mod, prefix):
     lib = mod.lib
     def decorator(e):
         def gen():
-            for k in dir(lib):
+            for k in lib_names(lib):
                 if k.startswith(prefix):
                     k_ = k[len(prefix):]
                     if "0" <= k_[0] <= "9":
@@ -23,13 +37,70 @@ def enumize(mod, prefix):
     return decorator
 
 
+class DescriptionCache(object):
+    """
+    sg_lib 이 돌려주는 command 이름이나 설명 문자열처럼 변하지 않는 값을
+    보관하는 크기 제한이 있는 cache
+
+    가득 차면 가장 먼저 들어온 값부터 버린다. 만들어진 cache 들은 모두
+    `clear_caches()` 로 비울 수 있다.
+    """
+
+    _instances = weakref.WeakSet()
+
+    def __init__(self, maxsize: int=4096):
+        self.maxsize = maxsize
+        self._data = {}
+        self._instances.add(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, fn, *args):
+        """
+        `key` 에 해당하는 값을 돌려준다. 없으면 `fn(*args)` 로 구해서 보관한다.
+        """
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        val = fn(*args)
+        if len(self._data) >= self.maxsize:
+            try:
+                del self._data[next(iter(self._data))]
+            except (StopIteration, KeyError, RuntimeError):
+                pass
+        self._data[key] = val
+        return val
+
+    def clear(self):
+        self._data.clear()
+
+
+def clear_caches():
+    """
+    command 이름, enum 설명 등 memoize 된 문자열들을 모두 버린다.
+    """
+    for cache in list(DescriptionCache._instances):
+        cache.clear()
+
+
 def enum_str(fn, maxlen, *args):
     tp = 'char[{}]'.format(maxlen)
-    def __str__(self):
+    cache = DescriptionCache()
+
+    def describe(value):
         buf = _pysg.ffi.new(tp)
-        fn(self.value, maxlen, buf, *args)
+        fn(value, maxlen, buf, *args)
         return _pysg.ffi.string(buf).decode('utf-8')
 
+    def __str__(self):
+        # 처음 호출될 때 enum 의 모든 값에 대한 설명 표를 만들어 둔다.
+        if not len(cache):
+            for member in self.__class__:
+                cache.get(member.value, describe, member.value)
+        return cache.get(self.value, describe, self.value)
+
     return __str__
 
 
@@ -39,11 +110,18 @@ def to_enum_name(s):
 
 
 def desig_enum_generator(type_name, fn_name, def_name, start, end, **kwargs):
+    from . import sg_lib
+
     if hasattr(sg_lib.lib, fn_name):
         fn = getattr(sg_lib.lib, fn_name)
+        cache = DescriptionCache()
+
+        def describe(value):
+            return _pysg.ffi.string(fn(value)).decode('utf-8')
+
         class Enum(int, HexValueEnum):
             def __str__(self):
-                return fn(self)
+                return cache.get(self.value, describe, self.value)
 
         values = dict((to_enum_name(fn(v)), v)
                        for v in range(start, end + 1))
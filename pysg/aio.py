@@ -0,0 +1,802 @@
+from . import _pysg, Buffer, as_buffer, _segments
+from .sense import Sense
+from .cmd import Command
+from .enum import StatusCodes, PTResult
+from .device import check_result, _transferred
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, List, Callable, Tuple, Iterable, Union
+import asyncio
+import heapq
+import logging
+import os
+import select
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+# sg v3 드라이버는 file descriptor 하나 당 동시에 16개까지만 command 를 받는다.
+SG_MAX_QUEUE = 16
+
+# sg_lib.h 의 SG_LIB_DRIVER_MASK, SG_LIB_DRIVER_SENSE
+_DRIVER_MASK = 0x0f
+_DRIVER_SENSE = 0x08
+
+# linux/scsi.h 의 DID_ERROR
+_DID_ERROR = 0x07
+
+
+def result_category(status: int, host_status: int, driver_status: int,
+                    os_err: int=0) -> PTResult:
+    """
+    sg_pt_linux 의 `get_scsi_pt_result_category()` 와 같은 규칙으로
+    `sg_io_hdr_t` 의 결과를 분류한다.
+    """
+    dr_st = driver_status & _DRIVER_MASK
+    scsi_st = status & 0x7e
+    if os_err:
+        return PTResult.OS_ERR
+    elif host_status:
+        return PTResult.TRANSPORT_ERR
+    elif dr_st and dr_st != _DRIVER_SENSE:
+        return PTResult.TRANSPORT_ERR
+    elif (dr_st == _DRIVER_SENSE or
+          scsi_st in (StatusCodes.CHECK_CONDITION,
+                      StatusCodes.COMMAND_TERMINATED)):
+        return PTResult.SENSE
+    elif scsi_st:
+        return PTResult.STATUS
+    else:
+        return PTResult.GOOD
+
+
+class IovecArray(object):
+    """
+    sg 드라이버의 scatter-gather 전송에 사용하는 `sg_iovec_t` 배열
+
+    각 buffer 를 복사하지 않고 가리키며, `Request` 가 끝날 때까지 buffer 의
+    크기를 바꾸면 안 된다. sg 드라이버가 정렬되지 않은 주소도 처리하므로
+    정렬은 요구하지 않는다.
+    """
+
+    def __init__(self, segments, writable: bool=False):
+        ffi = _pysg.ffi
+        self.segments = _segments(segments, writable)
+        self._ptrs = [ffi.from_buffer('unsigned char[]', v, writable)
+                      for v in self.segments]
+        self._iov = ffi.new('sg_iovec_t[]', len(self._ptrs))
+        for iov, ptr in zip(self._iov, self._ptrs):
+            iov.iov_base = ptr
+            iov.iov_len = len(ptr)
+        self._len = sum(len(v) for v in self.segments)
+
+    @property
+    def ptr(self):
+        return self._iov
+
+    @property
+    def count(self) -> int:
+        return len(self._ptrs)
+
+    def __len__(self):
+        return self._len
+
+    def flush(self, length: Optional[int]=None, offset: int=0):
+        pass
+
+
+def request_buffer(obj, writable: bool=False) -> Union[Buffer, IovecArray, None]:
+    """
+    `Request` 와 `Batch` 의 data buffer 를 준비한다. list 나 tuple 로 주어진
+    여러 buffer 는 bounce buffer 없이 `IovecArray` 로 전송한다.
+    """
+    if isinstance(obj, (list, tuple)):
+        return IovecArray(obj, writable)
+    return as_buffer(obj, writable)
+
+
+def set_data(hdr, data_in, data_out):
+    """
+    `sg_io_hdr_t` 의 전송 방향과 data buffer 를 설정한다.
+    """
+    lib = _pysg.lib
+    if data_in is not None:
+        hdr.dxfer_direction = lib.SG_DXFER_FROM_DEV
+        data = data_in
+    elif data_out is not None:
+        hdr.dxfer_direction = lib.SG_DXFER_TO_DEV
+        data = data_out
+    else:
+        hdr.dxfer_direction = lib.SG_DXFER_NONE
+        hdr.dxferp = _pysg.ffi.NULL
+        hdr.dxfer_len = 0
+        hdr.iovec_count = 0
+        return
+    hdr.dxferp = data.ptr
+    hdr.dxfer_len = len(data)
+    hdr.iovec_count = data.count if isinstance(data, IovecArray) else 0
+
+
+class Request(object):
+    """
+    sg v3 비동기 인터페이스(`write()` / `read()`)로 제출되는 SCSI command
+
+    결과는 `PTObject` 와 같은 이름의 property 들로 확인할 수 있다.
+    """
+
+    def __init__(self,
+                 cmd: Command,
+                 sense_size: int=32,
+                 data_in: Optional[Buffer]=None,
+                 data_out: Optional[Buffer]=None,
+                 timeout: int=5,
+                 flags: int=0):
+        """
+        :param cmd: 실행할 command
+        :type cmd: Command
+        :param sense_size: sense buffer 크기
+        :type sense_size: int
+        :param data_in: 장치에서 읽은 data 를 받을 buffer. buffer protocol 을
+                        지원하는 객체도 사용할 수 있으며, 여러 buffer 의
+                        list 를 주면 sg 드라이버의 iovec 으로 나누어 받는다.
+        :type data_in: Optional[Buffer]
+        :param data_out: 장치로 보낼 data 가 담긴 buffer (또는 buffer 의 list)
+        :type data_out: Optional[Buffer]
+        :param timeout: 초 단위 timeout
+        :type timeout: int
+        :param flags: `SG_FLAG_*` 값
+        :type flags: int
+        """
+        ffi = _pysg.ffi
+
+        data_in = request_buffer(data_in, True)
+        data_out = request_buffer(data_out)
+
+        self.cmd = cmd
+        self._sense = Sense(size=sense_size)
+        self._data_in = data_in
+        self._data_out = data_out
+        self._future = None
+        self._detached = False
+        self.done = False
+        self.os_err = 0
+        self.error = None
+
+        hdr = ffi.new('sg_io_hdr_t *')
+        hdr.interface_id = ord('S')
+        hdr.cmd_len = len(cmd)
+        hdr.cmdp = _pysg.ffi.cast('unsigned char *', cmd._cdb_ptr)
+        hdr.mx_sb_len = len(self._sense)
+        hdr.sbp = self._sense.ptr
+        hdr.timeout = timeout * 1000
+        hdr.flags = flags
+        set_data(hdr, data_in, data_out)
+        self._hdr = hdr
+
+    def __repr__(self):
+        state = "done" if self.done else "pending"
+        return "<{}.{}: {} [{}]>".format(self.__class__.__module__,
+                                         self.__class__.__name__,
+                                         str(self.cmd), state)
+
+    def _finish(self, hdr):
+        # 회수된 header 의 결과 필드만 옮긴다. sense 와 data 는 이미
+        # 각자의 buffer 에 채워져 있다.
+        mine = self._hdr
+        mine.status = hdr.status
+        mine.masked_status = hdr.masked_status
+        mine.msg_status = hdr.msg_status
+        mine.sb_len_wr = hdr.sb_len_wr
+        mine.host_status = hdr.host_status
+        mine.driver_status = hdr.driver_status
+        mine.resid = hdr.resid
+        mine.duration = hdr.duration
+        mine.info = hdr.info
+        self._sense.invalidate()
+        if self._data_in is not None:
+            self._data_in.flush(_transferred(len(self._data_in), hdr.resid))
+        self.done = True
+
+    def reset(self, length: Optional[int]=None):
+        """
+        완료되었거나 아직 제출하지 않은 `Request` 를 (다시) 제출할 수 있게
+        한다. header 는 `cmd` 의 CDB 를 직접 가리키므로 그 사이에 바꾼 CDB
+        필드가 그대로 적용된다. 진행 중인 `Request` 에 호출하면 안 된다.
+
+        :param length: 이번에 전송할 byte 수. data buffer 크기보다 클 수 없다.
+        :type length: Optional[int]
+        """
+        if length is not None:
+            data = self.data
+            if data is None or length > len(data):
+                raise ValueError("Transfer length exceeds the data buffer")
+            if isinstance(data, IovecArray) and length != len(data):
+                raise ValueError("Transfer length of an iovec request is fixed")
+            self._hdr.dxfer_len = length
+        self._sense.invalidate()
+        self._future = None
+        self._detached = False
+        self.done = False
+        self.os_err = 0
+        self.error = None
+
+    @property
+    def pack_id(self) -> int:
+        return self._hdr.pack_id
+
+    @property
+    def sense(self) -> Sense:
+        return self._sense
+
+    @property
+    def sense_size(self) -> int:
+        return self._hdr.sb_len_wr
+
+    @property
+    def data(self) -> Buffer:
+        if self._data_in is not None:
+            return self._data_in
+        elif self._data_out is not None:
+            return self._data_out
+        else:
+            return None
+
+    @property
+    def status_response(self) -> StatusCodes:
+        return StatusCodes(self._hdr.status)
+
+    @property
+    def host_status(self) -> int:
+        return self._hdr.host_status
+
+    @property
+    def driver_status(self) -> int:
+        return self._hdr.driver_status
+
+    @property
+    def resid(self) -> int:
+        return self._hdr.resid
+
+    @property
+    def duration_ms(self) -> int:
+        return self._hdr.duration
+
+    @property
+    def transport_err(self) -> int:
+        return (self._hdr.host_status << 8) | self._hdr.driver_status
+
+    @property
+    def transport_err_str(self) -> str:
+        return "host_status={:#x}, driver_status={:#x}".format(
+                self._hdr.host_status, self._hdr.driver_status)
+
+    @property
+    def result_category(self) -> PTResult:
+        hdr = self._hdr
+        return result_category(hdr.status, hdr.host_status, hdr.driver_status,
+                               self.os_err)
+
+    def check(self):
+        """
+        command 가 실패했으면 `PTObject.do_scsi_pt()` 와 같은 예외를 발생시킨다.
+        backend 가 command 를 처리하다 예외가 발생했으면 (`error`) 그 예외를
+        발생시킨다.
+        """
+        if not self.done:
+            raise RuntimeError("{} is not completed yet".format(self.cmd))
+        if self.error is not None:
+            raise self.error
+        check_result(self)
+
+
+class Backend(ABC):
+    """
+    `CommandQueue` 가 사용하는 backend 의 interface
+
+    `submit()` 으로 `sg_io_hdr_t *` 를 받아 실행을 시작하고, 완료된 header 는
+    `reap()` 으로 돌려준다. `fileno()` 는 완료된 command 가 있을 때 읽기
+    가능해지는 file descriptor 여야 한다.
+    """
+
+    # 동시에 진행할 수 있는 command 수. None 이면 제한 없음
+    max_queue = None
+
+    @abstractmethod
+    def fileno(self) -> int:
+        pass
+
+    @abstractmethod
+    def submit(self, hdr):
+        pass
+
+    @abstractmethod
+    def reap(self, block: bool=False):
+        pass
+
+    def error(self, hdr) -> Optional[BaseException]:
+        """
+        `reap()` 이 마지막으로 돌려준 header 의 command 를 처리하다 backend
+        에서 발생한 예외. 없으면 None 이다.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class SGBackend(Backend):
+    """
+    Linux sg 드라이버의 `write()` / `read()` 비동기 인터페이스를 사용하는 backend
+
+    `scsi_pt_open_device()` 로 연 file descriptor 처럼 `O_NONBLOCK` 으로 열린
+    /dev/sg 장치여야 한다.
+    """
+
+    max_queue = SG_MAX_QUEUE
+
+    def __init__(self, fd: int, owned: bool=False):
+        self._fd = fd
+        self._owned = owned
+        self._hdr = _pysg.ffi.new('sg_io_hdr_t *')
+        self._hdr_buf = _pysg.ffi.buffer(self._hdr)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def submit(self, hdr):
+        os.write(self._fd, _pysg.ffi.buffer(hdr))
+
+    def reap(self, block: bool=False):
+        # 반환되는 header 는 다음 `reap()` 호출에서 재사용된다.
+        while True:
+            try:
+                os.readv(self._fd, [self._hdr_buf])
+            except BlockingIOError:
+                if not block:
+                    return None
+                select.select([self._fd], [], [])
+            else:
+                return self._hdr
+
+    def close(self):
+        if self._owned and self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+
+class TargetError(Exception):
+    """
+    `LoopbackBackend` 의 handler 가 command 를 처리하지 못했음을 알리는 예외
+
+    host status 가 DID_ERROR 인 transport 오류로 바뀐다. 그 외의 예외는
+    handler 의 bug 이므로 `Request.error` 에 보관되어 `CommandQueue` 가
+    다시 발생시킨다.
+    """
+
+
+Handler = Callable[[bytes, Optional[memoryview], Optional[memoryview]],
+                   Tuple[int, bytes, int]]
+
+
+class LoopbackBackend(Backend):
+    """
+    실제 장치 없이 `handler` 로 command 를 처리하는 backend
+
+    `handler(cdb, data_in, data_out)` 는 `(status, sense, resid)` 를 반환해야
+    한다. `data_in` 과 `data_out` 은 command 의 data buffer 를 가리키는
+    `memoryview` 이거나 `None` 이다. `handler` 는 별도의 thread 에서 `latency`
+    초 뒤에 호출된다. `TargetError` 를 발생시키면 transport 오류로 완료된다.
+    """
+
+    def __init__(self, handler: Handler, latency: float=0.0,
+                 max_queue: Optional[int]=None):
+        self._handler = handler
+        self.latency = latency
+        self.max_queue = max_queue
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        self._cond = threading.Condition()
+        self._scheduled = []
+        self._completed = deque()
+        self._error = None
+        self._seq = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def fileno(self) -> int:
+        return self._rfd
+
+    def submit(self, hdr):
+        copied = _pysg.ffi.new('sg_io_hdr_t *')
+        copied[0] = hdr[0]
+        now = time.monotonic()
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._scheduled,
+                           (now + self.latency, self._seq, now, copied))
+            self._cond.notify()
+
+    def reap(self, block: bool=False):
+        while True:
+            try:
+                os.read(self._rfd, 1)
+            except BlockingIOError:
+                if not block:
+                    return None
+                select.select([self._rfd], [], [])
+            else:
+                hdr, self._error = self._completed.popleft()
+                return hdr
+
+    def error(self, hdr) -> Optional[BaseException]:
+        return self._error
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        os.close(self._rfd)
+        os.close(self._wfd)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._scheduled:
+                        delay = self._scheduled[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                    else:
+                        delay = None
+                    self._cond.wait(delay)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                ready = []
+                while self._scheduled and self._scheduled[0][0] <= now:
+                    ready.append(heapq.heappop(self._scheduled))
+
+            for _, _, submitted, hdr in ready:
+                error = self._execute(hdr)
+                hdr.duration = int((time.monotonic() - submitted) * 1000)
+                self._completed.append((hdr, error))
+                os.write(self._wfd, b'\0')
+
+    def _execute(self, hdr) -> Optional[BaseException]:
+        # handler 의 bug 로 발생한 예외는 이 thread 에서 발생시키지 않고
+        # 반환해서 `reap()` 한 쪽에 전달한다.
+        ffi = _pysg.ffi
+        lib = _pysg.lib
+
+        cdb = ffi.buffer(hdr.cmdp, hdr.cmd_len)[:]
+        data_in = data_out = None
+        segments = None
+        if hdr.dxfer_len:
+            if hdr.iovec_count:
+                # handler 에는 이어 붙인 buffer 를 넘기고, 받은 data 는 끝난
+                # 뒤에 각 iovec 으로 나눈다. (sg 드라이버의 indirect IO 와 같음)
+                iov = ffi.cast('sg_iovec_t *', hdr.dxferp)
+                segments = [ffi.buffer(ffi.cast('unsigned char *', iov[i].iov_base),
+                                       iov[i].iov_len)
+                            for i in range(hdr.iovec_count)]
+                data = memoryview(bytearray(hdr.dxfer_len))
+                if hdr.dxfer_direction == lib.SG_DXFER_TO_DEV:
+                    offset = 0
+                    for seg in segments:
+                        data[offset:offset + len(seg)] = seg
+                        offset += len(seg)
+            else:
+                data = memoryview(ffi.buffer(ffi.cast('unsigned char *', hdr.dxferp),
+                                             hdr.dxfer_len))
+            if hdr.dxfer_direction == lib.SG_DXFER_TO_DEV:
+                data_out = data
+            elif hdr.dxfer_direction in (lib.SG_DXFER_FROM_DEV,
+                                         lib.SG_DXFER_TO_FROM_DEV):
+                data_in = data
+
+        try:
+            status, sense, resid = self._handler(cdb, data_in, data_out)
+        except TargetError:
+            hdr.host_status = _DID_ERROR
+            hdr.info = lib.SG_INFO_CHECK
+            return None
+        except Exception as e:
+            hdr.host_status = _DID_ERROR
+            hdr.info = lib.SG_INFO_CHECK
+            return e
+
+        if segments is not None and data_in is not None:
+            offset = 0
+            for seg in segments:
+                seg[:] = data_in[offset:offset + len(seg)]
+                offset += len(seg)
+
+        sb_len = min(len(sense), hdr.mx_sb_len)
+        if sb_len:
+            ffi.memmove(hdr.sbp, sense, sb_len)
+        hdr.status = status
+        hdr.masked_status = (status >> 1) & 0x7f
+        hdr.sb_len_wr = sb_len
+        hdr.host_status = 0
+        hdr.driver_status = _DRIVER_SENSE if sb_len else 0
+        hdr.resid = resid
+        hdr.info = lib.SG_INFO_CHECK if status or sb_len else 0
+        return None
+
+
+class CommandQueue(object):
+    """
+    한 장치에 여러 command 를 동시에 진행시키는 queue
+
+    `submit()` 으로 command 를 제출하고 `reap()` 으로 완료된 command 를
+    회수하는 저수준 API 와, asyncio 에서 사용할 수 있는 `command_async()` 를
+    제공한다. 하나의 queue 는 하나의 thread 또는 하나의 event loop 에서만
+    사용해야 한다.
+
+    .. note::
+        sg v3 드라이버는 fd 하나 당 `SG_MAX_QUEUE` 개까지만 command 를 받으므로,
+        더 깊은 queue depth 가 필요하면 같은 장치를 여러 번 연 backend 들을
+        넘겨준다. command 는 가장 한가한 backend 로 분배된다.
+    """
+
+    def __init__(self, backends: Union[Backend, Iterable[Backend]],
+                 depth: int=32, timeout: int=5):
+        """
+        :param backends: command 를 실행할 backend 들
+        :type backends: Union[Backend, Iterable[Backend]]
+        :param depth: 동시에 진행할 최대 command 수
+        :type depth: int
+        :param timeout: `submit()` 에 timeout 이 주어지지 않은 경우 사용할 값
+        :type timeout: int
+        """
+        if isinstance(backends, Backend):
+            backends = [backends]
+        self._backends = list(backends)
+        self._inflight = [0] * len(self._backends)
+        self.depth = depth
+        self.timeout = timeout
+        self._pending = {}
+        self._completed = deque()
+        self._next_id = 0
+        self._loop = None
+        self._slot_waiters = deque()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _pick_backend(self) -> Optional[int]:
+        if sum(self._inflight) >= self.depth:
+            return None
+        best = None
+        for idx, backend in enumerate(self._backends):
+            n = self._inflight[idx]
+            if backend.max_queue is not None and n >= backend.max_queue:
+                continue
+            if best is None or n < self._inflight[best]:
+                best = idx
+        return best
+
+    def _request(self, cmd, *args, **kwargs) -> Request:
+        if isinstance(cmd, Request):
+            return cmd
+        kwargs.setdefault('timeout', self.timeout)
+        return Request(cmd, *args, **kwargs)
+
+    def _submit_to(self, idx: int, req: Request):
+        self._next_id = (self._next_id + 1) & 0x7fffffff
+        req._hdr.pack_id = self._next_id
+        self._backends[idx].submit(req._hdr)
+        self._pending[self._next_id] = req
+        self._inflight[idx] += 1
+
+    def _poll(self) -> int:
+        count = 0
+        for idx, backend in enumerate(self._backends):
+            while True:
+                hdr = backend.reap(False)
+                if hdr is None:
+                    break
+                # 모르는 pack_id 라도 이 backend 에서 자리 하나가 비었다.
+                self._inflight[idx] -= 1
+                req = self._pending.pop(hdr.pack_id, None)
+                if req is None:
+                    _log.warning("Reaped a command with unknown pack_id %d",
+                                 hdr.pack_id)
+                    continue
+                req._finish(hdr)
+                req.error = backend.error(hdr)
+                self._dispatch(req)
+                count += 1
+        return count
+
+    def _dispatch(self, req: Request):
+        if req._future is not None:
+            if not req._future.done():
+                req._future.set_result(req)
+        elif not req._detached:
+            self._completed.append(req)
+
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def _wait(self):
+        fds = [backend.fileno()
+               for idx, backend in enumerate(self._backends)
+               if self._inflight[idx]]
+        if fds:
+            select.select(fds, [], [])
+
+    def submit(self, cmd: Union[Command, Request], *args, **kwargs) -> Request:
+        """
+        command 를 제출하고 바로 반환한다. queue 가 가득 차 있으면 빈 자리가
+        생길 때까지 기다리며, 그 사이에 완료된 command 는 다음 `reap()` 에서
+        돌려준다.
+
+        :param cmd: `Command` 또는 미리 만들어 둔 `Request`. `Command` 인 경우
+                    나머지 인자는 `Request` 에 그대로 전달된다.
+        :type cmd: Union[Command, Request]
+        :return: 제출된 `Request`
+        :rtype: Request
+        """
+        req = self._request(cmd, *args, **kwargs)
+        idx = self._pick_backend()
+        while idx is None:
+            self._wait()
+            self._poll()
+            idx = self._pick_backend()
+        self._submit_to(idx, req)
+        return req
+
+    def reap(self, min_count: int=1, block: bool=True) -> List[Request]:
+        """
+        완료된 command 들을 회수한다.
+
+        :param min_count: `block` 인 경우 최소한 이만큼 완료될 때까지 기다린다.
+        :type min_count: int
+        :param block: False 면 이미 완료된 것만 회수한다.
+        :type block: bool
+        :return: 완료된 `Request` 목록
+        :rtype: List[Request]
+        :raises: backend 가 command 를 처리하다 예외가 발생했으면 그 예외.
+                 함께 완료된 나머지 command 는 다음 `reap()` 에서 돌려준다.
+        """
+        self._poll()
+        while block and len(self._completed) < min_count and self._pending:
+            self._wait()
+            self._poll()
+        done = list(self._completed)
+        self._completed.clear()
+        for req in done:
+            if req.error is not None:
+                done.remove(req)
+                self._completed.extend(done)
+                raise req.error
+        return done
+
+    def wait(self, req: Request) -> Request:
+        """
+        주어진 command 가 완료될 때까지 기다린다. 이 command 는 `reap()` 으로
+        회수되지 않는다.
+        """
+        req._detached = True
+        if req in self._completed:
+            self._completed.remove(req)
+        while not req.done:
+            self._wait()
+            self._poll()
+        if req.error is not None:
+            raise req.error
+        return req
+
+    def command(self, cmd: Command, *args, **kwargs) -> Request:
+        """
+        command 하나를 제출하고 완료될 때까지 기다린 뒤 결과를 검사한다.
+        """
+        req = self.wait(self.submit(cmd, *args, **kwargs))
+        req.check()
+        return req
+
+    def run_batch(self, batch: 'Batch') -> 'BatchResult':
+        """
+        `Batch` 에 담긴 command 들을 queue depth 만큼씩 제출하고, 완료된
+        것들을 한 번에 회수하면서 결과를 column 형태로 모은다. command 마다
+        `Request` 를 만들지 않으므로 queue 에 진행 중인 command 가 없어야 한다.
+
+        :param batch: 실행할 command 들
+        :type batch: pysg.batch.Batch
+        :rtype: pysg.batch.BatchResult
+        """
+        from .batch import BatchResult
+
+        if self._pending:
+            raise RuntimeError("run_batch() requires an idle CommandQueue")
+
+        result = BatchResult(batch)
+        error = None
+        hdrs = batch._hdrs
+        n = len(batch)
+        submitted = 0
+        remaining = n
+        while remaining:
+            while submitted < n:
+                idx = self._pick_backend()
+                if idx is None:
+                    break
+                hdr = hdrs + submitted
+                hdr.pack_id = submitted
+                submitted += 1
+                try:
+                    self._backends[idx].submit(hdr)
+                except OSError as e:
+                    result._fail(hdr.pack_id, e.errno)
+                    remaining -= 1
+                else:
+                    self._inflight[idx] += 1
+
+            reaped = 0
+            for idx, backend in enumerate(self._backends):
+                while True:
+                    hdr = backend.reap(False)
+                    if hdr is None:
+                        break
+                    result._store(hdr)
+                    if error is None:
+                        error = backend.error(hdr)
+                    self._inflight[idx] -= 1
+                    reaped += 1
+            remaining -= reaped
+            if not reaped and remaining:
+                self._wait()
+        result._done()
+        if error is not None:
+            raise error
+        return result
+
+    def _attach(self, loop):
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            raise RuntimeError("CommandQueue is bound to another event loop")
+        for backend in self._backends:
+            loop.add_reader(backend.fileno(), self._poll)
+        self._loop = loop
+
+    def _detach(self):
+        if self._loop is not None and not self._loop.is_closed():
+            for backend in self._backends:
+                self._loop.remove_reader(backend.fileno())
+        self._loop = None
+
+    async def command_async(self, cmd: Command, *args, **kwargs) -> Request:
+        """
+        asyncio 용 `command()`. 완료를 기다리는 동안 다른 task 가 command 를
+        제출할 수 있으므로 여러 task 로 queue depth 만큼 command 를 진행시킬
+        수 있다.
+        """
+        loop = asyncio.get_running_loop()
+        self._attach(loop)
+        req = self._request(cmd, *args, **kwargs)
+        idx = self._pick_backend()
+        while idx is None:
+            waiter = loop.create_future()
+            self._slot_waiters.append(waiter)
+            await waiter
+            idx = self._pick_backend()
+        req._future = loop.create_future()
+        self._submit_to(idx, req)
+        await req._future
+        req.check()
+        return req
+
+    def close(self):
+        self._detach()
+        for backend in self._backends:
+            backend.close()
+        self._backends = []
+        self._inflight = []
@@ -0,0 +1,324 @@
+from . import _pysg, Buffer, as_buffer
+from .sense import Sense
+from .cmd import Command, command
+from .enum import StatusCodes, PTResult
+from .device import result_error, _transferred
+from .aio import result_category, request_buffer, set_data
+from array import array
+from typing import Optional, List, Iterable, Iterator, Tuple, Union
+
+
+BatchItem = Union[Command,
+                  Tuple[Command, Optional[Buffer]],
+                  Tuple[Command, Optional[Buffer], Optional[Buffer]]]
+
+
+class Batch(object):
+    """
+    한꺼번에 제출할 command 들의 `sg_io_hdr_t` 배열
+
+    header 와 sense buffer 는 각각 하나의 연속된 메모리로 미리 할당되며,
+    command 마다 Python 객체를 따로 만들지 않는다.
+    """
+
+    def __init__(self, size: int, sense_size: int=32, timeout: int=5):
+        """
+        :param size: 담을 수 있는 최대 command 수
+        :type size: int
+        :param sense_size: command 하나 당 sense buffer 크기
+        :type sense_size: int
+        :param timeout: 초 단위 timeout
+        :type timeout: int
+        """
+        self._hdrs = _pysg.ffi.new('sg_io_hdr_t[]', size)
+        self._sense = Buffer(size=size * sense_size)
+        self._sense_size = sense_size
+        self._timeout = timeout * 1000
+        self._cmds = []
+        self._data = []
+        # `add_cdbs()` 로 추가된 CDB 배열과 `(data buffer, 시작 index, 수,
+        # transfer_size)`
+        self._keep = []
+        self._bulk = []
+
+    @classmethod
+    def from_commands(cls, commands: Iterable[BatchItem], sense_size: int=32,
+                      timeout: int=5) -> 'Batch':
+        """
+        `Command` 또는 `(cmd, data_in, data_out)` tuple 들로 `Batch` 를 만든다.
+        """
+        items = list(commands)
+        batch = cls(len(items), sense_size, timeout)
+        for item in items:
+            if isinstance(item, Command):
+                batch.add(item)
+            else:
+                batch.add(*item)
+        return batch
+
+    def __len__(self):
+        return len(self._cmds)
+
+    def _init_hdr(self, idx: int):
+        hdr = self._hdrs[idx]
+        hdr.interface_id = ord('S')
+        hdr.mx_sb_len = self._sense_size
+        hdr.sbp = self._sense.ptr + idx * self._sense_size
+        hdr.timeout = self._timeout
+        return hdr
+
+    def add(self, cmd: Command, data_in: Optional[Buffer]=None,
+            data_out: Optional[Buffer]=None, flags: int=0):
+        """
+        command 하나를 추가한다.
+
+        :param cmd: 실행할 command
+        :type cmd: Command
+        :param data_in: 장치에서 읽은 data 를 받을 buffer. buffer protocol 을
+                        지원하는 객체도 사용할 수 있으며, 여러 buffer 의
+                        list 는 iovec 으로 전송한다.
+        :type data_in: Optional[Buffer]
+        :param data_out: 장치로 보낼 data 가 담긴 buffer (또는 buffer 의 list)
+        :type data_out: Optional[Buffer]
+        :param flags: `SG_FLAG_*` 값
+        :type flags: int
+        """
+        data_in = request_buffer(data_in, True)
+        data_out = request_buffer(data_out)
+        idx = len(self._cmds)
+        if idx >= len(self._hdrs):
+            raise IndexError("Batch is full")
+        hdr = self._init_hdr(idx)
+        hdr.cmd_len = len(cmd)
+        hdr.cmdp = _pysg.ffi.cast('unsigned char *', cmd._cdb_ptr)
+        hdr.flags = flags
+        set_data(hdr, data_in, data_out)
+        self._cmds.append(cmd)
+        self._data.append(data_in if data_in is not None else data_out)
+
+    def add_cdbs(self, cdbs, data_in=None, data_out=None,
+                 transfer_size: int=0, flags: int=0):
+        """
+        `pysg.cmd.template.CommandTemplate.build()` 로 만든 CDB 배열을
+        `Command` 객체를 만들지 않고 그대로 추가한다. header 들은 배열의
+        메모리를 직접 가리킨다.
+
+        :param cdbs: `(N, CDB 길이)` 모양의 C-contiguous 배열
+        :param data_in: `N * transfer_size` byte 이상의 읽기용 buffer
+        :param data_out: `N * transfer_size` byte 이상의 쓰기용 buffer
+        :param transfer_size: command 하나 당 data 크기
+        :type transfer_size: int
+        :param flags: `SG_FLAG_*` 값
+        :type flags: int
+        """
+        lib = _pysg.lib
+
+        view = memoryview(cdbs)
+        if view.ndim != 2:
+            raise ValueError("CDB array must be 2-dimensional")
+        count, cdb_len = view.shape
+        start = len(self._cmds)
+        if start + count > len(self._hdrs):
+            raise IndexError("Batch is full")
+        ptr = _pysg.ffi.from_buffer('unsigned char[]', view.cast('B'))
+
+        if data_in is not None:
+            data = as_buffer(data_in, True)
+            direction = lib.SG_DXFER_FROM_DEV
+        elif data_out is not None:
+            data = as_buffer(data_out)
+            direction = lib.SG_DXFER_TO_DEV
+        else:
+            data = None
+            direction = lib.SG_DXFER_NONE
+        if data is not None and len(data) < count * transfer_size:
+            raise ValueError("Data buffer is smaller than {} bytes".format(
+                count * transfer_size))
+
+        for i in range(count):
+            hdr = self._init_hdr(start + i)
+            hdr.cmd_len = cdb_len
+            hdr.cmdp = ptr + i * cdb_len
+            hdr.flags = flags
+            hdr.dxfer_direction = direction
+            if data is not None:
+                hdr.dxferp = data.ptr + i * transfer_size
+                hdr.dxfer_len = transfer_size
+
+        self._cmds.extend([None] * count)
+        self._data.extend([None] * count)
+        self._keep.append((view, ptr))
+        if data is not None:
+            self._bulk.append((data, start, count, transfer_size))
+
+
+class BatchEntry(object):
+    """
+    `BatchResult` 의 한 항목. 실패한 항목의 예외를 만들 때 사용하며
+    `PTObject` 와 같은 이름의 property 를 제공한다.
+    """
+
+    def __init__(self, result: 'BatchResult', index: int):
+        self._result = result
+        self.index = index
+
+    def __repr__(self):
+        return "<{}.{}: #{} {} [{}]>".format(self.__class__.__module__,
+                                             self.__class__.__name__,
+                                             self.index, str(self.cmd),
+                                             self.result_category.name)
+
+    @property
+    def cmd(self) -> Command:
+        batch = self._result._batch
+        cmd = batch._cmds[self.index]
+        if cmd is None:
+            # `add_cdbs()` 로 추가된 항목은 필요할 때 CDB 를 해석한다.
+            hdr = batch._hdrs[self.index]
+            cmd = command(_pysg.ffi.buffer(hdr.cmdp, hdr.cmd_len)[:])
+        return cmd
+
+    @property
+    def data(self) -> Buffer:
+        return self._result._batch._data[self.index]
+
+    @property
+    def sense(self) -> Optional[Sense]:
+        return self._result.sense(self.index)
+
+    @property
+    def status_response(self) -> StatusCodes:
+        return StatusCodes(self._result.status[self.index])
+
+    @property
+    def resid(self) -> int:
+        return self._result.resid[self.index]
+
+    @property
+    def duration_ms(self) -> int:
+        return self._result.duration[self.index]
+
+    @property
+    def os_err(self) -> int:
+        return self._result.os_err[self.index]
+
+    @property
+    def transport_err(self) -> int:
+        r = self._result
+        return (r.host_status[self.index] << 8) | r.driver_status[self.index]
+
+    @property
+    def transport_err_str(self) -> str:
+        r = self._result
+        return "host_status={:#x}, driver_status={:#x}".format(
+                r.host_status[self.index], r.driver_status[self.index])
+
+    @property
+    def result_category(self) -> PTResult:
+        return self._result.category(self.index)
+
+
+class BatchResult(object):
+    """
+    `Batch` 실행 결과
+
+    결과는 command 마다 객체를 만들지 않고 `array` 로 된 column 들에
+    보관된다. `sense_offset` 은 sense 가 기록된 경우 `sense_buffer` 내의
+    offset 이고 아니면 -1 이다. 실패한 항목에 대해서만 `errors()` 로 예외
+    객체를 만든다.
+    """
+
+    def __init__(self, batch: Batch):
+        n = len(batch)
+        self._batch = batch
+        self.status = array('B', bytes(n))
+        self.host_status = array('H', [0]) * n
+        self.driver_status = array('H', [0]) * n
+        self.resid = array('i', [0]) * n
+        self.duration = array('I', [0]) * n
+        self.os_err = array('i', [0]) * n
+        self.sense_len = array('B', bytes(n))
+        self.sense_offset = array('i', [-1]) * n
+
+    def __len__(self):
+        return len(self.status)
+
+    def _store(self, hdr):
+        idx = hdr.pack_id
+        self.status[idx] = hdr.status
+        self.host_status[idx] = hdr.host_status
+        self.driver_status[idx] = hdr.driver_status
+        self.resid[idx] = hdr.resid
+        self.duration[idx] = hdr.duration
+        data = self._batch._data[idx]
+        if data is not None and hdr.dxfer_direction == _pysg.lib.SG_DXFER_FROM_DEV:
+            data.flush(_transferred(len(data), hdr.resid))
+        if hdr.sb_len_wr:
+            self.sense_len[idx] = hdr.sb_len_wr
+            self.sense_offset[idx] = idx * self._batch._sense_size
+
+    def _fail(self, idx: int, err: int):
+        self.os_err[idx] = err
+
+    def _done(self):
+        # `add_cdbs()` 의 buffer 는 `_store()` 와 같이 항목마다 전송된
+        # 만큼만 돌려놓는다.
+        for data, start, count, size in self._batch._bulk:
+            for i in range(count):
+                idx = start + i
+                if not self.os_err[idx]:
+                    data.flush(_transferred(size, self.resid[idx]), i * size)
+
+    @property
+    def sense_buffer(self) -> Buffer:
+        """
+        모든 항목의 sense 가 담긴 연속된 buffer
+        """
+        return self._batch._sense
+
+    def category(self, idx: int) -> PTResult:
+        return result_category(self.status[idx], self.host_status[idx],
+                               self.driver_status[idx], self.os_err[idx])
+
+    def sense(self, idx: int) -> Optional[Sense]:
+        """
+        `idx` 번째 항목의 sense 를 복사한 `Sense` 를 만든다.
+        """
+        offset = self.sense_offset[idx]
+        if offset < 0:
+            return None
+        return Sense(init=self._batch._sense.buffer[offset:offset + self._batch._sense_size])
+
+    def failed(self) -> List[int]:
+        """
+        실패한 항목들의 index
+        """
+        status = self.status
+        host_status = self.host_status
+        driver_status = self.driver_status
+        os_err = self.os_err
+        return [idx for idx in range(len(status))
+                if status[idx] or host_status[idx] or driver_status[idx] or
+                os_err[idx]]
+
+    def entry(self, idx: int) -> BatchEntry:
+        return BatchEntry(self, idx)
+
+    def errors(self) -> Iterator[Tuple[int, Exception]]:
+        """
+        실패한 항목마다 `PTObject.do_scsi_pt()` 가 발생시켰을 예외를 만든다.
+
+        :return: `(index, exception)` 의 iterator
+        :rtype: Iterator[Tuple[int, Exception]]
+        """
+        for idx in self.failed():
+            exc = result_error(self.entry(idx), self.category(idx))
+            if exc is not None:
+                yield idx, exc
+
+    def check(self):
+        """
+        실패한 항목이 있으면 그 중 첫 번째 항목의 예외를 발생시킨다.
+        """
+        for _, e in self.errors():
+            raise e
@@ -37,6 +37,7 @@ _pysg_builder.set_source('pysg._pysg', r"""
 #include <stdlib.h>
 #include <endian.h>
 #include <stdio.h>
+#include <scsi/sg.h>
 
 void * aligned_malloc(int size) {
     void * ptr = 0;
@@ -69,6 +70,45 @@ void fclose(FILE *);
 void setbuf(FILE *, char *);
 void * aligned_malloc(int);
 void aligned_free(void *);
+
+typedef struct sg_iovec {
+    void * iov_base;
+    size_t iov_len;
+} sg_iovec_t;
+
+typedef struct sg_io_hdr {
+    int interface_id;
+    int dxfer_direction;
+    unsigned char cmd_len;
+    unsigned char mx_sb_len;
+    unsigned short iovec_count;
+    unsigned int dxfer_len;
+    void * dxferp;
+    unsigned char * cmdp;
+    unsigned char * sbp;
+    unsigned int timeout;
+    unsigned int flags;
+    int pack_id;
+    void * usr_ptr;
+    unsigned char status;
+    unsigned char masked_status;
+    unsigned char msg_status;
+    unsigned char sb_len_wr;
+    unsigned short host_status;
+    unsigned short driver_status;
+    int resid;
+    unsigned int duration;
+    unsigned int info;
+    ...;
+} sg_io_hdr_t;
+
+#define SG_DXFER_NONE ...
+#define SG_DXFER_TO_DEV ...
+#define SG_DXFER_FROM_DEV ...
+#define SG_DXFER_TO_FROM_DEV ...
+#define SG_FLAG_DIRECT_IO ...
+#define SG_INFO_OK_MASK ...
+#define SG_INFO_CHECK ...
 """)
 
 if __name__ == "__main__":
@@ -1,6 +1,122 @@
 from .. import _pysg, sg_lib
+from .._common import DescriptionCache
 from ..enum import PeripheralDeviceTypes, PDT
 from typing import Optional, Type, NewType, Union, Tuple
+from operator import itemgetter
+import struct
+
+
+class CDBField(object):
+    """
+    CDB 내의 필드를 읽고 쓰는 descriptor. `Command.command_property()` 로
+    만든다.
+
+    필드 배치에 맞는 읽기/쓰기 함수를 생성할 때 한 번만 만들어 두므로
+    접근할 때마다 cffi 를 거치지 않는다.
+    """
+
+    __slots__ = ('offset', 'length', 'shift', 'width', 'read', 'write')
+
+    def __init__(self, msb: Union[Tuple[int, int], int],
+                 lsb: Union[Tuple[int, int], int, type(None)]=None):
+        if lsb is None:
+            lsb = msb
+        if isinstance(msb, int):
+            msb = (msb, 7)
+        if isinstance(lsb, int):
+            lsb = (lsb, 0)
+
+        m_byte, m_bit = msb
+        l_byte, l_bit = lsb
+        self.offset = m_byte
+        self.length = l_byte - m_byte + 1
+        self.shift = l_bit
+        if self.length < 1:
+            raise ValueError("MSB must be prior of LSB")
+        elif self.length > 8:
+            raise ValueError("More than 64bit integer is not supported")
+
+        # Single bit 인 경우 boolean 필드로 사용
+        if msb == lsb:
+            self.width = 1
+            self.read, self.write = self._compile_bit()
+        else:
+            self.width = (self.length - 1) * 8 + m_bit + 1 - l_bit
+            self.read, self.write = self._compile_int()
+
+    def _compile_bit(self):
+        pos = self.offset
+        bit = 1 << self.shift
+
+        def read(cdb) -> bool:
+            return cdb[pos] & bit != 0
+
+        def write(cdb, val: bool):
+            if val:
+                cdb[pos] |= bit
+            else:
+                cdb[pos] &= ~bit
+
+        return read, write
+
+    def _compile_int(self):
+        pos = self.offset
+        end = pos + self.length
+        shift = self.shift
+        mask = (1 << self.width) - 1
+        keep = ~(mask << shift) & ((1 << (self.length * 8)) - 1)
+
+        if not shift and self.width == self.length * 8 and \
+                self.length in (1, 2, 4, 8):
+            # byte 단위로 딱 맞는 필드는 struct 로 바로 읽고 쓴다.
+            st = struct.Struct({1: '>B', 2: '>H', 4: '>I', 8: '>Q'}[self.length])
+            unpack_from = st.unpack_from
+            pack_into = st.pack_into
+
+            def read(cdb) -> int:
+                return unpack_from(cdb, pos)[0]
+
+            def write(cdb, val: int):
+                pack_into(cdb, pos, val & mask)
+
+        elif self.length == 1:
+            def read(cdb) -> int:
+                return (cdb[pos] >> shift) & mask
+
+            def write(cdb, val: int):
+                cdb[pos] = (cdb[pos] & keep) | ((val & mask) << shift)
+
+        else:
+            length = self.length
+
+            def read(cdb) -> int:
+                return (int.from_bytes(cdb[pos:end], 'big') >> shift) & mask
+
+            def write(cdb, val: int):
+                cur = int.from_bytes(cdb[pos:end], 'big') & keep
+                cdb[pos:end] = (cur | ((val & mask) << shift)).to_bytes(length, 'big')
+
+        return read, write
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return self.read(obj._cdb)
+
+    def __set__(self, obj, val):
+        self.write(obj._cdb, val)
+
+
+# (opcode, service action, peripheral type) -> command 이름
+_name_cache = DescriptionCache()
+
+# CDB byte 1 의 하위 5 bit 가 service action (또는 READ/WRITE BUFFER 의
+# mode) 이라서 sg_lib 이 이름을 구할 때 사용하는 opcode 들. 그 외의 opcode
+# 에서는 이 bit 들이 DPO, FUA 같은 flag 이므로 이름과 관계가 없다.
+_SA_OPCODES = frozenset({
+    0x3b, 0x3c, 0x48, 0x5e, 0x5f, 0x83, 0x84, 0x8c, 0x94, 0x95, 0x9b,
+    0x9e, 0x9f, 0xa3, 0xa4, 0xa9, 0xab,
+})
 
 
 class Command(object):
@@ -9,6 +125,17 @@ class Command(object):
     """
 
     _command_map = []
+    _fields = {}
+
+    # `register()` 로 등록된 조건들의 색인.
+    # (opcode, service action) -> [(등록 순서, 조건, 클래스), ...] 이며
+    # 조건에 opcode 나 service action 이 없으면 None 을 key 로 사용한다.
+    _index = {}
+    # 조건 판단에 사용되는 CDB byte 들을 꺼내는 함수와, 그 값으로 찾은
+    # 결과를 보관하는 cache
+    _dispatch_key = None
+    _dispatch_cache = {}
+    _dispatch_cache_size = 4096
 
     service_action = None
     control = None
@@ -23,8 +150,8 @@ class Command(object):
         :type msb: Union[Tuple[int, int], int]
         :param lsb: 필드의 lsb 위치를 지정한다.
         :type lsb: Union[Tuple[int, int], int, type(None)]
-        :return: 해당 필드를 사용 가능하게 하는 `property` 객체
-        :rtype: property
+        :return: 해당 필드를 사용 가능하게 하는 descriptor
+        :rtype: CDBField
 
         .. note::
             lsb와 msb를 지정하는데 몇 가지 조건이 있다.
@@ -36,76 +163,19 @@ class Command(object):
                 * lsb에 int가 지정된 경우 byte offset으로 사용하고 bit
                   offset은 0을 사용한다.
         """
-        cast = _pysg.ffi.cast
-        from_buffer = _pysg.ffi.from_buffer
-
-        if lsb is None:
-            lsb = msb
-        if isinstance(msb, int):
-            msb = (msb, 7)
-        if isinstance(lsb, int):
-            lsb = (lsb, 0)
-
-        # Single bit 인 경우 boolean property로 사용
-        if msb == lsb:
-            B, b = msb
-            def fget(self) -> int:
-                v = self._cdb[B]
-                return v & (1 << b) != 0
-
-            def fset(self, val: bool):
-                if val:
-                    self._cdb[B] |= 1 << b
-                else:
-                    self._cdb[B] &= ~(1 << b)
-
-        else:
-            m_byte, m_bit = msb
-            l_byte, l_bit = lsb
-            size = l_byte - m_byte + 1
-            m_bit += (size - 1) * 8
-            if size < 1:
-                raise ValueError("MSB must be prior of LSB")
-            elif size == 1:
-                tp = 'uint8_t *'
-                def htoc(x):
-                    return x
-
-                def ctoh(x):
-                    return x
-            elif size == 2:
-                tp = 'uint16_t *'
-                m_bit += 8
-                htoc = _pysg.lib.htobe16
-                ctoh = _pysg.lib.be16toh
-            elif size <= 4:
-                tp = 'uint32_t *'
-                m_byte = l_byte - 3
-                htoc = _pysg.lib.htobe32
-                ctoh = _pysg.lib.be32toh
-            elif size <= 8:
-                tp = 'uint64_t *'
-                m_byte = l_byte - 7
-                htoc = _pysg.lib.htobe64
-                ctoh = _pysg.lib.be64toh
-            else:
-                raise ValueError("More than 64bit integer is not supported")
-
-            m_bit += 1
-
-            def fget(self) -> int:
-                val = cast(tp, self._cdb[m_byte:l_byte + 1])
-                return (ctoh(val[0]) & ((1 << m_bit) - 1)) >> l_bit
-
-            def fset(self, val: int):
-                val_ = cast(tp, self._cdb[m_byte:l_byte + 1])
-                val_ = ctoh(val_[0])
-                mask = ~((1 << m_bit) - 1) | ((1 << l_bit) - 1)
-                val_ = ctoh(val_[0]) & mask
-                new_val = val_ | ((val << l_bit) & ((1 << m_bit) - 1))
-                val_[0] = htoc(new_val)
-
-        return property(fget, fset)
+        return CDBField(msb, lsb)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 상속받은 것을 포함한 CDB 필드 배치를 클래스마다 한 번만 모아둔다.
+        fields = {}
+        for klass in reversed(cls.__mro__):
+            for k, v in vars(klass).items():
+                if isinstance(v, CDBField):
+                    fields[k] = v
+                elif k in fields:
+                    del fields[k]
+        cls._fields = fields
 
     @classmethod
     def register(cls, c: Optional[Type['Command']]=None, **kwargs):
@@ -123,7 +193,11 @@ class Command(object):
             # 분석용 맵에 추가하고 추가되는 클래스는 독자적인 분석용 맵을
             # 갖도록 한다. 이를 통해 재귀적 분석을 가능하게 한다.
             cls._command_map.append((kwargs.items(), c_))
+            cls._add_index(len(cls._command_map) - 1, kwargs, c_)
             c_._command_map = []
+            c_._index = {}
+            c_._dispatch_key = None
+            c_._dispatch_cache = {}
             return c_
 
         if c is None:
@@ -131,6 +205,111 @@ class Command(object):
         else:
             return decorator(c)
 
+    @staticmethod
+    def _index_keys(v) -> list:
+        # 조건 값이 가질 수 있는 값들. 나열할 수 없으면 None (모든 값)
+        if not hasattr(v, '__contains__'):
+            return [v]
+        try:
+            if len(v) <= 256:
+                return list(v)
+        except TypeError:
+            pass
+        return [None]
+
+    @classmethod
+    def _add_index(cls, order: int, cond: dict, c_: Type['Command']):
+        opcodes = cls._index_keys(cond['opcode']) if 'opcode' in cond else [None]
+        sas = (cls._index_keys(cond['service_action'])
+               if 'service_action' in cond else [None])
+        entry = (order, tuple(cond.items()), c_)
+        for op in opcodes:
+            for sa in sas:
+                cls._index.setdefault((op, sa), []).append(entry)
+
+        # 조건에 사용된 필드들의 byte 위치로 cache key 를 만든다.
+        # CDB 필드가 아닌 속성이 조건에 있으면 cache 를 사용하지 않는다.
+        positions = set()
+        if 'service_action' in cls._fields:
+            f = cls._fields['service_action']
+            positions.update(range(f.offset, f.offset + f.length))
+        for cond_, _ in cls._command_map:
+            for k, _ in cond_:
+                if k == 'opcode':
+                    positions.add(0)
+                elif k in cls._fields:
+                    f = cls._fields[k]
+                    positions.update(range(f.offset, f.offset + f.length))
+                else:
+                    positions = None
+                    break
+            if positions is None:
+                break
+        cls._dispatch_key = (itemgetter(*sorted(positions))
+                             if positions else None)
+        cls._dispatch_cache = {}
+
+    @classmethod
+    def _cond_value(cls, k: str, cmd: 'Command', level: list):
+        field = cls._fields.get(k)
+        if field is not None:
+            return field.read(cmd._cdb)
+        elif k == 'opcode':
+            return cmd._cdb[0]
+        # CDB 필드가 아닌 속성은 이 단계의 클래스로 만든 객체에서 읽는다.
+        if not level:
+            level.append(cmd if type(cmd) is cls else cls(cmd.cdb, cmd.peri_type))
+        return getattr(level[0], k)
+
+    @classmethod
+    def _match(cls, cmd: 'Command') -> Optional[Type['Command']]:
+        op = cmd._cdb[0]
+        level = []
+        # service action 이 CDB 필드가 아니면 (property 등) 조건을 판단할 때와
+        # 같은 방법으로 읽는다.
+        sa = cls._cond_value('service_action', cmd, level)
+        index = cls._index
+        candidates = []
+        for key in {(op, sa), (op, None), (None, sa), (None, None)}:
+            candidates.extend(index.get(key, ()))
+        candidates.sort(key=lambda e: e[0])
+
+        for _, cond, c in candidates:
+            for k, v in cond:
+                if not hasattr(v, '__contains__'):
+                    v = (v,)
+                if cls._cond_value(k, cmd, level) not in v:
+                    break
+            else:
+                return c
+        return None
+
+    @classmethod
+    def _dispatch(cls, cmd: 'Command') -> Optional[Type['Command']]:
+        """
+        `cmd` 의 CDB 가 만족하는, `cls` 에 등록된 하위 command 클래스를 찾는다.
+        """
+        if not cls._command_map:
+            return None
+        key = None
+        if cls._dispatch_key is not None:
+            try:
+                key = cls._dispatch_key(cmd._cdb)
+            except IndexError:
+                pass
+            else:
+                try:
+                    return cls._dispatch_cache[key]
+                except KeyError:
+                    pass
+
+        found = cls._match(cmd)
+        if key is not None:
+            if len(cls._dispatch_cache) >= cls._dispatch_cache_size:
+                cls._dispatch_cache.clear()
+            cls._dispatch_cache[key] = found
+        return found
+
     def __init__(self, seq: bytes, peri_type: PeripheralDeviceTypes=PDT.DISK):
         """
         주어진 CDB sequence 로 SCSI Command 객체를 생성한다.
@@ -143,9 +322,6 @@ class Command(object):
         .. note::
             `peri_type` 은 description 을 볼 때만 참고하므로 중요하지 않다.
         """
-        self._cdb = None
-        self._cdb_buf = None
-        self._cdb_len = None
         cdb0 = seq[0]
         if cdb0 >= 0xc0:
             l = len(seq)
@@ -153,8 +329,12 @@ class Command(object):
             l = seq[7] + 8
         else:
             l = sg_lib.lib.sg_get_command_size(cdb0)
-        self._cdb = _pysg.ffi.new('uint8_t[{}]'.format(l), seq)
-        self._cdb_buf = _pysg.ffi.buffer(self._cdb)
+        if len(seq) > l:
+            raise ValueError("CDB is longer than {} bytes".format(l))
+        self._cdb = bytearray(l)
+        self._cdb[:len(seq)] = seq
+        # C 함수에 넘길 때 사용하는 포인터. `_cdb` 를 복사하지 않고 가리킨다.
+        self._cdb_ptr = _pysg.ffi.from_buffer('uint8_t[]', self._cdb, True)
         self._cdb_len = l
         self.peri_type = peri_type
 
@@ -171,7 +351,7 @@ class Command(object):
             가리키게 될 가능성이 있고, `Command` 객체가 수정되어도 이미 `cdb`
             property로 얻어낸 값은 변하지 않는다.
         """
-        return self._cdb_buf[:]
+        return bytes(self._cdb)
 
     @property
     def opcode(self) -> int:
@@ -191,9 +371,26 @@ class Command(object):
 
         :return: Command name
         :rtype: str
+
+        .. note::
+            이름은 opcode, service action, peripheral type 으로 결정되므로
+            이 셋을 key 로 `_name_cache` 에 보관해 두고 재사용한다. service
+            action 이 없는 opcode 는 byte 1 의 flag 와 관계없이 하나만
+            보관한다.
         """
+        cdb = self._cdb
+        op = cdb[0]
+        if op == 0x7f:
+            sa = (cdb[8] << 8) | cdb[9] if len(cdb) > 9 else 0
+        elif op in _SA_OPCODES:
+            sa = cdb[1] & 0x1f if len(cdb) > 1 else 0
+        else:
+            sa = None
+        return _name_cache.get((op, sa, int(self.peri_type)), self._get_name)
+
+    def _get_name(self) -> str:
         buf = _pysg.ffi.new('char[128]')
-        sg_lib.lib.sg_get_command_name(_pysg.ffi.cast('unsigned char *', self._cdb),
+        sg_lib.lib.sg_get_command_name(_pysg.ffi.cast('unsigned char *', self._cdb_ptr),
                                         self.peri_type, 128, buf)
         return _pysg.ffi.string(buf).decode('utf-8')
 
@@ -208,6 +405,25 @@ class Command(object):
     def __len__(self):
         return self._cdb_len
 
+    def set(self, **fields) -> 'Command':
+        """
+        여러 CDB 필드를 한 번에 설정한다.
+
+            cmd.set(lba=0x1000, transfer_length=8)
+
+        :return: self
+        :rtype: Command
+        """
+        cdb = self._cdb
+        layout = self._fields
+        for k, v in fields.items():
+            try:
+                layout[k].write(cdb, v)
+            except KeyError:
+                raise AttributeError("{} has no CDB field '{}'".format(
+                    self.__class__.__name__, k)) from None
+        return self
+
 DerivedCommand = NewType('DerivedCommand', Command)
 
 
@@ -215,7 +431,8 @@ def command(seq: bytes, peri_type: PeripheralDeviceTypes=PDT.DISK)\
         -> DerivedCommand:
     """
     `Command.register()` 로 등록된 클래스들을 찾으면서 맞는 클래스로
-    만들어준다.
+    만들어준다. 등록할 때 만들어진 색인과 cache 를 사용하므로 등록된
+    클래스 수가 많아도 단계마다 dict 조회 몇 번으로 끝난다.
 
     :param seq: CDB sequence
     :type seq: bytes
@@ -226,19 +443,16 @@ def command(seq: bytes, peri_type: PeripheralDeviceTypes=PDT.DISK)\
     """
 
     cmd = Command(seq, peri_type)
-    ok = True
-    while cmd._command_map and ok:
-        ok = True
-        for cond, c in cmd._command_map:
-            ok = True
-            for k, v in cond:
-                if not hasattr(v, '__contains__'):
-                    v = (v,)
-                if getattr(cmd, k) not in v:
-                    ok = False
-                    break
-            if ok:
-                cmd = c(seq=seq, peri_type=peri_type)
-                break
-    return cmd
-
+    cls = Command
+    while True:
+        c = cls._dispatch(cmd)
+        if c is None:
+            break
+        cls = c
+    if cls is Command:
+        return cmd
+    if cls.__init__ is Command.__init__:
+        # 생성자가 같으면 CDB 를 다시 만들 필요 없이 클래스만 바꾼다.
+        cmd.__class__ = cls
+        return cmd
+    return cls(seq=seq, peri_type=peri_type)
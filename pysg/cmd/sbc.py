@@ -0,0 +1,102 @@
+from . import Command
+
+
+class _ReadWrite10(Command):
+    rdprotect = Command.command_property((1, 7), (1, 5))
+    dpo = Command.command_property((1, 4))
+    fua = Command.command_property((1, 3))
+    lba = Command.command_property(2, 5)
+    group_number = Command.command_property((6, 4), 6)
+    transfer_length = Command.command_property(7, 8)
+    control = Command.command_property(9)
+
+
+class _ReadWrite16(Command):
+    rdprotect = Command.command_property((1, 7), (1, 5))
+    dpo = Command.command_property((1, 4))
+    fua = Command.command_property((1, 3))
+    lba = Command.command_property(2, 9)
+    transfer_length = Command.command_property(10, 13)
+    group_number = Command.command_property((14, 5), 14)
+    control = Command.command_property(15)
+
+
+class Read10(_ReadWrite10):
+    """
+    READ (10) (SBC)
+    """
+
+
+class Write10(_ReadWrite10):
+    """
+    WRITE (10) (SBC)
+    """
+
+
+class Read16(_ReadWrite16):
+    """
+    READ (16) (SBC)
+    """
+
+
+class Write16(_ReadWrite16):
+    """
+    WRITE (16) (SBC)
+    """
+
+
+class Verify16(_ReadWrite16):
+    """
+    VERIFY (16) (SBC). `transfer_length` 는 VERIFICATION LENGTH 이다.
+    """
+
+    bytchk = Command.command_property((1, 2), (1, 1))
+
+
+class ReadCapacity10(Command):
+    """
+    READ CAPACITY (10) (SBC)
+    """
+
+    control = Command.command_property(9)
+
+
+class ServiceActionIn16(Command):
+    """
+    SERVICE ACTION IN (16)
+    """
+
+    service_action = Command.command_property((1, 4), 1)
+    control = Command.command_property(15)
+
+
+class ReadCapacity16(ServiceActionIn16):
+    """
+    READ CAPACITY (16) (SBC)
+    """
+
+    lba = Command.command_property(2, 9)
+    allocation_length = Command.command_property(10, 13)
+    pmi = Command.command_property((14, 0))
+
+
+_registered = False
+
+
+def register():
+    """
+    이 모듈의 command 들을 `pysg.cmd.command()` 가 찾을 수 있도록
+    `Command.register()` 로 등록한다. import 하는 것만으로는 등록되지 않으며,
+    여러 번 호출해도 한 번만 등록된다.
+    """
+    global _registered
+    if _registered:
+        return
+    _registered = True
+    for opcode, c in ((0x28, Read10), (0x2a, Write10), (0x88, Read16),
+                      (0x8a, Write16), (0x8f, Verify16), (0x25, ReadCapacity10),
+                      (0x9e, ServiceActionIn16)):
+        Command.register(c, opcode=opcode)
+    # `Command.register()` 는 등록하는 클래스의 하위 등록을 비우므로
+    # ServiceActionIn16 을 등록한 뒤에 등록한다.
+    ServiceActionIn16.register(ReadCapacity16, service_action=0x10)
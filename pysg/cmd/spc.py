@@ -0,0 +1,37 @@
+from . import Command
+
+
+class TestUnitReady(Command):
+    """
+    TEST UNIT READY (SPC)
+    """
+
+    control = Command.command_property(5)
+
+
+class Inquiry(Command):
+    """
+    INQUIRY (SPC)
+    """
+
+    evpd = Command.command_property((1, 0))
+    page_code = Command.command_property(2)
+    allocation_length = Command.command_property(3, 4)
+    control = Command.command_property(5)
+
+
+_registered = False
+
+
+def register():
+    """
+    이 모듈의 command 들을 `pysg.cmd.command()` 가 찾을 수 있도록
+    `Command.register()` 로 등록한다. import 하는 것만으로는 등록되지 않으며,
+    여러 번 호출해도 한 번만 등록된다.
+    """
+    global _registered
+    if _registered:
+        return
+    _registered = True
+    Command.register(TestUnitReady, opcode=0x00)
+    Command.register(Inquiry, opcode=0x12)
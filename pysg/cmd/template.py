@@ -0,0 +1,106 @@
+from . import Command, CDBField, command
+from ..enum import PeripheralDeviceTypes, PDT
+from typing import Union, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CommandTemplate(object):
+    """
+    거의 같은 CDB 여러 개를 NumPy 로 한 번에 만드는 template
+
+    고정된 필드는 prototype CDB 에 설정해 두고, command 마다 달라지는
+    필드는 배열로 넘겨 `(N, CDB 길이)` 모양의 `uint8` 배열을 만든다. 결과는
+    `pysg.batch.Batch.add_cdbs()` 로 바로 제출할 수 있다.
+
+        tpl = CommandTemplate(Read16(b'\x88'), transfer_length=8)
+        cdbs = tpl.build(lba=np.arange(0, 1 << 20, 8))
+
+    opcode 나 CDB 로 만들면 `register()` 로 등록된 클래스의 필드만 사용할
+    수 있다. `pysg.cmd.sbc` 의 command 들은 `pysg.cmd.sbc.register()` 를
+    호출해야 등록된다.
+    """
+
+    def __init__(self, prototype: Union[Command, bytes, int],
+                 peri_type: PeripheralDeviceTypes=PDT.DISK, **fixed):
+        """
+        :param prototype: opcode, CDB 또는 `Command`. opcode 나 CDB 인 경우
+                          `pysg.cmd.command()` 로 해석한다.
+        :type prototype: Union[Command, bytes, int]
+        :param peri_type: Peripheral Type
+        :type peri_type: PeripheralDeviceTypes
+        :param fixed: 모든 CDB 에 공통으로 설정할 필드 값
+        """
+        if np is None:
+            raise ImportError("CommandTemplate requires NumPy")
+
+        if isinstance(prototype, int):
+            prototype = bytes([prototype])
+        if not isinstance(prototype, Command):
+            prototype = command(prototype, peri_type)
+        else:
+            prototype = prototype.__class__(prototype.cdb, prototype.peri_type)
+        prototype.set(**fixed)
+        self.prototype = prototype
+
+    def __len__(self):
+        return len(self.prototype)
+
+    def field(self, name: str) -> CDBField:
+        try:
+            return self.prototype._fields[name]
+        except KeyError:
+            raise AttributeError("{} has no CDB field '{}'".format(
+                self.prototype.__class__.__name__, name)) from None
+
+    def build(self, count: Optional[int]=None, **columns) -> 'np.ndarray':
+        """
+        필드 값 배열들로 CDB 배열을 만든다.
+
+        :param count: 만들 CDB 수. 생략하면 가장 긴 배열의 길이를 사용한다.
+        :type count: Optional[int]
+        :param columns: 필드 이름과 값 배열 (또는 모든 CDB 에 적용할 값)
+        :return: `(count, CDB 길이)` 모양의 C-contiguous `uint8` 배열
+        :rtype: numpy.ndarray
+        """
+        arrays = dict((k, np.asarray(v, dtype=np.uint64))
+                      for k, v in columns.items())
+        if count is None:
+            count = max((a.size for a in arrays.values() if a.ndim), default=1)
+
+        out = np.empty((count, len(self)), dtype=np.uint8)
+        out[:] = np.frombuffer(self.prototype._cdb, dtype=np.uint8)
+        for name, values in arrays.items():
+            self._scatter(out, self.field(name),
+                          np.broadcast_to(values, (count,)))
+        return out
+
+    def sequential(self, lba: int, count: int, transfer_length: int,
+                   **columns) -> 'np.ndarray':
+        """
+        `lba` 부터 `transfer_length` 씩 이어지는 `count` 개의 CDB 를 만든다.
+        """
+        lbas = lba + np.arange(count, dtype=np.uint64) * np.uint64(transfer_length)
+        return self.build(count, lba=lbas, transfer_length=transfer_length,
+                          **columns)
+
+    @staticmethod
+    def _scatter(out: 'np.ndarray', field: CDBField, values: 'np.ndarray'):
+        pos = field.offset
+        end = pos + field.length
+        if field.width == 1:
+            bit = np.uint8(1 << field.shift)
+            col = out[:, pos]
+            out[:, pos] = np.where(values != 0, col | bit, col & ~bit)
+            return
+
+        mask = (1 << field.width) - 1
+        keep = ~(mask << field.shift) & ((1 << (field.length * 8)) - 1)
+        shifted = (values & np.uint64(mask)) << np.uint64(field.shift)
+        raw = shifted.astype('>u8').view(np.uint8).reshape(-1, 8)
+        keep_bytes = np.frombuffer(keep.to_bytes(field.length, 'big'),
+                                   dtype=np.uint8)
+        out[:, pos:end] = (out[:, pos:end] & keep_bytes) | raw[:, 8 - field.length:]
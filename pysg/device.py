@@ -1,26 +1,83 @@
-from . import sg_pt, Buffer, sg_cmds
+from . import sg_pt, Buffer, sg_cmds, as_buffer, _default_output
 from .sense import Sense
 from .cmd import Command
 from .enum import DoPTResult, StatusCodes, PTResult, ErrorCategories, PTFlags
-from typing import Optional, Dict
+from ._common import lib_names
+from .transport import Transport, SGTransport
+from typing import Optional, Dict, Union
 from weakref import WeakValueDictionary
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import wraps
+from time import perf_counter_ns, sleep
+import errno
+import threading
 
 
 class SCSIError(RuntimeError):
-    def __init__(self, status_code: StatusCodes, message: str, *args):
-        msg = "[SCSI Status {}] {}".format(status_code, message)
-        super().__init__(msg, *args)
+    """
+    SCSI status 가 GOOD 이 아닌 경우의 예외
+
+    메시지는 `str()` 로 처음 변환할 때 만들어진다. 예상된 실패를 잡아서
+    무시하는 경우에는 메시지를 만드는 비용이 들지 않는다. `message` 가
+    `Command` 이면 "<command> failed" 라는 메시지가 되며, `args[0]` 에는
+    그 `Command` 가 그대로 들어있다.
+    """
+
+    def __init__(self, status_code: StatusCodes, message: Union[str, Command], *args):
+        super().__init__(message, *args)
         self.status_code = status_code
+        self.message = message
+        self._str = None
+
+    def _message(self) -> str:
+        if isinstance(self.message, Command):
+            return "{} failed".format(self.message)
+        return str(self.message)
+
+    def _format(self) -> str:
+        return "[SCSI Status {}] {}".format(self.status_code, self._message())
+
+    def __str__(self):
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def __reduce__(self):
+        # `Command` 는 cffi buffer 를 가지고 있어 pickle 할 수 없으므로
+        # 메시지를 문자열로 만들어 보낸다. enum 도 값으로 보낸다.
+        return _scsi_error, (self.__class__, int(self.status_code), self._message())
+
+
+def _scsi_error(cls: type, status_code: int, message: str) -> SCSIError:
+    return cls(StatusCodes(status_code), message)
+
+
+def _check_condition_error(sense: bytes, message: str) -> 'CheckConditionError':
+    return CheckConditionError(Sense(init=sense), message)
 
 
 class CheckConditionError(SCSIError):
-    def __init__(self, sense: Sense, message: str, *args):
-        super().__init__(StatusCodes.CHECK_CONDITION,
-                         sense.to_str(message),
-                         *args)
+    """
+    CHECK CONDITION 과 sense 를 받은 경우의 예외
+
+    메시지는 `sense` 를 참조해서 늦게 만들어지므로, 예외를 보관하는 동안
+    sense buffer 를 재사용하면 안 된다. pickle 하면 sense 는 복사되고
+    data buffer 는 빠진다.
+    """
+
+    def __init__(self, sense: Sense, message: Union[str, Command], *args):
+        super().__init__(StatusCodes.CHECK_CONDITION, message, *args)
         self.sense = sense
 
+    def _format(self) -> str:
+        return "[SCSI Status {}] {}".format(self.status_code,
+                                            self.sense.to_str(self._message()))
+
+    def __reduce__(self):
+        return _check_condition_error, (bytes(self.sense.buffer), self._message())
+
 
 class SGCMDSError(RuntimeError):
     def __init__(self, error_category: ErrorCategories, message: str, *args):
@@ -42,13 +99,34 @@ class PTObject(object):
                  task_management: Optional[int]=None,
                  task_attrs: Optional[Dict[int, int]]=None,
                  flags: Optional[PTFlags]=None):
-        self._objects[id(self)] = self
+        self._construct(sense_size)
+        self._setup(cmd, data_in, data_out, packet_id, tag, task_management,
+                    task_attrs, flags)
 
-        self._obj = sg_pt.lib.construct_scsi_pt_obj()
+    @classmethod
+    def _blank(cls, sense_size: int=32) -> 'PTObject':
+        # command 없이 pt object 와 sense buffer 만 준비된 객체.
+        # `PTObjectPool` 이 미리 만들어 둘 때 사용한다.
+        obj = cls.__new__(cls)
+        obj._construct(sense_size)
+        return obj
 
+    def _construct(self, sense_size: int):
+        self._objects[id(self)] = self
+        self._pool = None
+        self._obj = sg_pt.lib.construct_scsi_pt_obj()
         self._sense = Sense(size=sense_size)
-        self._data_in = data_in
-        self._data_out = data_out
+
+    def _clear(self):
+        sg_pt.lib.clear_scsi_pt_obj(self._obj)
+
+    def _setup(self, cmd, data_in, data_out, packet_id, tag, task_management,
+               task_attrs, flags):
+        # sg_pt 는 iovec 을 지원하지 않으므로 buffer 의 list 는
+        # `ScatterGatherBuffer` 로 모아서 전송한다. sg 장치에서는 `BareDevice`
+        # 가 `pysg.sgio.SGIOPTObject` 를 사용하므로 여기를 거치지 않는다.
+        self._data_in = as_buffer(data_in, True)
+        self._data_out = as_buffer(data_out)
         if task_attrs is None:
             task_attrs = {}
         self.task_attrs = task_attrs
@@ -61,7 +139,7 @@ class PTObject(object):
         ffi = sg_pt.ffi
         lib = sg_pt.lib
         lib.set_scsi_pt_cdb(self._obj,
-                            ffi.cast('unsigned char *', self.cmd._cdb), len(self.cmd))
+                            ffi.cast('unsigned char *', self.cmd._cdb_ptr), len(self.cmd))
         lib.set_scsi_pt_sense(self._obj, self._sense.ptr, len(self._sense))
         if self._data_in is not None:
             lib.set_scsi_pt_data_in(self._obj, self._data_in.ptr,
@@ -80,6 +158,58 @@ class PTObject(object):
         if flags is not None:
             lib.set_scsi_pt_flags(self._obj, flags)
 
+    def reset(self,
+              cmd: Command,
+              sense_size: int=32,
+              data_in: Optional[Buffer]=None,
+              data_out: Optional[Buffer]=None,
+              packet_id: Optional[int]=None,
+              tag: Optional[int]=None,
+              task_management: Optional[int]=None,
+              task_attrs: Optional[Dict[int, int]]=None,
+              flags: Optional[PTFlags]=None):
+        """
+        pt object 를 다시 만들지 않고 새 command 로 재설정한다.
+        인자는 생성자와 같다.
+        """
+        self._clear()
+        if len(self._sense) != sense_size:
+            self._sense = Sense(size=sense_size)
+        else:
+            self._sense.buffer[:] = bytes(sense_size)
+            self._sense.invalidate()
+        self._setup(cmd, data_in, data_out, packet_id, tag, task_management,
+                    task_attrs, flags)
+        return self
+
+    def release(self):
+        """
+        pool 에서 얻은 객체는 pool 로 돌려보내고, 그렇지 않으면 `close()` 한다.
+        `BareDevice.enable_buffer_pool()` 의 pool 에서 이 command 를 위해 얻은
+        data buffer 도 함께 돌려보낸다.
+        """
+        for data in (self._data_in, self._data_out):
+            if getattr(data, 'transient', False):
+                data.release()
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            self.close()
+
+    def close(self):
+        """
+        GC 를 기다리지 않고 pt object 를 즉시 해제한다.
+        """
+        if self._obj is not None:
+            sg_pt.lib.destruct_scsi_pt_obj(self._obj)
+            self._obj = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, tb):
+        self.release()
+
     def __repr__(self):
         if self._data_in is not None:
             return "<{}.{}: {} w/ {} bytes read>".format(
@@ -148,110 +278,783 @@ class PTObject(object):
         return sg_pt.lib.get_scsi_pt_duration_ms(self._obj)
 
     def __del__(self):
-        sg_pt.lib.destruct_scsi_pt_obj(self._obj)
+        if hasattr(self, '_obj'):
+            self.close()
 
-    def do_scsi_pt(self, device: 'Device', timeout: int=0,
-                   noisy: bool=True, verbose: bool=True):
+    def _execute(self, device: 'Device', timeout: int, noisy: bool,
+                 verbose: bool, quiet: bool, profiler=None) -> int:
+        if profiler is not None:
+            start = perf_counter_ns()
         ret = sg_pt.lib.do_scsi_pt(self._obj, device.fileno(),
-                                     timeout, 1 if verbose else 0)
+                                     timeout, 0 if quiet or not verbose else 1)
+        self._sense.invalidate()
+        if self._data_in is not None:
+            self._data_in.flush(_transferred(len(self._data_in), self.resid))
+        if profiler is not None:
+            now = perf_counter_ns()
+            profiler.add('ioctl', now - start)
+            start = now
 
-        sg_cmds.lib.sg_cmds_process_resp(
-                sg_cmds.ffi.cast('struct sg_pt_base *', self._obj),
-                self.cmd.name.encode('utf-8'),
-                ret, len(self.data), self._sense.ptr,
-                1 if noisy else 0,
-                1 if verbose else 0,
-                sg_cmds.ffi.NULL)
+        if not quiet:
+            sg_cmds.lib.sg_cmds_process_resp(
+                    sg_cmds.ffi.cast('struct sg_pt_base *', self._obj),
+                    self.cmd.name.encode('utf-8'),
+                    ret, 0 if self.data is None else len(self.data),
+                    self._sense.ptr,
+                    1 if noisy else 0,
+                    1 if verbose else 0,
+                    sg_cmds.ffi.NULL)
+            if profiler is not None:
+                profiler.add('process_resp', perf_counter_ns() - start)
 
-        if ret is DoPTResult.BAD_PARAMS:
+        if ret == DoPTResult.BAD_PARAMS:
             raise ValueError("Parameter is not set properly")
-        elif ret is DoPTResult.TIMEOUT:
-            raise OSError(errno.ETIMEDOUT, "SCSI PT Timed out")
-        if self.result_category is PTResult.TRANSPORT_ERR:
-            raise RuntimeError("Transport Error[{}]: {}".format(
-                hex(self.transport_err, self.transport_err_str)))
-        elif self.result_category is PTResult.OS_ERR:
-            raise OSError(self.os_err, "SCSI PT Failed")
-        elif self.result_category is PTResult.STATUS:
-            raise SCSIError(self.status_response, "{} failed".format(self.cmd))
-        elif self.result_category is PTResult.SENSE:
-            raise CheckConditionError(self.sense, "{} failed".format(self.cmd),
-                                      self.data)
+        return ret
+
+    def do_scsi_pt(self, device: 'Device', timeout: int=0,
+                   noisy: bool=True, verbose: bool=True, quiet: bool=False,
+                   profiler: Optional['CommandProfiler']=None):
+        """
+        command 를 실행하고 실패한 경우 예외를 발생시킨다.
+
+        :param quiet: True 이면 `sg_cmds_process_resp()` 를 호출하지 않고
+                      결과를 status 와 sense 만으로 판단한다. 아무것도
+                      출력하지 않는다.
+        :type quiet: bool
+        :param profiler: 단계별 시간을 기록할 `pysg.profile.CommandProfiler`
+        """
+        ret = self._execute(device, timeout, noisy, verbose, quiet, profiler)
+        if profiler is not None:
+            start = perf_counter_ns()
+        try:
+            if ret == DoPTResult.TIMEOUT:
+                raise OSError(errno.ETIMEDOUT, "SCSI PT Timed out")
+            check_result(self)
+        finally:
+            if profiler is not None:
+                profiler.add('decode', perf_counter_ns() - start)
+
+    def try_scsi_pt(self, device: 'Device', timeout: int=0,
+                    profiler: Optional['CommandProfiler']=None) -> 'CommandStatus':
+        """
+        `do_scsi_pt()` 의 quiet 모드와 같지만 예외를 발생시키는 대신 결과를
+        `CommandStatus` 로 반환한다. 잘못된 인자에 대한 `ValueError` 는
+        그대로 발생한다.
+
+        :rtype: CommandStatus
+        """
+        ret = self._execute(device, timeout, False, False, True, profiler)
+        return CommandStatus(self, ret == DoPTResult.TIMEOUT)
+
+
+def _has_segments(args, kwargs) -> bool:
+    # `PTObject` 인자의 data buffer 가 list 나 tuple 인지 확인한다.
+    data_in = kwargs.get('data_in', args[2] if len(args) > 2 else None)
+    data_out = kwargs.get('data_out', args[3] if len(args) > 3 else None)
+    return isinstance(data_in, (list, tuple)) or isinstance(data_out, (list, tuple))
+
+
+def _transferred(length: int, resid: int) -> int:
+    return max(0, min(length, length - resid))
+
+
+def check_result(obj):
+    """
+    실행이 끝난 command 객체의 결과를 분석하여 실패한 경우 예외를 발생시킨다.
+
+    `PTObject` 와 `pysg.aio.Request` 가 같이 사용한다.
+
+    :param obj: `result_category`, `status_response`, `sense`, `cmd`, `data`
+                등을 제공하는 객체
+    """
+    exc = result_error(obj, obj.result_category)
+    if exc is not None:
+        raise exc
+
+
+def result_error(obj, category: PTResult) -> Optional[Exception]:
+    """
+    `check_result()` 가 발생시킬 예외 객체. 성공한 경우 None
+    """
+    if category is PTResult.TRANSPORT_ERR:
+        return RuntimeError("Transport Error[{}]: {}".format(
+            hex(obj.transport_err), obj.transport_err_str))
+    elif category is PTResult.OS_ERR:
+        return OSError(obj.os_err, "SCSI PT Failed")
+    elif category is PTResult.STATUS:
+        return SCSIError(obj.status_response, obj.cmd)
+    elif category is PTResult.SENSE:
+        return CheckConditionError(obj.sense, obj.cmd, obj.data)
+    return None
+
+
+class CommandStatus(object):
+    """
+    예외를 발생시키지 않고 실행한 command 의 결과
+
+    `bool()` 은 성공 여부이며, 실패한 경우의 예외는 `error()` 를 호출할
+    때 만들어진다.
+
+        while not dev.try_command(TestUnitReady()):
+            time.sleep(0.1)
+    """
+    __slots__ = ('obj', 'category', 'timed_out')
+
+    def __init__(self, obj: PTObject, timed_out: bool=False):
+        self.obj = obj
+        self.timed_out = timed_out
+        self.category = obj.result_category
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return "<{}.{}: {} [{}]>".format(self.__class__.__module__,
+                                         self.__class__.__name__,
+                                         str(self.obj.cmd),
+                                         "TIMEOUT" if self.timed_out
+                                         else self.category.name)
+
+    @property
+    def ok(self) -> bool:
+        return not self.timed_out and self.category is PTResult.GOOD
+
+    @property
+    def status_response(self) -> StatusCodes:
+        return self.obj.status_response
+
+    @property
+    def sense(self) -> Optional[Sense]:
+        if self.category is PTResult.SENSE:
+            return self.obj.sense
+        return None
+
+    def error(self) -> Optional[Exception]:
+        """
+        `do_scsi_pt()` 가 발생시켰을 예외. 성공한 경우 None
+        """
+        if self.timed_out:
+            return OSError(errno.ETIMEDOUT, "SCSI PT Timed out")
+        return result_error(self.obj, self.category)
+
+    def check(self):
+        """
+        실패한 경우 `error()` 를 발생시킨다.
+        """
+        exc = self.error()
+        if exc is not None:
+            raise exc
+
+
+class PTObjectPool(object):
+    """
+    미리 만들어 둔 `PTObject` 들을 재사용하는 pool
+
+    `acquire()` 로 얻은 객체는 `PTObject.reset()` 으로 재설정된 것이며,
+    사용이 끝나면 `PTObject.release()` 로 돌려보내야 한다. 돌려보내지 않은
+    객체는 GC 될 때 해제된다.
+    """
+
+    def __init__(self, size: int=32, sense_size: int=32, prefill: bool=True,
+                 pt_class: Optional[type]=None):
+        """
+        :param size: pool 에 보관할 최대 객체 수
+        :type size: int
+        :param sense_size: 미리 만들어 둘 객체의 sense buffer 크기
+        :type sense_size: int
+        :param prefill: True 면 `size` 만큼 미리 만들어 둔다.
+        :type prefill: bool
+        :param pt_class: 만들 객체의 클래스. 생략하면 `PTObject`
+        :type pt_class: Optional[type]
+        """
+        self.size = size
+        self.sense_size = sense_size
+        self.pt_class = pt_class if pt_class is not None else PTObject
+        self._free = deque()
+        if prefill:
+            for _ in range(size):
+                self._free.append(self._new())
+
+    def _new(self) -> PTObject:
+        obj = self.pt_class._blank(self.sense_size)
+        obj._pool = self
+        return obj
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, cmd: Command, *args, **kwargs) -> PTObject:
+        """
+        pool 에서 객체를 꺼내 주어진 command 로 재설정한다. 인자는
+        `PTObject` 와 같다.
+        """
+        try:
+            obj = self._free.pop()
+        except IndexError:
+            obj = self._new()
+        return obj.reset(cmd, *args, **kwargs)
+
+    def release(self, obj: PTObject):
+        if obj._obj is None:
+            return
+        if len(self._free) < self.size:
+            obj._data_in = obj._data_out = None
+            obj.cmd = None
+            self._free.append(obj)
+        else:
+            obj.close()
+
+    def close(self):
+        while self._free:
+            self._free.pop().close()
+
+
+# `with device:` 로 사용 중인 장치들. thread 와 asyncio task 마다 따로
+# 유지되도록 contextvar 에 tuple 로 보관한다.
+_current_devices = ContextVar('pysg_current_devices', default=())
 
 
 class BareDevice(object):
-    _context = []
+    """
+    SCSI 장치
+
+    여러 thread 에서 하나의 장치를 공유할 때의 규칙은 다음과 같다.
+
+    * `command()` 와 `try_command()` 는 동시에 호출해도 된다. 호출마다 별도의
+      `PTObject` 를 사용하며, fd 에 대한 SG_IO ioctl 은 커널이 동기화한다.
+      `PTObjectPool`, `BufferPool` 과 `DeviceMetrics` 도 동시에 사용할 수 있다.
+    * `enable_pt_pool()`, `enable_buffer_pool()`, `enable_metrics()`,
+      `enable_profiler()`, `enable_retry_policy()`, `command_queue()`,
+      `close()` 와 `with` 문의 진입/종료는 `lock` 으로 보호된다.
+    * `CommandProfiler` 와 `command_queue()` 가 반환하는 queue 는 한 thread
+      (또는 한 event loop) 에서만 사용해야 한다.
+    * 여러 command 를 다른 thread 의 command 와 섞이지 않게 실행해야 하면
+      `with device.lock:` 으로 감싼다. `command()` 자체는 `lock` 을 잡지
+      않는다.
+    * 다른 thread 가 command 를 실행하는 동안 `close()` 하지 않는 것은
+      호출하는 쪽의 책임이다.
+
+    `current()` 는 현재 thread 또는 asyncio task 에서 `with` 문으로 사용 중인
+    장치를 반환하며, 다른 thread 나 task 의 영향을 받지 않는다.
+    """
 
     @classmethod
     def current(cls) -> Optional['Device']:
-        if cls._context:
-            return cls._context[-1]
+        stack = _current_devices.get()
+        if stack:
+            return stack[-1]
         else:
             return None
 
     def __init__(self, path: str, readonly: bool=False, verbose: bool=True, *,
-                 flags: Optional[int]=None):
+                 flags: Optional[int]=None, transport: Optional[Transport]=None):
+        """
+        :param path: 장치 경로
+        :type path: str
+        :param readonly: 읽기 전용으로 연다.
+        :type readonly: bool
+        :param verbose: sg_lib 의 메시지를 출력한다.
+        :type verbose: bool
+        :param flags: `open()` flag. 주어지면 `readonly` 는 무시된다.
+        :type flags: Optional[int]
+        :param transport: 장치를 열고 command 를 실행할 `Transport`.
+                          생략하면 `SGTransport`
+        :type transport: Optional[Transport]
+        """
+        _default_output()
         self._depth = 0
+        self._path = path
+        self._readonly = readonly
+        self._flags = flags
+        self._queue = None
+        self.pt_pool = None
+        self.buffer_pool = None
         self.timeout = 5
         self.verbose = verbose
-        if flags is not None:
-            self._fd = sg_pt.lib.scsi_pt_open_flags(path.encode('utf-8'),
-                                                    flags,
-                                                    1 if verbose else 0)
-        else:
-            self._fd = sg_pt.lib.scsi_pt_open_device(path.encode('utf-8'),
-                                                     1 if readonly else 0,
-                                                     1 if verbose else 0)
+        # True 이면 `command()` 가 `sg_cmds_process_resp()` 를 건너뛴다.
+        self.quiet = False
+        self.metrics = None
+        self.profiler = None
+        self.mmap_io = None
+        self.recorder = None
+        self.policy = None
+        self.lock = threading.RLock()
+        self.transport = transport if transport is not None else SGTransport()
+        self._fd = None
+        self._fd = self.transport.open(path, readonly, verbose, flags)
+        self._iovec_pt = self.transport.iovec_pt_class(self)
+
+    def enable_pt_pool(self, size: int=32, sense_size: int=32) -> PTObjectPool:
+        """
+        `command()` 가 `PTObject` 를 매번 만들지 않고 `PTObjectPool` 에서
+        재사용하도록 한다. 이후 `command()` 가 반환하는 객체는 사용이 끝나면
+        `release()` 하거나 `with` 문으로 사용해야 한다.
+        """
+        with self.lock:
+            if self.pt_pool is None:
+                self.pt_pool = PTObjectPool(size, sense_size,
+                                            pt_class=self.transport.pt_class)
+            return self.pt_pool
+
+    def enable_buffer_pool(self, **kwargs) -> 'BufferPool':
+        """
+        `command()` 와 `try_command()` 의 `data_in` / `data_out` 에 byte 수를
+        주면 그 크기의 buffer 를 매번 할당하지 않고 `pysg.pool.BufferPool` 에서
+        얻도록 한다. 이 buffer 는 command 객체를 `release()` 할 때 (또는 객체가
+        GC 될 때) pool 로 돌아간다.
+
+            dev.enable_buffer_pool()
+            with dev.command(read16, data_in=4096) as obj:
+                digest.update(obj.data.buffer)
+
+        pool 이 꺼져 있으면 byte 수로 준 buffer 는 새로 할당된다.
 
-        if self._fd < 0:
-            raise OSError(-self._fd, "Can't open device {}".format(path))
+        :param kwargs: `BufferPool` 의 인자
+        :rtype: pysg.pool.BufferPool
+        """
+        from .pool import BufferPool
+
+        with self.lock:
+            if self.buffer_pool is None:
+                self.buffer_pool = BufferPool(**kwargs)
+            return self.buffer_pool
+
+    def _pooled_args(self, args, kwargs):
+        # byte 수로 주어진 data buffer 를 `buffer_pool` 에서 얻은 buffer 로
+        # 바꾼다. policy 가 다시 시도할 때도 같은 buffer 를 사용한다.
+        pool = self.buffer_pool
+        for pos, key in ((2, 'data_in'), (3, 'data_out')):
+            if len(args) > pos:
+                if type(args[pos]) is int:
+                    args = args[:pos] + (pool.acquire(args[pos], True),) + args[pos + 1:]
+            elif type(kwargs.get(key)) is int:
+                kwargs[key] = pool.acquire(kwargs[key], True)
+        return args, kwargs
 
     def close(self):
-        if self._fd is not None:
-            sg_pt.lib.scsi_pt_close_device(self._fd)
-            self._fd = None
+        with self.lock:
+            if self.pt_pool is not None:
+                self.pt_pool.close()
+                self.pt_pool = None
+            if self.mmap_io is not None:
+                self.mmap_io.close()
+                self.mmap_io = None
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+            if self._queue is not None:
+                self._queue.close()
+                self._queue = None
+            if self._fd is not None:
+                self.transport.close(self._fd)
+                self._fd = None
         return self
 
     def fileno(self):
         return self._fd
 
     def __enter__(self):
-        self._depth += 1
-        self._context.append(self)
+        with self.lock:
+            self._depth += 1
+        _current_devices.set(_current_devices.get() + (self,))
+        return self
 
     def __exit__(self, exc_type, value, tb):
-        if self._context[-1] is self:
-            self._context.pop()
+        stack = _current_devices.get()
+        if stack and stack[-1] is self:
+            _current_devices.set(stack[:-1])
 
-        if self._depth <= 0:
-            return
-        self._depth -= 1
-        if self._depth == 0:
-            self.close()
+        with self.lock:
+            if self._depth <= 0:
+                return
+            self._depth -= 1
+            if self._depth == 0:
+                self.close()
+
+    @contextmanager
+    def activate(self):
+        """
+        장치를 닫지 않고 `current()` 로만 설정한다. `with` 문과 달리 블록이
+        끝나도 장치는 열린 채로 남는다.
+        """
+        token = _current_devices.set(_current_devices.get() + (self,))
+        try:
+            yield self
+        finally:
+            _current_devices.reset(token)
+
+    def _new_pt(self, args, kwargs) -> PTObject:
+        if self.mmap_io is not None:
+            obj = self.mmap_io.pt_object(args, kwargs)
+            if obj is not None:
+                return obj
+        if self._iovec_pt is not None and _has_segments(args, kwargs):
+            return self._iovec_pt(*args, **kwargs)
+        if self.pt_pool is not None:
+            return self.pt_pool.acquire(*args, **kwargs)
+        return self.transport.pt_class(*args, **kwargs)
 
     @wraps(PTObject)
     def command(self, *args, **kwargs):
-        obj = PTObject(*args, **kwargs)
-        obj.do_scsi_pt(self, self.timeout, self.verbose)
+        if self.buffer_pool is not None:
+            args, kwargs = self._pooled_args(args, kwargs)
+        if self.profiler is not None:
+            return self._profiled_command(self.profiler, args, kwargs)
+        policy = self.policy
+        if policy is not None:
+            obj = self._new_pt(args, kwargs)
+            self._run_policy(policy, obj, args, kwargs).check()
+            return obj
+        if (self.pt_pool is not None or self.mmap_io is not None or
+                self._iovec_pt is not None):
+            obj = self._new_pt(args, kwargs)
+        else:
+            obj = self.transport.pt_class(*args, **kwargs)
+        # 실패하면 예외가 obj 의 sense 를 참조하므로 obj 는 pool 로 돌아가지
+        # 않고 GC 될 때 해제된다.
+        metrics = self.metrics
+        recorder = self.recorder
+        if metrics is None and recorder is None:
+            obj.do_scsi_pt(self, self.timeout, self.verbose, quiet=self.quiet)
+            return obj
+
+        start = perf_counter_ns()
+        try:
+            obj.do_scsi_pt(self, self.timeout, self.verbose, quiet=self.quiet)
+        finally:
+            elapsed = perf_counter_ns() - start
+            if metrics is not None:
+                metrics.record(obj, elapsed)
+            if recorder is not None:
+                recorder.record(obj, start, elapsed)
         return obj
 
+    def _profiled_command(self, profiler, args, kwargs):
+        start = perf_counter_ns()
+        obj = self._new_pt(args, kwargs)
+        issued = perf_counter_ns()
+        profiler.add('init', issued - start)
+        policy = self.policy
+        if policy is not None:
+            try:
+                status = self._run_policy(policy, obj, args, kwargs, profiler)
+                with profiler.measure('decode'):
+                    status.check()
+            finally:
+                profiler.finish(perf_counter_ns() - start, obj.duration_ms)
+            return obj
+        try:
+            obj.do_scsi_pt(self, self.timeout, self.verbose, quiet=self.quiet,
+                           profiler=profiler)
+        finally:
+            end = perf_counter_ns()
+            if self.metrics is not None:
+                self.metrics.record(obj, end - issued)
+            if self.recorder is not None:
+                self.recorder.record(obj, issued, end - issued)
+            profiler.finish(end - start, obj.duration_ms)
+        return obj
+
+    def try_command(self, *args, **kwargs) -> CommandStatus:
+        """
+        `command()` 와 같지만 실패해도 예외를 발생시키지 않고 출력도 하지
+        않는다. TEST UNIT READY 로 polling 하는 것처럼 실패가 예상되는 경우에
+        사용한다. pool 에서 얻은 객체는 결과를 다 사용한 뒤
+        `status.obj.release()` 로 돌려보낼 수 있다.
+
+        :rtype: CommandStatus
+        """
+        if self.buffer_pool is not None:
+            args, kwargs = self._pooled_args(args, kwargs)
+        obj = self._new_pt(args, kwargs)
+        policy = self.policy
+        if policy is not None:
+            return self._run_policy(policy, obj, args, kwargs)
+        metrics = self.metrics
+        recorder = self.recorder
+        if metrics is None and recorder is None:
+            return obj.try_scsi_pt(self, self.timeout)
+
+        start = perf_counter_ns()
+        try:
+            return obj.try_scsi_pt(self, self.timeout)
+        finally:
+            elapsed = perf_counter_ns() - start
+            if metrics is not None:
+                metrics.record(obj, elapsed)
+            if recorder is not None:
+                recorder.record(obj, start, elapsed)
+
+    def _run_policy(self, policy, obj, args, kwargs,
+                    profiler=None) -> CommandStatus:
+        # policy 가 다시 시도하지 않기로 할 때까지 같은 객체를 재설정해서
+        # 실행한다. 시도마다 metrics 와 trace 에 기록된다.
+        key = policy.key(obj.cmd)
+        attempt = 0
+        # 연속으로 timeout 된 횟수. timeout 을 늘리는 데 사용한다.
+        timeouts = 0
+        while True:
+            timeout = policy.timeout(key, timeouts)
+            start = perf_counter_ns()
+            try:
+                status = obj.try_scsi_pt(self, timeout, profiler)
+            finally:
+                elapsed = perf_counter_ns() - start
+                if self.metrics is not None:
+                    self.metrics.record(obj, elapsed)
+                if self.recorder is not None:
+                    self.recorder.record(obj, start, elapsed)
+            reason, delay = policy.decide(key, status, elapsed, attempt)
+            if reason is None:
+                return status
+            attempt += 1
+            timeouts = timeouts + 1 if status.timed_out else 0
+            if delay:
+                sleep(delay)
+            if profiler is not None:
+                with profiler.measure('init'):
+                    obj.reset(*args, **kwargs)
+            else:
+                obj.reset(*args, **kwargs)
+
+    def enable_retry_policy(self, **kwargs) -> 'RetryPolicy':
+        """
+        `command()` 와 `try_command()` 가 `pysg.policy.RetryPolicy` 에 따라
+        opcode 별로 학습한 timeout 을 사용하고, 일시적인 실패 (UNIT ATTENTION,
+        BUSY 등) 를 다시 시도하도록 한다. 이미 켜져 있으면 학습한 값 없이 새로
+        만든다. `self.policy = None` 으로 끌 수 있다.
+
+        policy 를 사용하는 `command()` 는 `sg_cmds_process_resp()` 를 호출하지
+        않으므로 실패를 출력하지 않고 예외로만 알린다. profiler 가 켜져 있어도
+        policy 를 따르며, 재시도를 포함한 전체가 command 하나로 기록된다.
+
+        :param kwargs: `RetryPolicy` 의 인자. `default_timeout` 을 생략하면
+                       `self.timeout` 을 사용한다.
+        :rtype: pysg.policy.RetryPolicy
+        """
+        from .policy import RetryPolicy
+
+        with self.lock:
+            kwargs.setdefault('default_timeout', self.timeout)
+            self.policy = RetryPolicy(**kwargs)
+            return self.policy
+
+    def enable_metrics(self, precision: int=7) -> 'DeviceMetrics':
+        """
+        `command()` 와 `try_command()` 의 latency 와 결과를 기록하기 시작한다.
+        `self.metrics = None` 으로 다시 끌 수 있다.
+
+        :param precision: latency histogram 의 precision
+        :type precision: int
+        :rtype: pysg.metrics.DeviceMetrics
+        """
+        from .metrics import DeviceMetrics
+
+        with self.lock:
+            if self.metrics is None:
+                self.metrics = DeviceMetrics(self._path, precision)
+            return self.metrics
+
+    def enable_mmap_io(self, size: int=1 << 20) -> Buffer:
+        """
+        sg reserved buffer 를 mmap 해서 복사 없이 data 를 주고받는 모드를
+        켜고, 그 buffer 를 반환한다. 반환된 buffer (또는 그 `prefix()`) 를
+        `data_in` / `data_out` 으로 넘긴 command 는 `SG_FLAG_MMAP_IO` 로
+        실행되며, 그 외의 command 는 원래 경로로 실행된다.
+
+            buf = dev.enable_mmap_io(1 << 20)
+            dev.command(read16, data_in=buf)
+            digest.update(buf.buffer)
+
+        sg 장치가 아니거나 mmap 할 수 없으면 모드를 켜지 않고 같은 크기의
+        일반 `Buffer` 를 반환하므로 같은 코드가 복사를 하는 보통 경로로
+        동작한다. 모드가 켜졌는지는 `mmap_io` 가 None 이 아닌지로 확인한다.
+
+        :param size: 원하는 reserved buffer 크기. 커널이 더 작게 잡으면 반환된
+                     buffer 도 그만큼 작다.
+        :type size: int
+        :rtype: Buffer
+        """
+        from .mmapio import MmapIO
+
+        with self.lock:
+            if self.mmap_io is None:
+                try:
+                    self.mmap_io = MmapIO(self, size)
+                except OSError:
+                    return Buffer(size=size)
+            return self.mmap_io.buffer
+
+    def enable_trace(self, path: str, block_records: int=4096) -> 'TraceRecorder':
+        """
+        `command()` 와 `try_command()` 로 실행한 command 를 `path` 에 기록하기
+        시작한다. 기록된 파일은 `pysg.trace.Trace` 로 읽고
+        `pysg.trace.replay()` 로 다시 실행할 수 있다.
+
+        :rtype: pysg.trace.TraceRecorder
+        """
+        from .trace import TraceRecorder
+
+        with self.lock:
+            if self.recorder is not None:
+                self.recorder.close()
+            self.recorder = TraceRecorder(path, block_records)
+            return self.recorder
+
+    def stop_trace(self):
+        """
+        기록을 멈추고 남은 record 를 파일에 쓴다.
+        """
+        with self.lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def enable_profiler(self) -> 'CommandProfiler':
+        """
+        `command()` 의 단계별 소요 시간을 기록하기 시작한다.
+        `self.profiler = None` 으로 다시 끌 수 있다.
+
+        :rtype: pysg.profile.CommandProfiler
+        """
+        from .profile import CommandProfiler
+
+        with self.lock:
+            if self.profiler is None:
+                self.profiler = CommandProfiler()
+            return self.profiler
+
+    def command_queue(self, depth: Optional[int]=None,
+                      private: bool=False) -> 'CommandQueue':
+        """
+        sg v3 비동기 인터페이스로 command 를 동시에 진행시키는 queue 를 얻는다.
+
+        처음 호출할 때 만들어지며 이후에는 같은 queue 를 반환한다. 이미 만들어진
+        queue 와 다른 `depth` 를 요청하면 `ValueError` 가 발생한다. backend 는
+        `Transport.queue_backends()` 로 만든다.
+
+        `private` 이면 장치에 보관하지 않는 새 queue 를 만든다. 이 queue 는
+        장치의 fd 를 공유하지 않으므로 다른 queue 와 완료가 섞이지 않으며,
+        사용이 끝나면 호출한 쪽이 `close()` 해야 한다.
+
+        :param depth: 동시에 진행할 최대 command 수. 생략하면 이미 만들어진
+                      queue 의 depth 또는 32
+        :type depth: Optional[int]
+        :param private: 이 호출만을 위한 queue 를 만든다.
+        :type private: bool
+        :rtype: pysg.aio.CommandQueue
+        """
+        from .aio import CommandQueue
+
+        if private:
+            depth = depth or 32
+            backends = self.transport.queue_backends(self, depth, private=True)
+            return CommandQueue(backends, depth, self.timeout)
+        with self.lock:
+            if self._queue is None:
+                depth = depth or 32
+                backends = self.transport.queue_backends(self, depth)
+                self._queue = CommandQueue(backends, depth, self.timeout)
+            elif depth is not None and depth != self._queue.depth:
+                raise ValueError("command_queue() already exists with depth {}; "
+                                 "use private=True for a different depth".format(
+                                 self._queue.depth))
+            return self._queue
+
+    def read_stream(self, lba: int=0, blocks: Optional[int]=None, depth: int=4,
+                    chunk_size: Optional[int]=None) -> 'StreamReader':
+        """
+        `lba` 부터 `blocks` 개의 block 을 미리 읽으면서 chunk 단위로 돌려주는
+        iterator 를 만든다. `blocks` 를 생략하면 장치 끝까지 읽는다.
+
+        :param depth: 동시에 진행할 READ command 수
+        :type depth: int
+        :param chunk_size: command 하나의 최대 byte 수. 장치의 maximum
+                           transfer length 를 넘지 않는다.
+        :type chunk_size: Optional[int]
+        :rtype: pysg.stream.StreamReader
+        """
+        from .stream import StreamReader
+
+        return StreamReader(self, lba, blocks, depth, chunk_size)
+
+    def write_stream(self, lba: int=0, blocks: Optional[int]=None, depth: int=4,
+                     chunk_size: Optional[int]=None) -> 'StreamWriter':
+        """
+        `lba` 부터 byte stream 을 쓰는 sink 를 만든다. 인자는 `read_stream()`
+        과 같다.
+
+        :rtype: pysg.stream.StreamWriter
+        """
+        from .stream import StreamWriter
+
+        return StreamWriter(self, lba, blocks, depth, chunk_size)
+
+    def submit_batch(self, commands, sense_size: int=32) -> 'BatchResult':
+        """
+        여러 command 를 한꺼번에 제출하고 결과를 column 형태로 받는다.
+
+        :param commands: `Command` 또는 `(cmd, data_in, data_out)` tuple 들,
+                         혹은 미리 만들어 둔 `pysg.batch.Batch`
+        :param sense_size: command 하나 당 sense buffer 크기
+        :type sense_size: int
+        :rtype: pysg.batch.BatchResult
+        """
+        from .batch import Batch
+
+        if isinstance(commands, Batch):
+            batch = commands
+        else:
+            batch = Batch.from_commands(commands, sense_size, self.timeout)
+        return self.command_queue().run_batch(batch)
+
+    async def command_async(self, *args, **kwargs) -> 'Request':
+        """
+        `command()` 의 asyncio 버전. 인자는 `pysg.aio.Request` 와 같다.
+        """
+        return await self.command_queue().command_async(*args, **kwargs)
+
+
+def _cmds_helper(name: str):
+    fn_name = 'sg_' + name
+    if name.startswith('_') or name.startswith('cmds_'):
+        return None
+    fn = getattr(sg_cmds.lib, fn_name, None)
+    if fn is None:
+        return None
+
+    @wraps(fn)
+    def helper(self, *args, **kwargs):
+        ret = fn(self.fileno(), *args, **kwargs)
+        if ret < 0:
+            raise RuntimeError("{} failed".format(fn_name))
+        elif ret != 0:
+            raise SGCMDSError(ErrorCategories(ret), "{} failed".format(fn_name))
+    return helper
+
 
 def cmds_mixin(cls):
-    for k in dir(sg_cmds.lib):
-        if k.startswith('sg_') and not k.startswith('sg_cmds_'):
-            f = getattr(sg_cmds.lib, k)
-
-            def gen_helper(fn):
-                @wraps(fn)
-                def helper(self, *args, **kwargs):
-                    ret = fn(self.fileno(), *args, **kwargs)
-                    if ret < 0:
-                        raise RuntimeError("{} failed".format(k))
-                    elif ret != 0:
-                        raise SGCMDSError(ErrorCategories(ret))
-                return helper
-
-            setattr(cls, k[3:], gen_helper(f))
+    """
+    `sg_cmds` 의 `sg_*` 함수들을 `fileno()` 를 첫 번째 인자로 넘기는 method 로
+    추가한다. 클래스를 만들 때 모든 함수를 감싸지 않고, 처음 사용할 때
+    만들어서 클래스에 추가한다.
+    """
+
+    def __getattr__(self, name):
+        helper = _cmds_helper(name)
+        if helper is None:
+            raise AttributeError("{!r} object has no attribute {!r}".format(
+                self.__class__.__name__, name))
+        setattr(cls, name, helper)
+        return helper.__get__(self, self.__class__)
+
+    def __dir__(self):
+        names = (k[3:] for k in lib_names(sg_cmds.lib)
+                 if k.startswith('sg_') and not k.startswith('sg_cmds_'))
+        return sorted(set(object.__dir__(self)) | set(names))
+
+    cls.__getattr__ = __getattr__
+    cls.__dir__ = __dir__
     return cls
 
 
@@ -0,0 +1,394 @@
+from .cmd.spc import Inquiry
+from .cmd.sbc import ReadCapacity10, ReadCapacity16
+from .device import BareDevice, Device
+from .enum import PeripheralDeviceTypes, TransportProtocols
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+import enum
+import json
+import os
+import re
+
+_sg_name = re.compile(r'(sg\d+|sd[a-z]+)$')
+
+# INQUIRY 로 읽는 VPD page 와 크기
+VPD_SUPPORTED_PAGES = 0x00
+VPD_UNIT_SERIAL_NUMBER = 0x80
+VPD_DEVICE_IDENTIFICATION = 0x83
+
+_INQUIRY_LENGTH = 96
+_VPD_LENGTH = 252
+
+# READ CAPACITY 를 보낼 peripheral device type (direct access, RBC, ZBC)
+_BLOCK_DEVICES = frozenset((0x00, 0x0e, 0x14))
+
+
+class Designator(NamedTuple):
+    """
+    Device Identification VPD page (0x83) 의 designator 하나
+    """
+    association: enum.Enum
+    type: enum.Enum
+    code_set: enum.Enum
+    protocol: Optional[Union[TransportProtocols, int]]
+    value: bytes
+
+    @property
+    def identifier(self) -> str:
+        """
+        `"<type 값>:<value 의 hex 또는 문자열>"` 형식의 문자열. inventory cache
+        의 key 로 사용한다.
+        """
+        # code set 2, 3 (ASCII, UTF-8) 은 문자열 그대로 사용
+        if self.code_set.value in (2, 3):
+            text = self.value.rstrip(b'\0 ').decode('utf-8', 'replace')
+        else:
+            text = self.value.hex()
+        return '{}:{}'.format(self.type.value, text)
+
+
+class DeviceIdentity(NamedTuple):
+    """
+    `identify()` 로 얻은 장치 정보
+    """
+    path: str
+    peripheral_type: Union[PeripheralDeviceTypes, int]
+    vendor: str
+    product: str
+    revision: str
+    serial: Optional[str]
+    designators: Tuple[Designator, ...]
+    blocks: Optional[int]
+    block_size: Optional[int]
+
+    @property
+    def identifier(self) -> str:
+        """
+        장치를 구분하는 문자열. Logical unit 에 연결된 designator 를 NAA,
+        EUI-64, T10 vendor ID 순서로 찾고, 없으면 vendor, product, serial
+        number 로 만든다. serial number 도 없으면 같은 모델의 장치끼리
+        구분할 수 없으므로 serial number 대신 경로를 사용한다.
+        """
+        lu = [d for d in self.designators if d.association.value == 0]
+        for dtype in (3, 2, 1):
+            for d in lu:
+                if d.type.value == dtype:
+                    return d.identifier
+        if self.serial:
+            return 'inquiry:{}:{}:{}'.format(self.vendor, self.product, self.serial)
+        return 'path:{}:{}:{}'.format(self.vendor, self.product, self.path)
+
+    @property
+    def capacity(self) -> Optional[int]:
+        """
+        용량 (byte). READ CAPACITY 를 보내지 않은 장치는 None
+        """
+        if self.blocks is None:
+            return None
+        return self.blocks * self.block_size
+
+
+def _enum_or_int(cls, value: int):
+    try:
+        return cls(value)
+    except ValueError:
+        return value
+
+
+def _ascii(buf, start: int, end: int) -> str:
+    return bytes(buf[start:end]).decode('ascii', 'replace').strip(' \0')
+
+
+def parse_designators(page: bytes) -> Tuple[Designator, ...]:
+    """
+    Device Identification VPD page (0x83) 의 designator 들을 해석한다.
+
+    :param page: VPD page (header 포함)
+    :type page: bytes
+    :rtype: Tuple[Designator, ...]
+    """
+    from .enum import DesignatorAssociations, DesignatorCodeSets, DesignatorTypes
+
+    end = min(len(page), 4 + ((page[2] << 8) | page[3]))
+    pos = 4
+    result = []
+    while pos + 4 <= end:
+        b0, b1, length = page[pos], page[pos + 1], page[pos + 3]
+        if pos + 4 + length > end:
+            break
+        # PIV 가 설정된 경우에만 protocol identifier 가 의미 있다.
+        protocol = _enum_or_int(TransportProtocols, b0 >> 4) if b1 & 0x80 else None
+        result.append(Designator(DesignatorAssociations((b1 >> 4) & 0x03),
+                                 DesignatorTypes(b1 & 0x0f),
+                                 DesignatorCodeSets(b0 & 0x0f),
+                                 protocol,
+                                 bytes(page[pos + 4:pos + 4 + length])))
+        pos += 4 + length
+    return tuple(result)
+
+
+def inquiry(device: BareDevice, page: Optional[int], length: int) -> Optional[bytes]:
+    """
+    표준 INQUIRY 또는 VPD page 를 읽는다. 실패해도 예외를 발생시키지 않는다.
+
+    :param page: VPD page code. None 이면 표준 INQUIRY
+    :type page: Optional[int]
+    :param length: allocation length
+    :type length: int
+    :return: 받은 data. 실패하면 None
+    :rtype: Optional[bytes]
+    """
+    cmd = Inquiry(b'\x12').set(evpd=page is not None, page_code=page or 0,
+                               allocation_length=length)
+    buf = bytearray(length)
+    status = device.try_command(cmd, data_in=buf)
+    if not status:
+        return None
+    return bytes(buf[:length - status.obj.resid])
+
+
+def read_capacity(device: BareDevice) -> Tuple[Optional[int], Optional[int]]:
+    """
+    READ CAPACITY (16) 으로, 지원하지 않으면 READ CAPACITY (10) 으로 block
+    수와 block 크기를 얻는다.
+
+    :return: `(blocks, block_size)`. 둘 다 실패하면 `(None, None)`
+    :rtype: Tuple[Optional[int], Optional[int]]
+    """
+    buf = bytearray(32)
+    if device.try_command(ReadCapacity16(b'\x9e').set(service_action=0x10,
+                                                       allocation_length=32),
+                          data_in=buf):
+        return int.from_bytes(buf[0:8], 'big') + 1, int.from_bytes(buf[8:12], 'big')
+    if device.try_command(ReadCapacity10(b'\x25'), data_in=buf):
+        return int.from_bytes(buf[0:4], 'big') + 1, int.from_bytes(buf[4:8], 'big')
+    return None, None
+
+
+def identify(device: BareDevice) -> DeviceIdentity:
+    """
+    INQUIRY, Unit Serial Number 와 Device Identification VPD page,
+    READ CAPACITY 로 장치 정보를 얻는다. `device.command()` 를 사용하므로
+    `pysg.emulation` 의 장치에서도 동작한다.
+
+    VPD page 나 READ CAPACITY 를 지원하지 않는 장치는 해당 필드가 비어 있다.
+    표준 INQUIRY 가 실패하면 `SCSIError` 가 발생한다.
+
+    :rtype: DeviceIdentity
+    """
+    buf = bytearray(_INQUIRY_LENGTH)
+    device.command(Inquiry(b'\x12').set(allocation_length=_INQUIRY_LENGTH),
+                   data_in=buf)
+    pdt = buf[0] & 0x1f
+
+    serial = None
+    designators = ()
+    pages = inquiry(device, VPD_SUPPORTED_PAGES, _VPD_LENGTH)
+    if pages is not None:
+        supported = pages[4:4 + ((pages[2] << 8) | pages[3])]
+        if VPD_UNIT_SERIAL_NUMBER in supported:
+            page = inquiry(device, VPD_UNIT_SERIAL_NUMBER, _VPD_LENGTH)
+            if page is not None and len(page) >= 4:
+                serial = _ascii(page, 4, 4 + ((page[2] << 8) | page[3]))
+        if VPD_DEVICE_IDENTIFICATION in supported:
+            page = inquiry(device, VPD_DEVICE_IDENTIFICATION, _VPD_LENGTH)
+            if page is not None and len(page) >= 4:
+                designators = parse_designators(page)
+
+    blocks = block_size = None
+    if pdt in _BLOCK_DEVICES:
+        blocks, block_size = read_capacity(device)
+
+    return DeviceIdentity(device._path, _enum_or_int(PeripheralDeviceTypes, pdt),
+                          _ascii(buf, 8, 16), _ascii(buf, 16, 32), _ascii(buf, 32, 36),
+                          serial, designators, blocks, block_size)
+
+
+def default_paths() -> List[str]:
+    """
+    `/dev` 의 sg 장치 (`/dev/sg*`) 와 disk (`/dev/sd*`, partition 제외) 경로
+    """
+    try:
+        names = os.listdir('/dev')
+    except OSError:
+        return []
+    return sorted(os.path.join('/dev', n) for n in names if _sg_name.match(n))
+
+
+def stat_signature(path: str) -> Optional[List[int]]:
+    """
+    장치 파일이 바뀌었는지 판단하는 값. 장치가 다시 연결되면 udev 가
+    장치 파일을 새로 만들므로 inode 나 ctime 이 바뀐다. stat 할 수 없는
+    경로 (emulation 등) 는 None 이며, 이 경우 항상 다시 조사한다.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_rdev, st.st_ino, st.st_ctime_ns]
+
+
+class InventoryCache(object):
+    """
+    `discover()` 결과를 저장하는 JSON 파일
+
+    장치 정보는 `DeviceIdentity.identifier` 로 저장하고, 경로마다 마지막으로
+    본 `stat_signature()` 와 identifier 를 기록한다. 다음 실행에서 경로의
+    signature 가 같으면 장치를 열지 않고 저장된 정보를 사용한다.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """
+        :param path: cache 파일 경로. 없거나 읽을 수 없으면 빈 cache 로 시작한다.
+        :type path: str
+        """
+        self.path = path
+        self.devices = {}
+        self.paths = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.devices = data['devices']
+                self.paths = data['paths']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def lookup(self, path: str, signature: Optional[List[int]]) -> Optional[DeviceIdentity]:
+        """
+        `path` 의 signature 가 저장된 것과 같으면 저장된 장치 정보를 반환한다.
+        """
+        if signature is None:
+            return None
+        entry = self.paths.get(path)
+        if entry is None or entry['signature'] != signature:
+            return None
+        record = self.devices.get(entry['identifier'])
+        if record is None:
+            return None
+        return _from_json(record)._replace(path=path)
+
+    def store(self, ident: DeviceIdentity, signature: Optional[List[int]]):
+        key = ident.identifier
+        self.devices[key] = _to_json(ident)
+        if signature is not None:
+            self.paths[ident.path] = {'signature': signature, 'identifier': key}
+        else:
+            self.paths.pop(ident.path, None)
+
+    def forget(self, path: str):
+        self.paths.pop(path, None)
+
+    def save(self):
+        """
+        임시 파일에 쓴 뒤 교체하므로 저장 중에 중단되어도 이전 cache 가 남는다.
+        """
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'version': self.VERSION, 'devices': self.devices,
+                       'paths': self.paths}, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _to_json(ident: DeviceIdentity) -> dict:
+    return {
+        'path': ident.path,
+        'peripheral_type': int(ident.peripheral_type),
+        'vendor': ident.vendor,
+        'product': ident.product,
+        'revision': ident.revision,
+        'serial': ident.serial,
+        'designators': [[d.association.value, d.type.value, d.code_set.value,
+                         None if d.protocol is None else int(d.protocol),
+                         d.value.hex()] for d in ident.designators],
+        'blocks': ident.blocks,
+        'block_size': ident.block_size,
+    }
+
+
+def _from_json(record: dict) -> DeviceIdentity:
+    from .enum import DesignatorAssociations, DesignatorCodeSets, DesignatorTypes
+
+    designators = tuple(
+        Designator(DesignatorAssociations(assoc), DesignatorTypes(dtype),
+                   DesignatorCodeSets(code_set),
+                   None if proto is None else _enum_or_int(TransportProtocols, proto),
+                   bytes.fromhex(value))
+        for assoc, dtype, code_set, proto, value in record['designators'])
+    return DeviceIdentity(record['path'],
+                          _enum_or_int(PeripheralDeviceTypes, record['peripheral_type']),
+                          record['vendor'], record['product'], record['revision'],
+                          record['serial'], designators,
+                          record['blocks'], record['block_size'])
+
+
+def discover(paths: Optional[Iterable[str]]=None, *, workers: Optional[int]=None,
+             cache: Optional[Union[str, InventoryCache]]=None,
+             errors: Optional[Dict[str, BaseException]]=None,
+             device_factory: Callable[..., BareDevice]=Device,
+             **open_kwargs) -> Dict[str, DeviceIdentity]:
+    """
+    여러 장치를 동시에 열어 `identify()` 한다.
+
+        inventory = discover(cache='/var/cache/pysg/inventory.json')
+        for path, ident in inventory.items():
+            print(path, ident.identifier, ident.capacity)
+
+    :param paths: 조사할 장치 경로. 생략하면 `default_paths()`
+    :param workers: 동시에 조사할 장치 수. 생략하면 장치 수 (최대 64)
+    :type workers: Optional[int]
+    :param cache: `InventoryCache` 또는 그 파일 경로. 주어지면 바뀌지 않은
+                  장치는 열지 않고, 조사가 끝나면 cache 를 저장한다.
+    :param errors: 주어지면 열거나 조사하지 못한 장치의 예외를 경로별로 넣는다.
+    :param device_factory: 경로로 장치를 여는 함수
+    :param open_kwargs: `device_factory` 에 넘길 인자. 생략하면 read-only 로 연다.
+    :return: 경로별 장치 정보. 실패한 장치는 포함되지 않는다.
+    :rtype: Dict[str, DeviceIdentity]
+    """
+    if paths is None:
+        paths = default_paths()
+    paths = list(paths)
+    if isinstance(cache, str):
+        cache = InventoryCache(cache)
+    if device_factory is Device:
+        open_kwargs.setdefault('readonly', True)
+
+    result = {}
+    pending = []
+    for path in paths:
+        signature = stat_signature(path)
+        ident = cache.lookup(path, signature) if cache is not None else None
+        if ident is not None:
+            result[path] = ident
+        else:
+            pending.append((path, signature))
+
+    def probe(path: str) -> DeviceIdentity:
+        with device_factory(path, **open_kwargs) as dev:
+            return identify(dev)
+
+    if pending:
+        if workers is None:
+            workers = min(len(pending), 64)
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='pysg-discover') as executor:
+            futures = [(path, signature, executor.submit(probe, path))
+                       for path, signature in pending]
+            for path, signature, fut in futures:
+                try:
+                    ident = fut.result()
+                except Exception as e:
+                    if errors is not None:
+                        errors[path] = e
+                    if cache is not None:
+                        cache.forget(path)
+                    continue
+                result[path] = ident
+                if cache is not None:
+                    cache.store(ident, signature)
+
+    if cache is not None:
+        cache.save()
+    return dict((path, result[path]) for path in paths if path in result)
@@ -0,0 +1,375 @@
+from .device import PTObject, Device
+from .enum import StatusCodes, PTResult, SenseKeyCodes
+from .transport import Transport
+from .aio import LoopbackBackend, TargetError, result_category, _DRIVER_SENSE, _DID_ERROR
+from typing import Optional, List, Tuple
+import hashlib
+import mmap
+import threading
+import time
+
+
+def sense_data(sense_key: int, asc: int, ascq: int, information: Optional[int]=None,
+               descriptor: bool=False) -> bytes:
+    """
+    sense data 를 만든다.
+
+    :param descriptor: True 이면 descriptor 형식, 아니면 fixed 형식
+    :type descriptor: bool
+    """
+    if descriptor:
+        sb = bytearray([0x72, sense_key & 0xf, asc, ascq, 0, 0, 0, 0])
+        if information is not None:
+            sb += bytes([0x00, 0x0a, 0x80, 0]) + information.to_bytes(8, 'big')
+            sb[7] = 12
+        return bytes(sb)
+
+    sb = bytearray(18)
+    sb[0] = 0x70
+    sb[2] = sense_key & 0xf
+    sb[7] = 10
+    sb[12] = asc
+    sb[13] = ascq
+    if information is not None:
+        sb[0] |= 0x80
+        sb[3:7] = (information & 0xffffffff).to_bytes(4, 'big')
+    return bytes(sb)
+
+
+class _Injection(object):
+    __slots__ = ('opcode', 'sense', 'count')
+
+    def __init__(self, opcode, sense, count):
+        self.opcode = opcode
+        self.sense = sense
+        self.count = count
+
+
+class EmulatedTarget(object):
+    """
+    메모리에 data 를 보관하는 direct access block 장치
+
+    TEST UNIT READY, INQUIRY (표준 및 VPD 0x00, 0x80, 0x83, 0xb0),
+    READ CAPACITY (10/16), READ/WRITE (10/16) 를 처리한다. 그 외의
+    command 는 ILLEGAL REQUEST 로 실패한다. `handle()` 은
+    `pysg.aio.LoopbackBackend` 의 handler 로 그대로 사용할 수 있다.
+
+    data 는 익명 mmap 에 보관되므로 실제로 쓴 영역만 메모리를 차지한다.
+
+        target = EmulatedTarget(blocks=1 << 20, latency=50e-6)
+        target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        with target.device() as dev:
+            dev.command(TestUnitReady(b'\\0' * 6))   # UNIT ATTENTION
+    """
+
+    def __init__(self, blocks: int=1 << 16, block_size: int=512,
+                 latency: float=0.0, vendor: str='PYSG', product: str='EMULATED',
+                 revision: str='0001', serial: str='EMU00000001',
+                 max_transfer_blocks: int=2048, descriptor_sense: bool=False):
+        """
+        :param blocks: block 수
+        :type blocks: int
+        :param block_size: block 크기
+        :type block_size: int
+        :param latency: command 하나를 처리하는 데 걸리는 시간 (초)
+        :type latency: float
+        :param max_transfer_blocks: Block Limits VPD 의 MAXIMUM TRANSFER LENGTH
+        :type max_transfer_blocks: int
+        :param descriptor_sense: descriptor 형식 sense 를 사용한다.
+        :type descriptor_sense: bool
+        """
+        self.blocks = blocks
+        self.block_size = block_size
+        self.latency = latency
+        self.vendor = vendor
+        self.product = product
+        self.revision = revision
+        self.serial = serial
+        self.max_transfer_blocks = max_transfer_blocks
+        self.descriptor_sense = descriptor_sense
+        self.storage = mmap.mmap(-1, blocks * block_size)
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._injections = []
+        self._handlers = {
+            0x00: self._test_unit_ready,
+            0x12: self._inquiry,
+            0x25: self._read_capacity10,
+            0x9e: self._service_action_in16,
+            0x28: self._read,
+            0x88: self._read,
+            0x2a: self._write,
+            0x8a: self._write,
+        }
+
+    def device(self, path: str='emulated', **kwargs) -> Device:
+        """
+        이 target 에 연결된 `Device` 를 만든다.
+        """
+        return Device(path, transport=EmulatedTransport(self), **kwargs)
+
+    def inject(self, sense_key: int, asc: int, ascq: int, opcode: Optional[int]=None,
+               count: int=1, information: Optional[int]=None):
+        """
+        다음 `count` 개의 command 를 CHECK CONDITION 으로 실패시킨다.
+
+        :param opcode: 주어지면 이 opcode 의 command 만 실패시킨다.
+        :type opcode: Optional[int]
+        """
+        sense = sense_data(sense_key, asc, ascq, information, self.descriptor_sense)
+        with self._lock:
+            self._injections.append(_Injection(opcode, sense, count))
+
+    def clear_injections(self):
+        with self._lock:
+            self._injections = []
+
+    def _injected(self, opcode: int) -> Optional[bytes]:
+        if not self._injections:
+            return None
+        with self._lock:
+            for idx, inj in enumerate(self._injections):
+                if inj.opcode is None or inj.opcode == opcode:
+                    inj.count -= 1
+                    if inj.count <= 0:
+                        del self._injections[idx]
+                    return inj.sense
+        return None
+
+    def _check(self, sense_key: int, asc: int, ascq: int) -> Tuple[int, bytes, int]:
+        return (StatusCodes.CHECK_CONDITION,
+                sense_data(sense_key, asc, ascq, descriptor=self.descriptor_sense), 0)
+
+    def handle(self, cdb: bytes, data_in: Optional[memoryview],
+               data_out: Optional[memoryview]) -> Tuple[int, bytes, int]:
+        """
+        command 하나를 처리한다.
+
+        :return: `(status, sense, resid)`
+        """
+        self.commands += 1
+        opcode = cdb[0]
+        sense = self._injected(opcode)
+        if sense is not None:
+            return StatusCodes.CHECK_CONDITION, sense, 0
+        handler = self._handlers.get(opcode)
+        if handler is None:
+            # INVALID COMMAND OPERATION CODE
+            return self._check(SenseKeyCodes.ILLEGAL_REQUEST, 0x20, 0x00)
+        return handler(cdb, data_in, data_out)
+
+    @staticmethod
+    def _reply(data_in: Optional[memoryview], payload: bytes,
+               alloc_len: int) -> Tuple[int, bytes, int]:
+        if data_in is None:
+            return StatusCodes.GOOD, b'', 0
+        n = min(len(data_in), alloc_len, len(payload))
+        data_in[:n] = payload[:n]
+        return StatusCodes.GOOD, b'', len(data_in) - n
+
+    def _test_unit_ready(self, cdb, data_in, data_out):
+        return StatusCodes.GOOD, b'', 0
+
+    def _designators(self) -> bytes:
+        # NAA 5 (IEEE registered) 와 T10 vendor ID 기반 designator
+        digest = hashlib.sha1(self.serial.encode('ascii')).digest()
+        naa = (0x5 << 60) | (0x0a0b0c << 36) | (int.from_bytes(digest[:5], 'big') >> 4)
+        t10 = '{:8s}{:16s}{}'.format(self.vendor, self.product, self.serial).encode('ascii')
+        return (bytes([0x01, 0x03, 0x00, 8]) + naa.to_bytes(8, 'big') +
+                bytes([0x02, 0x01, 0x00, len(t10)]) + t10)
+
+    def _vpd(self, page: int) -> Optional[bytes]:
+        if page == 0x00:
+            body = bytes([0x00, 0x80, 0x83, 0xb0])
+        elif page == 0x80:
+            body = self.serial.encode('ascii')
+        elif page == 0x83:
+            body = self._designators()
+        elif page == 0xb0:
+            body = bytearray(0x3c)
+            body[4:8] = self.max_transfer_blocks.to_bytes(4, 'big')
+            body[8:12] = min(self.max_transfer_blocks, 256).to_bytes(4, 'big')
+            body = bytes(body)
+        else:
+            return None
+        return bytes([0x00, page]) + len(body).to_bytes(2, 'big') + body
+
+    def _inquiry(self, cdb, data_in, data_out):
+        alloc_len = int.from_bytes(cdb[3:5], 'big')
+        if cdb[1] & 0x01:
+            payload = self._vpd(cdb[2])
+            if payload is None:
+                # INVALID FIELD IN CDB
+                return self._check(SenseKeyCodes.ILLEGAL_REQUEST, 0x24, 0x00)
+        else:
+            payload = bytearray(36)
+            payload[2] = 0x06
+            payload[3] = 0x02
+            payload[4] = 31
+            payload[7] = 0x02
+            payload[8:16] = '{:8.8s}'.format(self.vendor).encode('ascii')
+            payload[16:32] = '{:16.16s}'.format(self.product).encode('ascii')
+            payload[32:36] = '{:4.4s}'.format(self.revision).encode('ascii')
+        return self._reply(data_in, payload, alloc_len)
+
+    def _read_capacity10(self, cdb, data_in, data_out):
+        last = min(self.blocks - 1, 0xffffffff)
+        payload = last.to_bytes(4, 'big') + self.block_size.to_bytes(4, 'big')
+        return self._reply(data_in, payload, 8)
+
+    def _service_action_in16(self, cdb, data_in, data_out):
+        if cdb[1] & 0x1f != 0x10:
+            return self._check(SenseKeyCodes.ILLEGAL_REQUEST, 0x24, 0x00)
+        payload = bytearray(32)
+        payload[0:8] = (self.blocks - 1).to_bytes(8, 'big')
+        payload[8:12] = self.block_size.to_bytes(4, 'big')
+        return self._reply(data_in, payload, int.from_bytes(cdb[10:14], 'big'))
+
+    def _extent(self, cdb) -> Tuple[int, int]:
+        if cdb[0] & 0xe0 == 0x80:
+            return int.from_bytes(cdb[2:10], 'big'), int.from_bytes(cdb[10:14], 'big')
+        return int.from_bytes(cdb[2:6], 'big'), int.from_bytes(cdb[7:9], 'big')
+
+    def _read(self, cdb, data_in, data_out):
+        lba, count = self._extent(cdb)
+        if lba + count > self.blocks:
+            # LOGICAL BLOCK ADDRESS OUT OF RANGE
+            return self._check(SenseKeyCodes.ILLEGAL_REQUEST, 0x21, 0x00)
+        if data_in is None:
+            return StatusCodes.GOOD, b'', 0
+        start = lba * self.block_size
+        n = min(len(data_in), count * self.block_size)
+        data_in[:n] = self.storage[start:start + n]
+        return StatusCodes.GOOD, b'', len(data_in) - n
+
+    def _write(self, cdb, data_in, data_out):
+        lba, count = self._extent(cdb)
+        if lba + count > self.blocks:
+            return self._check(SenseKeyCodes.ILLEGAL_REQUEST, 0x21, 0x00)
+        if data_out is None:
+            return StatusCodes.GOOD, b'', 0
+        start = lba * self.block_size
+        n = min(len(data_out), count * self.block_size)
+        self.storage[start:start + n] = data_out[:n]
+        return StatusCodes.GOOD, b'', len(data_out) - n
+
+
+class EmulatedPTObject(PTObject):
+    """
+    ioctl 대신 `EmulatedTarget` 으로 실행되는 `PTObject`
+
+    command 와 buffer 설정은 `PTObject` 와 같으므로 실제 장치가 없어도
+    라이브러리 자체의 비용을 측정할 수 있다. 결과는 sg_pt object 가 아닌
+    이 객체에 보관된다. `sg_cmds_process_resp()` 는 호출하지 않는다.
+
+    target 이 `pysg.aio.TargetError` 를 발생시키면 host status 가 DID_ERROR
+    인 transport 오류가 되고, 그 외의 예외는 그대로 전달된다.
+    """
+
+    def _setup(self, *args):
+        super()._setup(*args)
+        self._status = 0
+        self._sense_len = 0
+        self._resid = 0
+        self._host_status = 0
+        self._duration = 0
+
+    def _execute(self, device: 'Device', timeout: int, noisy: bool,
+                 verbose: bool, quiet: bool, profiler=None) -> int:
+        target = device.transport.target
+        start = time.perf_counter_ns()
+        data_in = data_out = None
+        if self._data_in is not None:
+            data_in = memoryview(self._data_in.buffer)
+        if self._data_out is not None:
+            data_out = memoryview(self._data_out.buffer)
+
+        try:
+            status, sense, resid = target.handle(bytes(self.cmd._cdb), data_in, data_out)
+        except TargetError:
+            status, sense, resid = 0, b'', 0
+            self._host_status = _DID_ERROR
+        else:
+            self._host_status = 0
+        if target.latency:
+            remain = target.latency - (time.perf_counter_ns() - start) / 1e9
+            if remain > 0:
+                time.sleep(remain)
+
+        # 이전 command 의 더 긴 sense 가 남지 않도록 나머지는 0 으로 채운다.
+        buf = self._sense.buffer
+        sb_len = min(len(sense), len(buf))
+        buf[0:sb_len] = sense[:sb_len]
+        buf[sb_len:] = bytes(len(buf) - sb_len)
+        self._sense.invalidate()
+        self._status = status
+        self._sense_len = sb_len
+        self._resid = resid
+        if self._data_in is not None:
+            self._data_in.flush(max(0, len(self._data_in) - resid))
+        end = time.perf_counter_ns()
+        self._duration = (end - start) // 1000000
+        if profiler is not None:
+            profiler.add('ioctl', end - start)
+        return 0
+
+    @property
+    def sense_size(self) -> int:
+        return self._sense_len
+
+    @property
+    def result_category(self) -> PTResult:
+        return result_category(self._status, self._host_status,
+                               _DRIVER_SENSE if self._sense_len else 0)
+
+    @property
+    def resid(self) -> int:
+        return self._resid
+
+    @property
+    def status_response(self) -> StatusCodes:
+        return StatusCodes(self._status)
+
+    @property
+    def os_err(self) -> int:
+        return 0
+
+    @property
+    def transport_err(self) -> int:
+        return self._host_status << 8
+
+    @property
+    def transport_err_str(self) -> str:
+        return "host_status={:#x}".format(self._host_status)
+
+    @property
+    def duration_ms(self) -> int:
+        return self._duration
+
+
+class EmulatedTransport(Transport):
+    """
+    `EmulatedTarget` 에 연결하는 transport
+
+    동기 command 는 `EmulatedPTObject` 로, `command_queue()` 는
+    `pysg.aio.LoopbackBackend` 로 실행된다.
+    """
+
+    def __init__(self, target: EmulatedTarget):
+        self.target = target
+
+    @property
+    def pt_class(self) -> type:
+        return EmulatedPTObject
+
+    def open(self, path: str, readonly: bool, verbose: bool,
+             flags: Optional[int]) -> int:
+        # 열린 장치가 없으므로 fd 를 사용하는 sg_cmds 함수들은 실패한다.
+        return -1
+
+    def close(self, fd: int):
+        pass
+
+    def queue_backends(self, device, depth: int,
+                       private: bool=False) -> List[LoopbackBackend]:
+        return [LoopbackBackend(self.target.handle, self.target.latency)]
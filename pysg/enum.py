@@ -96,18 +96,34 @@ class ErrorCategories(int, DescEnum):
 
 SG_LIB_CAT = ErrorCategories
 
-DesignatorTypes = desig_enum_generator(
-        'DesignatorTypes', 'sg_get_desig_type_str', 'Type', 1, 15, VendorSpecific=0)
-
-DesignatorCodeSets = desig_enum_generator(
-        'DesignatorCodeSets', 'sg_get_desig_code_set_str', 'CodeSet', 0, 15)
-
-DesignatorAssociations = desig_enum_generator(
-        'DesignatorAssociations', 'sg_get_desig_assoc_str', 'Assoc', 0, 3)
-
-DesigType = DesignatorTypes
-DesigCodeSet = DesignatorCodeSets
-DesigAssoc = DesignatorAssociations
+# Designator 관련 enum 들은 값마다 설명 함수를 호출해서 만들어지므로
+# 처음 사용할 때 만든다. (module `__getattr__`)
+_lazy_enums = {
+    'DesignatorTypes': lambda: desig_enum_generator(
+        'DesignatorTypes', 'sg_get_desig_type_str', 'Type', 1, 15, VendorSpecific=0),
+    'DesignatorCodeSets': lambda: desig_enum_generator(
+        'DesignatorCodeSets', 'sg_get_desig_code_set_str', 'CodeSet', 0, 15),
+    'DesignatorAssociations': lambda: desig_enum_generator(
+        'DesignatorAssociations', 'sg_get_desig_assoc_str', 'Assoc', 0, 3),
+}
+
+_lazy_aliases = {
+    'DesigType': 'DesignatorTypes',
+    'DesigCodeSet': 'DesignatorCodeSets',
+    'DesigAssoc': 'DesignatorAssociations',
+}
+
+
+def __getattr__(name):
+    target = _lazy_aliases.get(name, name)
+    if target not in _lazy_enums:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    val = _lazy_enums[target]()
+    globals()[target] = val
+    for alias, t in _lazy_aliases.items():
+        if t == target:
+            globals()[alias] = val
+    return val
 
  
 @enumize(sg_pt, 'SCSI_PT_FLAGS_')
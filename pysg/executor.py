@@ -0,0 +1,175 @@
+from .device import BareDevice, Device
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional, Union
+import queue
+import threading
+
+
+class DevicePool(object):
+    """
+    여러 장치를 worker thread 들에 나누어 맡기는 executor
+
+    장치마다 담당 worker 가 하나 정해지며 (affinity), 그 장치의 작업은 항상
+    그 worker 에서 제출된 순서대로 실행된다. 따라서 하나의 장치를 두
+    thread 가 동시에 사용하는 일은 없다. 작업 안에서는 그 장치가
+    `Device.current()` 로 설정된다. cffi 는 C 함수를 호출하는 동안
+    GIL 을 놓으므로 ioctl 을 기다리는 동안 다른 worker 가 진행할 수 있다.
+
+        with DevicePool(['/dev/sg{}'.format(i) for i in range(60)]) as pool:
+            futures = pool.map(lambda dev: dev.command(TestUnitReady(b'\\0' * 6)))
+            for path, fut in futures.items():
+                fut.result()
+    """
+
+    def __init__(self, devices: Iterable[Union[str, BareDevice]]=(),
+                 workers: Optional[int]=None,
+                 device_factory: Callable[..., BareDevice]=Device, **open_kwargs):
+        """
+        :param devices: 장치 경로 또는 이미 열린 `BareDevice` 들
+        :param workers: worker thread 수. 생략하면 장치 수 (최소 1, 최대 64)
+        :type workers: Optional[int]
+        :param device_factory: 경로로 장치를 열 때 사용할 함수
+        :param open_kwargs: `device_factory` 에 넘길 인자
+        """
+        devices = list(devices)
+        if workers is None:
+            workers = min(max(len(devices), 1), 64)
+        self._factory = device_factory
+        self._open_kwargs = open_kwargs
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._owned = set()
+        self._affinity = {}
+        self._load = [0] * workers
+        self._queues = [queue.SimpleQueue() for _ in range(workers)]
+        self._threads = []
+        self._shutdown = False
+        for idx, q in enumerate(self._queues):
+            t = threading.Thread(target=self._work, args=(q,), daemon=True,
+                                 name='DevicePool-{}'.format(idx))
+            t.start()
+            self._threads.append(t)
+        for dev in devices:
+            self.add(dev)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, tb):
+        self.shutdown()
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __iter__(self):
+        return iter(list(self._devices))
+
+    def __getitem__(self, key: str) -> BareDevice:
+        return self._devices[key]
+
+    @property
+    def workers(self) -> int:
+        return len(self._queues)
+
+    def add(self, device: Union[str, BareDevice]) -> str:
+        """
+        장치를 추가하고 가장 적은 장치를 맡은 worker 에 배정한다.
+        경로가 주어지면 `device_factory` 로 열고, pool 이 닫을 때 같이 닫는다.
+
+        :return: 이후 작업을 제출할 때 사용할 key (장치 경로)
+        :rtype: str
+        """
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("DevicePool is shut down")
+            if isinstance(device, str):
+                key = device
+                if key in self._devices:
+                    raise KeyError("Device {} is already in the pool".format(key))
+                device = self._factory(key, **self._open_kwargs)
+                self._owned.add(key)
+            else:
+                key = device._path
+                if key in self._devices:
+                    raise KeyError("Device {} is already in the pool".format(key))
+            worker = self._load.index(min(self._load))
+            self._load[worker] += 1
+            self._devices[key] = device
+            self._affinity[key] = worker
+            return key
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        `fn(device, *args, **kwargs)` 를 장치를 담당하는 worker 에서 실행한다.
+
+        :rtype: concurrent.futures.Future
+        """
+        fut = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("DevicePool is shut down")
+            device = self._devices[key]
+            self._queues[self._affinity[key]].put((fut, fn, device, args, kwargs))
+        return fut
+
+    def command(self, key: str, *args, **kwargs) -> Future:
+        """
+        `device.command(*args, **kwargs)` 를 담당 worker 에서 실행한다.
+        """
+        return self.submit(key, _command, *args, **kwargs)
+
+    def map(self, fn: Callable, *args, keys: Optional[Iterable[str]]=None,
+            **kwargs) -> Dict[str, Future]:
+        """
+        모든 장치 (또는 `keys`) 에 대해 `fn(device, *args, **kwargs)` 를 실행한다.
+
+        :return: key 별 `Future`
+        :rtype: Dict[str, Future]
+        """
+        if keys is None:
+            keys = list(self._devices)
+        return dict((key, self.submit(key, fn, *args, **kwargs)) for key in keys)
+
+    def shutdown(self, wait: bool=True, close_devices: bool=True):
+        """
+        새 작업을 받지 않고 worker 들을 끝낸다. 이미 제출된 작업은 실행된다.
+
+        :param wait: 실행 중인 작업이 끝날 때까지 기다린다.
+        :type wait: bool
+        :param close_devices: 경로로 연 장치들을 닫는다. 작업이 끝난 뒤에
+                              닫아야 하므로 `wait` 가 True 일 때만 적용된다.
+        :type close_devices: bool
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            for q in self._queues:
+                q.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+        if wait and close_devices:
+            for key in self._owned:
+                self._devices[key].close()
+
+    @staticmethod
+    def _work(q: queue.SimpleQueue):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            fut, fn, device, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                with device.activate():
+                    result = fn(device, *args, **kwargs)
+            except BaseException as e:
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+
+
+def _command(device: BareDevice, *args, **kwargs):
+    return device.command(*args, **kwargs)
@@ -0,0 +1,283 @@
+from .enum import PTResult
+from collections import Counter
+from typing import Dict, Optional, Tuple
+import os
+import threading
+
+
+class LatencyHistogram(object):
+    """
+    HDR histogram 형태의 latency 분포
+
+    값의 크기와 관계없이 상대 오차가 `1 / 2 ** (precision - 1)` 이하가 되도록
+    2 의 거듭제곱 구간마다 `2 ** (precision - 1)` 개의 bucket 을 둔다.
+    bucket 은 필요한 만큼만 늘어난다. 단위는 사용하는 쪽에서 정하며
+    `DeviceMetrics` 는 마이크로초를 사용한다.
+    """
+    __slots__ = ('precision', '_half', '_counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, precision: int=7):
+        """
+        :param precision: bucket 하나가 나타내는 구간의 유효 bit 수
+        :type precision: int
+        """
+        self.precision = precision
+        self._half = 1 << (precision - 1)
+        self._counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.precision
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _bounds(self, idx: int) -> Tuple[int, int]:
+        shift = max(0, idx // self._half - 1)
+        sub = idx - shift * self._half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def record(self, value: int):
+        value = int(value)
+        if value < 0:
+            value = 0
+        idx = self._index(value)
+        counts = self._counts
+        if idx >= len(counts):
+            counts.extend([0] * (idx + 1 - len(counts)))
+        counts[idx] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram'):
+        if other.precision != self.precision:
+            raise ValueError("Histogram precision mismatch")
+        counts = self._counts
+        if len(other._counts) > len(counts):
+            counts.extend([0] * (len(other._counts) - len(counts)))
+        for idx, n in enumerate(other._counts):
+            counts[idx] += n
+        self.count += other.count
+        self.total += other.total
+        for v in (other.min, other.max):
+            if v is not None:
+                self.min = v if self.min is None else min(self.min, v)
+                self.max = v if self.max is None else max(self.max, v)
+
+    def percentile(self, q: float) -> Optional[int]:
+        """
+        `q` (0 ~ 100) 번째 백분위 값. bucket 의 상한을 반환한다.
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for idx, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                return min(self._bounds(idx)[1], self.max)
+        return self.max
+
+    def cumulative(self, bound: int) -> int:
+        """
+        `bound` 이하인 값의 수. `bound` 가 bucket 의 상한이 아니면 `bound` 가
+        속한 bucket 은 세지 않는다.
+        """
+        seen = 0
+        for idx, n in enumerate(self._counts):
+            if self._bounds(idx)[1] > bound:
+                break
+            seen += n
+        return seen
+
+    def snapshot(self) -> Dict[str, Optional[int]]:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+        }
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class DeviceMetrics(object):
+    """
+    `BareDevice.command()` 의 실행 결과를 모으는 통계
+
+    latency 는 opcode 와 service action 별로, `do_scsi_pt()` 호출 전후의
+    시간을 마이크로초 단위로 기록한다. (`duration_ms` 는 해상도가 너무 낮다.)
+    결과는 `PTResult`, `StatusCodes`, sense key 별로 세고, 전송한 byte 수는
+    buffer 크기에서 `resid` 를 뺀 값으로 계산한다.
+
+    `BareDevice.enable_metrics()` 로 켜고 `BareDevice.metrics = None` 으로
+    끌 수 있다.
+    """
+
+    def __init__(self, device: str='', precision: int=7):
+        """
+        :param device: Prometheus 출력에 사용할 장치 이름
+        :type device: str
+        :param precision: `LatencyHistogram` 의 precision
+        :type precision: int
+        """
+        self.device = device
+        self.precision = precision
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latency = {}
+            self._names = {}
+            self.results = Counter()
+            self.statuses = Counter()
+            self.sense_keys = Counter()
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    @staticmethod
+    def _key(cmd) -> Tuple[int, Optional[int]]:
+        field = cmd._fields.get('service_action')
+        sa = field.read(cmd._cdb) if field is not None else None
+        return cmd._cdb[0], sa
+
+    def record(self, obj, elapsed_ns: int):
+        """
+        실행이 끝난 `PTObject` 의 결과를 기록한다.
+
+        :param obj: `cmd`, `result_category`, `status_response`, `sense`,
+                    `resid` 를 제공하는 객체
+        :param elapsed_ns: 실행에 걸린 시간
+        :type elapsed_ns: int
+        """
+        cmd = obj.cmd
+        key = self._key(cmd)
+        category = obj.result_category
+        transferred = 0
+        data_in = obj._data_in
+        data = data_in if data_in is not None else obj._data_out
+        if data is not None:
+            length = len(data)
+            transferred = max(0, min(length, length - obj.resid))
+
+        with self._lock:
+            hist = self._latency.get(key)
+            if hist is None:
+                hist = self._latency[key] = LatencyHistogram(self.precision)
+                self._names[key] = cmd.name
+            hist.record(elapsed_ns // 1000)
+            self.results[category] += 1
+            if category is PTResult.STATUS or category is PTResult.SENSE:
+                self.statuses[obj.status_response] += 1
+            if category is PTResult.SENSE:
+                self.sense_keys[obj.sense.sense_key] += 1
+            if data is data_in:
+                self.bytes_in += transferred
+            else:
+                self.bytes_out += transferred
+
+    @property
+    def outcomes(self) -> Counter:
+        """
+        `(종류, 이름)` 별 결과 수. 종류는 'result', 'status', 'sense_key' 이다.
+        """
+        outcomes = Counter()
+        for kind, counter in (('result', self.results),
+                              ('status', self.statuses),
+                              ('sense_key', self.sense_keys)):
+            for value, n in counter.items():
+                outcomes[kind, getattr(value, 'name', str(value))] += n
+        return outcomes
+
+    def latency(self, opcode: int, service_action: Optional[int]=None) -> Optional[LatencyHistogram]:
+        return self._latency.get((opcode, service_action))
+
+    def snapshot(self) -> dict:
+        """
+        현재 통계를 dict 로 복사한다. latency 는 마이크로초 단위이다.
+        """
+        with self._lock:
+            commands = {}
+            for (op, sa), hist in sorted(self._latency.items(),
+                                         key=lambda kv: (kv[0][0], kv[0][1] or 0)):
+                label = "{:#04x}".format(op) if sa is None else \
+                        "{:#04x}/{:#04x}".format(op, sa)
+                entry = hist.snapshot()
+                entry['name'] = self._names[op, sa]
+                commands[label] = entry
+            outcomes = {}
+            for (kind, name), n in self.outcomes.items():
+                outcomes.setdefault(kind, {})[name] = n
+            return {
+                'device': self.device,
+                'commands': commands,
+                'outcomes': outcomes,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+            }
+
+    def to_prometheus(self, prefix: str='pysg') -> str:
+        """
+        Prometheus text exposition format 으로 변환한다.
+        latency 는 초 단위 histogram 이며 bucket 경계는 2 의 거듭제곱
+        마이크로초이다.
+        """
+        dev = _label(self.device)
+        lines = []
+        with self._lock:
+            name = prefix + '_command_latency_seconds'
+            lines.append('# HELP {} SCSI command latency'.format(name))
+            lines.append('# TYPE {} histogram'.format(name))
+            for (op, sa), hist in sorted(self._latency.items(),
+                                         key=lambda kv: (kv[0][0], kv[0][1] or 0)):
+                labels = 'device="{}",opcode="{:#04x}",service_action="{}",command="{}"'.format(
+                        dev, op, '' if sa is None else "{:#04x}".format(sa),
+                        _label(self._names[op, sa]))
+                bound = 1
+                while True:
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                            name, labels, bound / 1e6, hist.cumulative(bound)))
+                    if hist.max is None or bound > hist.max:
+                        break
+                    bound <<= 1
+                lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, hist.count))
+                lines.append('{}_sum{{{}}} {}'.format(name, labels, hist.total / 1e6))
+                lines.append('{}_count{{{}}} {}'.format(name, labels, hist.count))
+
+            name = prefix + '_command_outcomes_total'
+            lines.append('# HELP {} SCSI command outcomes'.format(name))
+            lines.append('# TYPE {} counter'.format(name))
+            for (kind, value), n in sorted(self.outcomes.items()):
+                lines.append('{}{{device="{}",kind="{}",value="{}"}} {}'.format(
+                        name, dev, kind, _label(value), n))
+
+            name = prefix + '_transferred_bytes_total'
+            lines.append('# HELP {} Bytes transferred by SCSI commands'.format(name))
+            lines.append('# TYPE {} counter'.format(name))
+            lines.append('{}{{device="{}",direction="in"}} {}'.format(name, dev, self.bytes_in))
+            lines.append('{}{{device="{}",direction="out"}} {}'.format(name, dev, self.bytes_out))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, prefix: str='pysg'):
+        """
+        node_exporter 의 textfile collector 가 읽을 수 있도록 파일에 쓴다.
+        읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 바꿔치기한다.
+        """
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp, path)
@@ -0,0 +1,125 @@
+from . import _pysg, Buffer
+from .sgio import SGIOPTObject, SG_IO, _SG_MAJOR
+from typing import Optional
+import errno
+import fcntl
+import mmap
+import os
+import stat
+import struct
+import threading
+
+# linux/scsi/sg.h
+SG_GET_RESERVED_SIZE = 0x2272
+SG_SET_RESERVED_SIZE = 0x2275
+SG_FLAG_MMAP_IO = 4
+
+
+class ReservedBuffer(Buffer):
+    """
+    mmap 한 sg reserved buffer 를 가리키는 `Buffer`
+
+    이 buffer 로 실행한 command 는 `SG_FLAG_MMAP_IO` 로 실행되므로 커널과
+    사용자 메모리 사이의 복사가 없다. `buffer` 는 mmap 된 메모리를 그대로
+    보여주므로 읽은 data 를 복사 없이 검사하거나 다른 곳으로 보낼 수 있다.
+    reserved buffer 는 장치마다 하나이므로 다음 command 를 실행하면 내용이
+    바뀐다.
+    """
+
+    def __init__(self, io: 'MmapIO', length: int):
+        self._io = io
+        self._ptr = _pysg.ffi.from_buffer('unsigned char[]',
+                                          io._view[:length], True)
+
+    def prefix(self, length: int) -> 'ReservedBuffer':
+        """
+        앞쪽 `length` byte 만 전송하는 buffer. mmap IO 는 항상 reserved
+        buffer 의 처음부터 전송하므로 offset 은 지정할 수 없다.
+        """
+        if length > len(self):
+            raise ValueError("Length exceeds the reserved buffer")
+        return ReservedBuffer(self._io, length)
+
+
+class MmapPTObject(SGIOPTObject):
+    """
+    `ReservedBuffer` 를 사용하는 command 를 `SG_FLAG_MMAP_IO` 와 함께 SG_IO
+    ioctl 로 직접 실행하는 `PTObject`
+
+    sg_pt 는 mmap IO 를 지원하지 않으므로 `SGIOPTObject` 처럼 `sg_io_hdr_t`
+    를 직접 만들고 결과도 이 header 에서 읽는다.
+    """
+
+    def _setup(self, cmd, data_in, data_out, *args, **kwargs):
+        super()._setup(cmd, data_in, data_out, *args, **kwargs)
+        self._hdr.flags |= SG_FLAG_MMAP_IO
+        # mmap IO 에서는 dxferp 를 사용하지 않는다.
+        self._hdr.dxferp = _pysg.ffi.NULL
+
+    def _ioctl(self, fd: int):
+        # reserved buffer 는 하나뿐이므로 동시에 하나의 command 만 사용할 수 있다.
+        with self.data._io.lock:
+            super()._ioctl(fd)
+
+
+class MmapIO(object):
+    """
+    sg 장치의 reserved buffer 를 mmap 해서 사용하는 IO 모드
+
+    `BareDevice.enable_mmap_io()` 로 만든다. sg 장치가 아니거나 (block
+    장치, emulation 등) reserved buffer 를 mmap 할 수 없으면 생성할 때
+    `OSError` 가 발생한다.
+    """
+
+    def __init__(self, device: 'BareDevice', size: int):
+        """
+        :param device: sg 장치
+        :param size: 원하는 reserved buffer 크기. 커널이 더 작게 잡을 수 있으며,
+                     실제 크기는 `size` 속성으로 확인한다.
+        :type size: int
+        """
+        fd = device.fileno()
+        if fd is None or fd < 0:
+            raise OSError(errno.ENOTTY, "Device has no sg file descriptor")
+        # block 장치도 reserved size ioctl 에는 응답하지만, mmap 하면 disk 의
+        # 내용이 매핑되므로 sg 장치인지 먼저 확인한다.
+        st = os.fstat(fd)
+        if not stat.S_ISCHR(st.st_mode) or os.major(st.st_rdev) != _SG_MAJOR:
+            raise OSError(errno.ENOTTY, "{} is not an sg device".format(device._path))
+        fcntl.ioctl(fd, SG_SET_RESERVED_SIZE, struct.pack('i', size))
+        granted = struct.unpack('i', fcntl.ioctl(fd, SG_GET_RESERVED_SIZE,
+                                                 struct.pack('i', 0)))[0]
+        if granted <= 0:
+            raise OSError(errno.ENOMEM, "sg reserved buffer is not available")
+        self._mmap = mmap.mmap(fd, granted, mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE)
+        self._view = memoryview(self._mmap)
+        self.size = granted
+        self.lock = threading.Lock()
+        self.buffer = ReservedBuffer(self, granted)
+
+    def owns(self, data) -> bool:
+        return isinstance(data, ReservedBuffer) and data._io is self
+
+    def pt_object(self, args, kwargs) -> Optional[MmapPTObject]:
+        """
+        `PTObject` 인자의 data buffer 가 이 reserved buffer 이면
+        `MmapPTObject` 를 만들고, 아니면 None 을 반환한다.
+        """
+        data_in = kwargs.get('data_in', args[2] if len(args) > 2 else None)
+        data_out = kwargs.get('data_out', args[3] if len(args) > 3 else None)
+        if self.owns(data_in) or self.owns(data_out):
+            return MmapPTObject(*args, **kwargs)
+        return None
+
+    def close(self):
+        if self._mmap is None:
+            return
+        self.buffer = None
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            # 아직 사용 중인 `ReservedBuffer` 가 있으면 GC 될 때 해제된다.
+            pass
+        self._mmap = None
@@ -0,0 +1,223 @@
+from .enum import PTResult, SenseKeyCodes, StatusCodes
+from .metrics import DeviceMetrics, LatencyHistogram
+from collections import Counter
+from typing import Dict, Optional, Tuple
+import enum
+import math
+import threading
+
+
+class RetryReason(enum.Enum):
+    """
+    `RetryPolicy` 가 다시 시도하는 실패의 종류
+    """
+    UNIT_ATTENTION = 'unit_attention'
+    BECOMING_READY = 'becoming_ready'
+    BUSY = 'busy'
+    TASK_SET_FULL = 'task_set_full'
+    TIMEOUT = 'timeout'
+
+
+_STATUS_REASONS = {
+    StatusCodes.BUSY: RetryReason.BUSY,
+    StatusCodes.TASK_SET_FULL: RetryReason.TASK_SET_FULL,
+}
+
+
+class RetryPolicy(object):
+    """
+    장치 하나의 command timeout 과 재시도 규칙
+
+    timeout 은 opcode 와 service action 별로 성공한 command 의 latency 를
+    `LatencyHistogram` 에 모아, `min_samples` 개 이상 모이면
+    `percentile` 백분위 값의 `multiplier` 배 (초 단위로 올림) 로 정한다.
+    그 전에는 `default_timeout` 을 사용한다.
+
+    실패는 status 와 해석된 sense (`SenseRecord`) 의 값만으로 분류하며,
+    UNIT ATTENTION, NOT READY 중 곧 준비되는 상태 (`becoming_ready`), BUSY,
+    TASK SET FULL, timeout 만 다시 시도한다. 다시 시도하기 전에는
+    `backoff * 2 ** attempt` (최대 `max_backoff`) 초를 기다리며, UNIT
+    ATTENTION 은 보고되는 것으로 해제되므로 바로 다시 시도한다. timeout
+    으로 다시 시도할 때는 연속된 timeout 횟수만큼 timeout 을 두 배씩 늘린다.
+
+    결정은 `counters` 와 `reasons` 에 기록된다. `BareDevice.enable_retry_policy()`
+    로 켠다.
+    """
+
+    # NOT READY 중 다시 시도할 (ASC, ASCQ). 04/01: becoming ready
+    becoming_ready = frozenset({(0x04, 0x01)})
+
+    def __init__(self, default_timeout: int=5, max_retries: int=3,
+                 backoff: float=0.01, max_backoff: float=1.0,
+                 percentile: float=99.9, multiplier: float=4.0,
+                 min_timeout: int=1, max_timeout: int=60, min_samples: int=32,
+                 retry_timeouts: bool=True, precision: int=7):
+        """
+        :param default_timeout: latency 가 충분히 모이기 전의 timeout (초)
+        :type default_timeout: int
+        :param max_retries: command 하나를 다시 시도할 최대 횟수
+        :type max_retries: int
+        :param backoff: 첫 재시도 전에 기다리는 시간 (초)
+        :type backoff: float
+        :param max_backoff: 재시도 전에 기다리는 최대 시간 (초)
+        :type max_backoff: float
+        :param percentile: timeout 을 정할 latency 백분위
+        :type percentile: float
+        :param multiplier: 백분위 값에 곱할 배율
+        :type multiplier: float
+        :param min_timeout: 학습한 timeout 의 하한 (초)
+        :type min_timeout: int
+        :param max_timeout: timeout 의 상한 (초)
+        :type max_timeout: int
+        :param min_samples: timeout 을 학습하기 시작할 성공 횟수
+        :type min_samples: int
+        :param retry_timeouts: timeout 된 command 도 다시 시도한다.
+        :type retry_timeouts: bool
+        :param precision: `LatencyHistogram` 의 precision
+        :type precision: int
+        """
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.retry_timeouts = retry_timeouts
+        self.precision = precision
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        학습한 timeout 과 counter 를 모두 지운다.
+        """
+        with self._lock:
+            self._latency = {}
+            self._timeouts = {}
+            self.counters = Counter()
+            self.reasons = Counter()
+
+    @staticmethod
+    def key(cmd) -> Tuple[int, Optional[int]]:
+        """
+        timeout 을 구분하는 `(opcode, service action)`
+        """
+        return DeviceMetrics._key(cmd)
+
+    def timeout(self, key: Tuple[int, Optional[int]], timeouts: int=0) -> int:
+        """
+        다음 시도에 사용할 timeout (초). 직전까지 연속으로 `timeouts` 번
+        timeout 되었으면 그 횟수만큼 두 배씩 늘린다. 다른 이유로 다시 시도한
+        뒤에는 `timeouts` 가 0 이므로 학습한 timeout 으로 돌아간다.
+        """
+        timeout = self._timeouts.get(key, self.default_timeout)
+        if timeouts:
+            timeout = min(timeout * (2 ** timeouts), max(self.max_timeout, timeout))
+        return timeout
+
+    def learned(self) -> Dict[Tuple[int, Optional[int]], int]:
+        """
+        지금까지 학습한 `(opcode, service action)` 별 timeout (초)
+        """
+        with self._lock:
+            return dict(self._timeouts)
+
+    def classify(self, status) -> Optional[RetryReason]:
+        """
+        실행 결과가 다시 시도할 실패이면 그 종류를, 아니면 None 을 반환한다.
+
+        :param status: `BareDevice.try_command()` 가 반환하는 `CommandStatus`
+        :rtype: Optional[RetryReason]
+        """
+        if status.timed_out:
+            return RetryReason.TIMEOUT if self.retry_timeouts else None
+        category = status.category
+        if category is PTResult.STATUS:
+            return _STATUS_REASONS.get(status.status_response)
+        if category is PTResult.SENSE:
+            rec = status.obj.sense.record
+            if rec is None:
+                return None
+            sense_key = rec.sense_key
+            if sense_key == SenseKeyCodes.UNIT_ATTENTION:
+                return RetryReason.UNIT_ATTENTION
+            if sense_key == SenseKeyCodes.NOT_READY and \
+                    (rec.asc, rec.ascq) in self.becoming_ready:
+                return RetryReason.BECOMING_READY
+        return None
+
+    def delay(self, reason: RetryReason, attempt: int) -> float:
+        """
+        `attempt` 번째 재시도 전에 기다릴 시간 (초)
+        """
+        if reason is RetryReason.UNIT_ATTENTION:
+            return 0.0
+        return min(self.backoff * (1 << attempt), self.max_backoff)
+
+    def _observe(self, key: Tuple[int, Optional[int]], elapsed_ns: int):
+        hist = self._latency.get(key)
+        if hist is None:
+            hist = self._latency[key] = LatencyHistogram(self.precision)
+        hist.record(elapsed_ns // 1000)
+        count = hist.count
+        if count < self.min_samples:
+            return
+        # 백분위는 bucket 을 모두 훑어야 하므로 표본 수가 2 의 거듭제곱이거나
+        # 1024 의 배수일 때만 다시 구한다.
+        if count != self.min_samples and count & (count - 1) and count % 1024:
+            return
+        timeout = math.ceil(hist.percentile(self.percentile) * self.multiplier / 1e6)
+        timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+        if self._timeouts.get(key) != timeout:
+            self._timeouts[key] = timeout
+            self.counters['timeout_updates'] += 1
+
+    def decide(self, key: Tuple[int, Optional[int]], status, elapsed_ns: int,
+               attempt: int) -> Tuple[Optional[RetryReason], float]:
+        """
+        `attempt` 번째 (0 부터) 시도의 결과를 기록하고 다시 시도할지 정한다.
+
+        :param status: 실행 결과 `CommandStatus`
+        :param elapsed_ns: 실행에 걸린 시간
+        :return: 다시 시도하면 `(이유, 기다릴 시간)`, 아니면 `(None, 0.0)`
+        """
+        reason = self.classify(status)
+        with self._lock:
+            counters = self.counters
+            counters['attempts'] += 1
+            if status.ok:
+                self._observe(key, elapsed_ns)
+            if reason is None:
+                counters['commands'] += 1
+                if status.ok:
+                    counters['recovered' if attempt else 'succeeded'] += 1
+                else:
+                    counters['failed'] += 1
+                return None, 0.0
+            self.reasons[reason] += 1
+            if attempt >= self.max_retries:
+                counters['commands'] += 1
+                counters['exhausted'] += 1
+                return None, 0.0
+            counters['retries'] += 1
+        return reason, self.delay(reason, attempt)
+
+    def snapshot(self) -> dict:
+        """
+        counter 와 학습한 timeout 을 dict 로 복사한다.
+        """
+        with self._lock:
+            timeouts = {}
+            for (op, sa), timeout in sorted(self._timeouts.items(),
+                                            key=lambda kv: (kv[0][0], kv[0][1] or 0)):
+                label = "{:#04x}".format(op) if sa is None else \
+                        "{:#04x}/{:#04x}".format(op, sa)
+                timeouts[label] = timeout
+            return {
+                'counters': dict(self.counters),
+                'reasons': dict((r.value, n) for r, n in self.reasons.items()),
+                'timeouts': timeouts,
+            }
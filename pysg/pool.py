@@ -0,0 +1,240 @@
+from . import _pysg, Buffer
+from ._common import aligned_new
+from typing import Optional, Dict
+import mmap
+import threading
+import time
+import weakref
+
+# pool 이 나눠주는 buffer 의 정렬 단위
+PAGE_SIZE = mmap.PAGESIZE
+
+
+class _Slab(object):
+    __slots__ = ('mem', 'view', 'size_class', 'stride', 'free', 'used', 'last_used')
+
+    def __init__(self, size: int, size_class: int, stride: int):
+        self.mem = aligned_new('unsigned char[{}]'.format(size))
+        self.view = memoryview(_pysg.ffi.buffer(self.mem))
+        self.size_class = size_class
+        self.stride = stride
+        self.free = list(range(size - stride, -1, -stride))
+        self.used = 0
+        self.last_used = time.monotonic()
+
+    def __len__(self):
+        return len(self.view)
+
+
+class PooledBuffer(Buffer):
+    """
+    `BufferPool` 에서 얻은 `Buffer`
+
+    사용이 끝나면 `release()` 로 pool 에 돌려보내야 하며, 돌려보낸 뒤에는
+    다른 command 에서 같은 메모리를 사용하므로 더 이상 접근하면 안 된다.
+    `release()` 하지 않고 버린 buffer 는 GC 될 때 pool 로 돌아간다.
+
+    `transient` 이면 이 buffer 로 실행한 `PTObject` 를 `release()` 할 때
+    함께 돌려보낸다.
+    """
+
+    def __init__(self, pool: Optional['BufferPool'], slab: Optional[_Slab],
+                 offset: int, size: int, transient: bool=False):
+        self._slab = slab
+        self._offset = offset
+        self.transient = transient
+        if slab is None:
+            self._ptr = aligned_new('unsigned char[{}]'.format(size))
+            self._finalizer = None
+        else:
+            self._ptr = _pysg.ffi.from_buffer(
+                    'unsigned char[]', slab.view[offset:offset + size], True)
+            self._finalizer = weakref.finalize(self, pool._free, slab, offset)
+            self._finalizer.atexit = False
+
+    def release(self):
+        # finalizer 는 한 번만 실행되므로 여러 번 호출해도 된다.
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, tb):
+        self.release()
+
+
+class BufferPool(object):
+    """
+    크기별로 나뉜 slab 에서 정렬된 `Buffer` 를 나눠주는 pool
+
+    요청된 크기는 2의 거듭제곱인 size class 로 올림되며, 같은 size class 의
+    buffer 들은 미리 할당된 slab 을 잘라 사용한다. 모든 buffer 는 page 단위로
+    정렬되도록 page 보다 작은 size class 도 slab 에서 page 하나를 차지한다.
+    `max_class` 보다 큰 요청이나 `max_bytes` 를 넘어서는 요청은 pool 을 거치지
+    않고 따로 할당한다.
+    """
+
+    def __init__(self,
+                 min_class: int=512,
+                 max_class: int=16 << 20,
+                 slab_size: int=1 << 20,
+                 max_bytes: int=256 << 20):
+        """
+        :param min_class: 가장 작은 size class
+        :type min_class: int
+        :param max_class: 가장 큰 size class
+        :type max_class: int
+        :param slab_size: slab 하나의 크기. size class 가 더 크면 size class
+                          크기의 slab 을 사용한다.
+        :type slab_size: int
+        :param max_bytes: slab 들이 차지할 수 있는 최대 메모리
+        :type max_bytes: int
+        """
+        if min_class & (min_class - 1) or max_class & (max_class - 1):
+            raise ValueError("Size classes must be powers of two")
+        self.min_class = min_class
+        self.max_class = max_class
+        self.slab_size = slab_size
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._partial = {}
+        self._slabs = []
+        self._footprint = 0
+        self._in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def size_class(self, size: int) -> int:
+        """
+        `size` 가 속하는 size class. pool 에서 처리하지 않는 크기면 0
+        """
+        if size > self.max_class:
+            return 0
+        if size <= self.min_class:
+            return self.min_class
+        return 1 << (size - 1).bit_length()
+
+    def acquire(self, size: int, transient: bool=False) -> PooledBuffer:
+        """
+        `size` byte 짜리 buffer 를 얻는다.
+
+        :param size: buffer 크기
+        :type size: int
+        :param transient: command 객체와 함께 돌려보낼 buffer 인 경우 True
+        :type transient: bool
+        :rtype: PooledBuffer
+        """
+        size_class = self.size_class(size)
+        if not size_class:
+            with self._lock:
+                self.misses += 1
+            return PooledBuffer(None, None, 0, size, transient)
+
+        with self._lock:
+            partial = self._partial.setdefault(size_class, [])
+            if partial:
+                slab = partial[-1]
+                self.hits += 1
+            else:
+                slab = self._grow(size_class)
+                self.misses += 1
+                if slab is None:
+                    return PooledBuffer(None, None, 0, size, transient)
+                partial.append(slab)
+
+            offset = slab.free.pop()
+            if not slab.free:
+                partial.pop()
+            slab.used += 1
+            self._in_use += slab.stride
+        return PooledBuffer(self, slab, offset, size, transient)
+
+    def release(self, buf: PooledBuffer):
+        """
+        `acquire()` 로 얻은 buffer 를 돌려보낸다. `buf.release()` 와 같다.
+        """
+        buf.release()
+
+    def _free(self, slab: _Slab, offset: int):
+        with self._lock:
+            if not slab.free:
+                self._partial.setdefault(slab.size_class, []).append(slab)
+            slab.free.append(offset)
+            slab.used -= 1
+            slab.last_used = time.monotonic()
+            self._in_use -= slab.stride
+            if self._footprint > self.max_bytes:
+                self._evict(self._footprint - self.max_bytes)
+
+    def _grow(self, size_class: int) -> Optional[_Slab]:
+        stride = max(size_class, PAGE_SIZE)
+        size = max(self.slab_size // stride, 1) * stride
+        if size > self.max_bytes:
+            return None
+        if self._footprint + size > self.max_bytes:
+            self._evict(self._footprint + size - self.max_bytes)
+            if self._footprint + size > self.max_bytes:
+                return None
+        slab = _Slab(size, size_class, stride)
+        self._slabs.append(slab)
+        self._footprint += size
+        return slab
+
+    def _evict(self, need: int):
+        # 사용 중인 buffer 가 없는 slab 을 오래된 순서대로 해제한다.
+        idle = sorted((s for s in self._slabs if not s.used),
+                      key=lambda s: s.last_used)
+        for slab in idle:
+            if need <= 0:
+                break
+            self._drop(slab)
+            need -= len(slab)
+            self.evictions += 1
+
+    def _drop(self, slab: _Slab):
+        self._slabs.remove(slab)
+        partial = self._partial.get(slab.size_class)
+        if partial and slab in partial:
+            partial.remove(slab)
+        self._footprint -= len(slab)
+
+    def trim(self, max_idle: float=0.0):
+        """
+        `max_idle` 초 이상 사용되지 않은 빈 slab 들을 해제한다.
+        """
+        deadline = time.monotonic() - max_idle
+        with self._lock:
+            for slab in [s for s in self._slabs
+                         if not s.used and s.last_used <= deadline]:
+                self._drop(slab)
+                self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def footprint(self) -> int:
+        """
+        slab 들이 차지하고 있는 메모리 (byte)
+        """
+        return self._footprint
+
+    def stats(self) -> Dict[str, float]:
+        """
+        hit rate 와 메모리 사용량 통계
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'evictions': self.evictions,
+                'slabs': len(self._slabs),
+                'footprint': self._footprint,
+                'in_use': self._in_use,
+            }
@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Dict
+
+
+class _Stage(object):
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+class CommandProfiler(object):
+    """
+    `BareDevice.command()` 의 단계별 소요 시간을 `perf_counter_ns()` 로 모은다.
+
+    기록되는 단계는 다음과 같다.
+
+    * `init`: `PTObject` 생성 또는 pool 에서 재설정
+    * `ioctl`: `do_scsi_pt()` 호출과 data flush
+    * `process_resp`: `sg_cmds_process_resp()`. quiet 모드에서는 없다.
+    * `decode`: 결과 분류와 예외 생성
+    * `total`: `command()` 전체
+    * `kernel`: `duration_ms` 로 보고된 장치 처리 시간
+
+    `measure()` 로 `Command` 생성처럼 `command()` 밖의 코드도 같은 표에
+    기록할 수 있다. 여러 thread 에서 동시에 사용하지 않는다고 가정한다.
+
+        prof = dev.enable_profiler()
+        for lba in range(0, 1 << 20, 8):
+            with prof.measure('command'):
+                cmd = Read16(...)
+            dev.command(cmd, data_in=buf)
+        print(prof.report())
+    """
+
+    order = ('command', 'init', 'ioctl', 'process_resp', 'decode')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._stages = {}
+        self.commands = 0
+        self.total_ns = 0
+        self.kernel_ns = 0
+
+    def add(self, stage: str, elapsed_ns: int):
+        st = self._stages.get(stage)
+        if st is None:
+            st = self._stages[stage] = _Stage()
+        st.count += 1
+        st.total += elapsed_ns
+        if elapsed_ns > st.max:
+            st.max = elapsed_ns
+
+    def finish(self, total_ns: int, duration_ms: int):
+        """
+        command 하나가 끝났음을 기록한다. `duration_ms` 는 올림된 값일 수
+        있으므로 `total_ns` 를 넘지 않게 자른다.
+        """
+        self.commands += 1
+        self.total_ns += total_ns
+        self.kernel_ns += min(duration_ms * 1000000, total_ns)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        with 문 안의 코드에 걸린 시간을 `stage` 로 기록한다.
+        """
+        start = perf_counter_ns()
+        try:
+            yield self
+        finally:
+            self.add(stage, perf_counter_ns() - start)
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        단계별 `count`, `total_ns`, `mean_ns`, `max_ns`.
+
+        `python_ns` 는 `command()` 전체 시간에서 장치 처리 시간 (`kernel`) 을
+        뺀 값이다. `duration_ms` 는 millisecond 단위이므로 짧은 command 가
+        많을 때는 `ioctl` 단계의 시간과 비교하는 편이 정확하다.
+        """
+        stats = {}
+        for name, st in self._stages.items():
+            stats[name] = {
+                'count': st.count,
+                'total_ns': st.total,
+                'mean_ns': st.total / st.count if st.count else 0,
+                'max_ns': st.max,
+            }
+        stats['total'] = {
+            'count': self.commands,
+            'total_ns': self.total_ns,
+            'mean_ns': self.total_ns / self.commands if self.commands else 0,
+            'kernel_ns': self.kernel_ns,
+            'python_ns': self.total_ns - self.kernel_ns,
+        }
+        return stats
+
+    def report(self) -> str:
+        stats = self.stats()
+        total = self.total_ns + stats.get('command', {}).get('total_ns', 0)
+        names = [n for n in self.order if n in stats]
+        names += sorted(n for n in stats if n not in self.order and n != 'total')
+
+        lines = ["{:16s} {:>10s} {:>12s} {:>10s} {:>10s} {:>7s}".format(
+                 'stage', 'count', 'total ms', 'mean us', 'max us', 'share')]
+        for name in names:
+            st = stats[name]
+            lines.append("{:16s} {:10d} {:12.3f} {:10.2f} {:10.2f} {:6.1f}%".format(
+                name, st['count'], st['total_ns'] / 1e6, st['mean_ns'] / 1e3,
+                st['max_ns'] / 1e3, st['total_ns'] * 100 / total if total else 0))
+
+        st = stats['total']
+        lines.append("{:16s} {:10d} {:12.3f} {:10.2f}".format(
+            'command()', st['count'], st['total_ns'] / 1e6, st['mean_ns'] / 1e3))
+        if self.commands:
+            lines.append("kernel (duration_ms) {:8.3f} ms, python overhead {:8.3f} ms"
+                         " ({:.2f} us/command)".format(
+                             st['kernel_ns'] / 1e6, st['python_ns'] / 1e6,
+                             st['python_ns'] / self.commands / 1e3))
+        return '\n'.join(lines)
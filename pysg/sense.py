@@ -1,8 +1,8 @@
 from . import sg_lib, Buffer
 from .enum import SenseKeyCodes
-from ._common import HexValueEnum
+from ._common import HexValueEnum, DescriptionCache
 from collections import namedtuple
-from typing import Union
+from typing import Union, Optional, Iterator, Tuple
 import enum
 
 
@@ -76,76 +76,394 @@ class SenseDescriptor(bytes):
         return self.to_str()
 
 
+_asc_ascq_cache = DescriptionCache()
+
+
+def _get_asc_ascq_str(asc: int, ascq: int) -> str:
+    buf = sg_lib.ffi.new('char[128]')
+    sg_lib.lib.sg_get_asc_ascq_str(asc, ascq, 128, buf)
+    return sg_lib.ffi.string(buf).decode('utf-8')
+
+
+def asc_ascq_str(asc: int, ascq: int) -> str:
+    """
+    ASC/ASCQ 에 대한 설명. 한 번 구한 설명은 memoize 된다.
+    """
+    return _asc_ascq_cache.get((asc, ascq), _get_asc_ascq_str, asc, ascq)
+
+
+def _iter_descriptors(sb: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    descriptor 형식 sense 의 descriptor 들을 앞에서부터 한 번 훑는다.
+    `sg_scsi_sense_desc_find()` 와 같은 규칙을 따른다.
+
+    :return: `(type, offset, length)` 의 iterator. length 는 header 를 포함한다.
+    """
+    sb_len = len(sb)
+    if sb_len < 8 or not sb[7] or sb[0] not in (0x72, 0x73):
+        return
+    end = 8 + min(sb[7], sb_len - 8)
+    pos = 8
+    while pos < end:
+        if pos + 1 >= end:
+            # 길이 byte 가 없는 짧은 descriptor
+            yield sb[pos], pos, 1
+            return
+        desc_len = sb[pos + 1] + 2
+        yield sb[pos], pos, min(desc_len, sb_len - pos)
+        pos += desc_len
+
+
+class DescriptorView(object):
+    """
+    sense buffer 안의 descriptor 하나를 복사하지 않고 가리키는 view
+
+    `raw` 는 header (type, additional length) 를 포함한 memoryview 이다.
+    sense buffer 를 다시 사용하면 내용도 같이 바뀐다.
+    """
+    __slots__ = ('type', 'raw')
+
+    def __init__(self, desc_type: Union[int, DescriptorTypes], raw: memoryview):
+        self.type = desc_type
+        self.raw = raw
+
+    def __repr__(self):
+        return "<{}.{}: {} ({})>".format(self.__class__.__module__,
+                                         self.__class__.__name__,
+                                         str(self.type), self.raw.hex(' '))
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def additional_length(self) -> int:
+        return self.raw[1] if len(self.raw) > 1 else 0
+
+    def _be(self, start: int, end: int) -> int:
+        return int.from_bytes(self.raw[start:end], 'big')
+
+    def to_descriptor(self) -> SenseDescriptor:
+        """
+        내용을 복사한 `SenseDescriptor`
+        """
+        return SenseDescriptor(self.raw)
+
+
+class InformationDescriptor(DescriptorView):
+    __slots__ = ()
+
+    @property
+    def valid(self) -> bool:
+        return bool(self.raw[2] & 0x80)
+
+    @property
+    def information(self) -> int:
+        return self._be(4, 12)
+
+
+class CommandSpecificDescriptor(DescriptorView):
+    __slots__ = ()
+
+    @property
+    def information(self) -> int:
+        return self._be(4, 12)
+
+
+class SenseKeySpecificDescriptor(DescriptorView):
+    __slots__ = ()
+
+    @property
+    def sksv(self) -> bool:
+        return bool(self.raw[4] & 0x80)
+
+    @property
+    def sense_key_specific(self) -> int:
+        """
+        SKSV 를 제외한 sense key specific 필드 (23 bit)
+        """
+        return self._be(4, 7) & 0x7fffff
+
+    @property
+    def progress(self) -> Optional[float]:
+        """
+        NO SENSE / NOT READY 인 경우의 progress indication
+        """
+        if not self.sksv:
+            return None
+        return self._be(5, 7) / 65536
+
+    @property
+    def field_pointer(self) -> int:
+        """
+        ILLEGAL REQUEST 인 경우 잘못된 필드의 위치
+        """
+        return self._be(5, 7)
+
+
+class ATAReturnDescriptor(DescriptorView):
+    __slots__ = ()
+
+    @property
+    def extend(self) -> bool:
+        return bool(self.raw[2] & 0x01)
+
+    @property
+    def error(self) -> int:
+        return self.raw[3]
+
+    @property
+    def count(self) -> int:
+        return self._be(4, 6)
+
+    @property
+    def lba(self) -> int:
+        raw = self.raw
+        return (raw[7] | raw[9] << 8 | raw[11] << 16 |
+                raw[6] << 24 | raw[8] << 32 | raw[10] << 40)
+
+    @property
+    def device(self) -> int:
+        return self.raw[12]
+
+    @property
+    def status(self) -> int:
+        return self.raw[13]
+
+
+# descriptor 종류와 정상적인 길이 (header 포함). 길이가 다르면 해석하지 않고
+# `DescriptorView` 로 돌려준다.
+_descriptor_views = {
+    DescriptorTypes.Information: (InformationDescriptor, 12),
+    DescriptorTypes.CommandSpecificInformation: (CommandSpecificDescriptor, 12),
+    DescriptorTypes.SenseKeySpecific: (SenseKeySpecificDescriptor, 8),
+    DescriptorTypes.ATAReturn: (ATAReturnDescriptor, 14),
+}
+_descriptor_types = dict((t.value, t) for t in DescriptorTypes)
+
+
+class SenseRecord(object):
+    """
+    sense buffer 를 한 번 해석한 결과
+
+    `Sense` 의 property 들은 모두 이 객체의 값을 사용한다. `information` 과
+    `progress` 는 해당 값이 유효하지 않으면 None 이다.
+    """
+    __slots__ = ('response_code', 'descriptor_format', 'deferred',
+                 'sense_key', 'asc', 'ascq', 'byte4', 'byte5', 'byte6',
+                 'additional_length', 'information', 'filemark', 'eom', 'ili',
+                 'progress')
+
+    def __repr__(self):
+        return "<{}.{}: {} {:#04x}/{:#04x}>".format(self.__class__.__module__,
+                                                    self.__class__.__name__,
+                                                    str(self.sense_key),
+                                                    self.asc, self.ascq)
+
+    @property
+    def header(self) -> SenseHeader:
+        return SenseHeader(self.response_code, self.sense_key, self.asc,
+                           self.ascq, self.byte4, self.byte5, self.byte6,
+                           self.additional_length)
+
+
+_sense_keys = dict((sk.value, sk) for sk in SenseKeyCodes)
+
+
+def decode_sense(sb: bytes) -> Optional[SenseRecord]:
+    """
+    fixed 또는 descriptor 형식의 sense 를 해석한다. sg_lib 의
+    `sg_scsi_normalize_sense()`, `sg_get_sense_info_fld()`,
+    `sg_get_sense_filemark_eom_ili()`, `sg_get_sense_progress_fld()` 와 같은
+    결과를 한 번에 구한다.
+
+    :param sb: sense data
+    :type sb: bytes
+    :return: 올바른 sense 가 아니면 None
+    :rtype: Optional[SenseRecord]
+    """
+    sb_len = len(sb)
+    # sg_scsi_normalize_sense() 와 같이 response code 0x70 ~ 0x73 만 받는다.
+    if sb_len == 0 or not 0x70 <= (sb[0] & 0x7f) <= 0x73:
+        return None
+
+    rec = SenseRecord()
+    rc = sb[0] & 0x7f
+    rec.response_code = rc
+    rec.descriptor_format = rc >= 0x72
+    rec.deferred = rc in (0x71, 0x73)
+    rec.byte4 = rec.byte5 = rec.byte6 = 0
+    rec.additional_length = 0
+    rec.information = None
+    rec.filemark = rec.eom = rec.ili = False
+    rec.progress = None
+    # sg_scsi_normalize_sense() 와 같이 sense key 가 없는 짧은 sense 는 0 이다.
+    sk = 0
+
+    if rec.descriptor_format:
+        if rc in (0x72, 0x73) and sb_len > 1:
+            sk = sb[1] & 0xf
+        rec.asc = sb[2] if sb_len > 2 else 0
+        rec.ascq = sb[3] if sb_len > 3 else 0
+        if sb_len > 7:
+            rec.byte4, rec.byte5, rec.byte6 = sb[4], sb[5], sb[6]
+            rec.additional_length = sb[7]
+        sks_progress = None
+        for desc_type, pos, length in _iter_descriptors(sb):
+            add_len = sb[pos + 1] if length > 1 else -1
+            if desc_type == 0x00:
+                if add_len == 0x0a and length >= 12 and rec.information is None \
+                        and sb[pos + 2] & 0x80:
+                    rec.information = int.from_bytes(sb[pos + 4:pos + 12], 'big')
+            elif desc_type == 0x02:
+                if sks_progress is None and add_len == 6 and length >= 8 and \
+                        sb[pos + 4] & 0x80:
+                    sks_progress = int.from_bytes(sb[pos + 5:pos + 7], 'big')
+            elif desc_type == 0x04:
+                if add_len >= 2 and length >= 4 and sb[pos + 3] & 0xe0 and \
+                        not (rec.filemark or rec.eom or rec.ili):
+                    rec.filemark = bool(sb[pos + 3] & 0x80)
+                    rec.eom = bool(sb[pos + 3] & 0x40)
+                    rec.ili = bool(sb[pos + 3] & 0x20)
+            elif desc_type == 0x05:
+                if add_len >= 2 and length >= 4 and sb[pos + 3] & 0x20:
+                    rec.ili = True
+            elif desc_type == 0x0a:
+                if rec.progress is None and add_len == 6 and length >= 8:
+                    rec.progress = int.from_bytes(sb[pos + 6:pos + 8], 'big')
+        # sense key specific descriptor 의 progress 가 우선한다.
+        if sks_progress is not None and sk in (0x00, 0x02):
+            rec.progress = sks_progress
+    else:
+        if rc in (0x70, 0x71) and sb_len > 2:
+            sk = sb[2] & 0xf
+        rec.asc = rec.ascq = 0
+        if sb_len > 7:
+            rec.additional_length = sb[7]
+            valid_len = min(sb_len, sb[7] + 8)
+            if valid_len > 12:
+                rec.asc = sb[12]
+            if valid_len > 13:
+                rec.ascq = sb[13]
+        if rc in (0x70, 0x71):
+            if sb_len >= 7 and sb[0] & 0x80:
+                rec.information = int.from_bytes(sb[3:7], 'big')
+            if sb_len > 2:
+                rec.filemark = bool(sb[2] & 0x80)
+                rec.eom = bool(sb[2] & 0x40)
+                rec.ili = bool(sb[2] & 0x20)
+            if sb_len >= 18 and sk in (0x00, 0x02) and sb[15] & 0x80:
+                rec.progress = int.from_bytes(sb[16:18], 'big')
+
+    rec.sense_key = _sense_keys.get(sk, sk)
+    return rec
+
+
+# `Sense._record` 가 아직 해석되지 않았음을 나타낸다.
+_NOT_DECODED = object()
+
+
 class Sense(Buffer):
     """
     SCSI Sense buffer에 관련된 기능들을 구현한 클래스
+
+    sense 는 처음 필요할 때 한 번 해석되어 `record` 에 보관된다. buffer 를
+    다시 사용하는 경우 `invalidate()` 를 호출해야 한다.
     """
 
+    _record = _NOT_DECODED
+
+    @property
+    def record(self) -> Optional[SenseRecord]:
+        """
+        해석된 sense. 올바른 sense 가 아니면 None
+        """
+        rec = self._record
+        if rec is _NOT_DECODED:
+            rec = self._record = decode_sense(self.buffer[:])
+        return rec
+
+    def invalidate(self):
+        """
+        buffer 의 내용이 바뀌었으므로 해석된 결과를 버린다.
+        """
+        self._record = _NOT_DECODED
+
     def normalize(self) -> SenseHeader:
-        header = sg_lib.ffi.new('struct sg_scsi_sense_hdr *')
-        if sg_lib.lib.sg_scsi_normalize_sense(self.ptr, len(self.ptr), header) == 0:
+        rec = self.record
+        if rec is None:
             return None
-        hdr = SenseHeader(*iter(getattr(header, k) for k in SenseHeader._fields))
-        return hdr
+        return rec.header
+
+    def descriptors(self) -> Iterator[DescriptorView]:
+        """
+        descriptor 목록을 한 번 훑으면서 각 descriptor 의 view 를 만든다.
+        Information, Command specific information, Sense key specific,
+        ATA Return descriptor 는 필드를 해석하는 하위 클래스로 만들어진다.
+
+            descs = dict((d.type, d) for d in sense.descriptors())
+
+        :rtype: Iterator[DescriptorView]
+        """
+        sb = memoryview(self.buffer)
+        for desc_type, pos, length in _iter_descriptors(sb):
+            desc_type = _descriptor_types.get(desc_type, desc_type)
+            cls, size = _descriptor_views.get(desc_type, (DescriptorView, 0))
+            if length != size:
+                cls = DescriptorView
+            yield cls(desc_type, sb[pos:pos + length])
 
     def descriptor(self, desc_type: Union[int, DescriptorTypes]) -> SenseDescriptor:
-        desc = sg_lib.lib.sg_scsi_sense_desc_find(self.ptr, len(self.ptr), desc_type)
-        if desc == sg_lib.ffi.NULL:
-            return None
-        desc_len = sg_lib.ffi.cast('uint8_t *', desc)[1] + 2
-        return SenseDescriptor(sg_lib.ffi.buffer(desc, desc_len))
+        for desc in self.descriptors():
+            if desc.type == desc_type:
+                return desc.to_descriptor()
+        return None
 
     @property
     def sense_key(self) -> Union[int, SenseKeyCodes]:
-        sk = sg_lib.lib.sg_get_sense_key(self.ptr, len(self.ptr))
-        try:
-            return SenseKeyCodes(sk)
-        except ValueError:
-            return sk
+        rec = self.record
+        # sg_get_sense_key() 와 같이 sense key byte 가 없으면 -1 이다.
+        if rec is None or len(self.buffer) <= (1 if rec.descriptor_format else 2):
+            return -1
+        return rec.sense_key
 
     @property
     def asc_ascq_desc(self) -> str:
-        h = self.normalize()
-        buf = sg_lib.ffi.new('char[128]')
-        sg_lib.lib.sg_get_asc_ascq_str(h.asc, h.ascq, 128, buf)
-        return sg_lib.ffi.string(buf).decode('utf-8')
+        rec = self.record
+        if rec is None:
+            return None
+        return asc_ascq_str(rec.asc, rec.ascq)
+
+    @property
+    def information(self) -> Optional[int]:
+        rec = self.record
+        return None if rec is None else rec.information
 
     @property
     def filemark_eom_ili(self) -> bool:
-        return sg_lib.lib.sg_get_sense_filemark_eom_ili(
-                self.ptr, len(self.ptr),
-                sg_lib.ffi.NULL, sg_lib.ffi.NULL, sg_lib.ffi.NULL) != 0
+        rec = self.record
+        return rec is not None and (rec.filemark or rec.eom or rec.ili)
 
     @property
     def filemark(self) -> bool:
-        v = sg_lib.ffi.new('int *')
-        sg_lib.lib.sg_get_sense_filemark_eom_ili(
-                self.ptr, len(self.ptr),
-                v, sg_lib.ffi.NULL, sg_lib.ffi.NULL)
-        return v[0] != 0
+        rec = self.record
+        return rec is not None and rec.filemark
 
     @property
     def eom(self) -> bool:
-        v = sg_lib.ffi.new('int *')
-        sg_lib.lib.sg_get_sense_filemark_eom_ili(
-                self.ptr, len(self.ptr),
-                sg_lib.ffi.NULL, v, sg_lib.ffi.NULL)
-        return v[0] != 0
+        rec = self.record
+        return rec is not None and rec.eom
 
     @property
     def ili(self) -> bool:
-        v = sg_lib.ffi.new('int *')
-        sg_lib.lib.sg_get_sense_filemark_eom_ili(
-                self.ptr, len(self.ptr),
-                sg_lib.ffi.NULL, sg_lib.ffi.NULL, v)
-        return v[0] != 0
+        rec = self.record
+        return rec is not None and rec.ili
 
     @property
     def progress(self) -> float:
-        v = sg_lib.ffi.new('int *')
-        if sg_lib.lib.sg_get_sense_progress_fld(self.ptr, len(self.ptr), v) == 0:
+        rec = self.record
+        if rec is None or rec.progress is None:
             return None
-        return v[0] / 65536
+        return rec.progress / 65536
 
     def to_str(self, leadin=''):
         buf = sg_lib.ffi.new('char[2048]')
@@ -159,4 +477,3 @@ class Sense(Buffer):
     @property
     def err_category(self):
         return sg_lib.lib.sg_get_category_sense_str(self.ptr, len(self.ptr))
-
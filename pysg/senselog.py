@@ -0,0 +1,225 @@
+from .sense import Sense, asc_ascq_str
+from .enum import SenseKeyCodes
+from collections import namedtuple
+from typing import Dict, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+SenseLogEntry = namedtuple('SenseLogEntry',
+        ['sense_key', 'asc', 'ascq', 'count', 'description'])
+
+
+class SenseLog(object):
+    """
+    같은 크기로 저장된 sense buffer 여러 개를 NumPy 로 한꺼번에 해석한 결과
+
+    `pysg.sense.decode_sense()` 와 같은 규칙으로 해석하며, 결과는 항목마다
+    객체를 만들지 않고 column 배열로 보관된다.
+
+    * `valid`: 올바른 sense 인지 여부
+    * `response_code`, `asc`, `ascq`: `uint8`
+    * `sense_key`: `int8`. `sg_scsi_normalize_sense()` 와 같이 없으면 0
+    * `information`: `uint64`. 유효한 경우에만 `info_valid` 가 True
+    * `progress`: `int32`. progress indication 이 없으면 -1
+
+        log = SenseLog.from_file('sense.bin', stride=32)
+        for entry in log.histogram():
+            print(entry.count, entry.sense_key, entry.description)
+    """
+
+    def __init__(self, data, stride: Optional[int]=None):
+        """
+        :param data: sense buffer 들이 연속해서 저장된 buffer protocol 객체 또는
+                     `(N, stride)` 모양의 배열
+        :param stride: sense buffer 하나의 크기. 2 차원 배열이면 생략할 수 있다.
+        :type stride: Optional[int]
+        """
+        if np is None:
+            raise ImportError("SenseLog requires NumPy")
+
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            raw = data.view(np.uint8)
+            if stride is not None and stride != raw.shape[1]:
+                raise ValueError("stride does not match the array shape")
+        else:
+            if stride is None:
+                raise ValueError("stride is required for flat buffers")
+            raw = np.frombuffer(memoryview(data).cast('B'), dtype=np.uint8)
+            raw = raw[:len(raw) // stride * stride].reshape(-1, stride)
+        self.raw = raw
+        self._decode()
+
+    @classmethod
+    def from_file(cls, path: str, stride: int, offset: int=0) -> 'SenseLog':
+        """
+        sense buffer 가 `stride` byte 씩 기록된 파일을 mmap 으로 읽는다.
+        파일 끝의 불완전한 항목은 무시한다.
+        """
+        if np is None:
+            raise ImportError("SenseLog requires NumPy")
+        raw = np.memmap(path, dtype=np.uint8, mode='r', offset=offset)
+        return cls(raw[:len(raw) // stride * stride].reshape(-1, stride))
+
+    def __len__(self):
+        return self.raw.shape[0]
+
+    def _column(self, idx: int) -> 'np.ndarray':
+        if idx < self.raw.shape[1]:
+            return self.raw[:, idx]
+        return np.zeros(len(self), dtype=np.uint8)
+
+    def _gather(self, rows: 'np.ndarray', pos: 'np.ndarray', width: int):
+        # 행마다 다른 위치 `pos` 에서 `width` byte 씩 읽는다. buffer 를
+        # 넘어가는 부분은 0 으로 채우고, 모두 읽을 수 있었는지도 돌려준다.
+        stride = self.raw.shape[1]
+        cols = pos[:, None] + np.arange(width)
+        inside = cols < stride
+        out = self.raw[rows[:, None], np.minimum(cols, stride - 1)]
+        return np.where(inside, out, 0), inside.all(axis=1)
+
+    @staticmethod
+    def _be(octets: 'np.ndarray') -> 'np.ndarray':
+        val = np.zeros(octets.shape[0], dtype=np.uint64)
+        for k in range(octets.shape[1]):
+            val = (val << np.uint64(8)) | octets[:, k].astype(np.uint64)
+        return val
+
+    def _decode(self):
+        n = len(self)
+        stride = self.raw.shape[1]
+        b0 = self._column(0)
+        add_len = self._column(7)
+
+        self.response_code = b0 & 0x7f
+        rc = self.response_code
+        # sg_scsi_normalize_sense() 와 같이 response code 0x70 ~ 0x73 만 받는다.
+        self.valid = (rc >= 0x70) & (rc <= 0x73) if stride else np.zeros(n, dtype=bool)
+        desc = self.valid & (rc >= 0x72)
+        fixed = self.valid & ~desc
+
+        sk = np.zeros(n, dtype=np.int8)
+        fixed_sk = fixed & ((rc == 0x70) | (rc == 0x71)) & (stride > 2)
+        sk[fixed_sk] = self._column(2)[fixed_sk] & 0xf
+        desc_sk = desc & ((rc == 0x72) | (rc == 0x73)) & (stride > 1)
+        sk[desc_sk] = self._column(1)[desc_sk] & 0xf
+        self.sense_key = sk
+
+        # fixed 형식의 ASC/ASCQ 는 additional length 안에 있을 때만 유효하다.
+        valid_len = np.where(stride > 7, np.minimum(stride, add_len.astype(np.int32) + 8),
+                             stride)
+        self.asc = np.where(desc, self._column(2),
+                            np.where(fixed & (valid_len > 12), self._column(12), 0)).astype(np.uint8)
+        self.ascq = np.where(desc, self._column(3),
+                             np.where(fixed & (valid_len > 13), self._column(13), 0)).astype(np.uint8)
+
+        fixed_fmt = fixed & ((rc == 0x70) | (rc == 0x71))
+        self.information = np.zeros(n, dtype=np.uint64)
+        self.info_valid = fixed_fmt & ((b0 & 0x80) != 0) & (stride >= 7)
+        if stride >= 7:
+            self.information[self.info_valid] = self._be(
+                    self.raw[self.info_valid, 3:7])
+
+        self.progress = np.full(n, -1, dtype=np.int32)
+        if stride >= 18:
+            prog = fixed_fmt & ((sk == 0) | (sk == 2)) & ((self._column(15) & 0x80) != 0)
+            self.progress[prog] = self._be(self.raw[prog, 16:18]).astype(np.int32)
+
+        self._decode_descriptors(desc & ((rc == 0x72) | (rc == 0x73)) & (add_len > 0))
+
+    def _decode_descriptors(self, rows_mask: 'np.ndarray'):
+        # 모든 행의 descriptor 를 동시에 하나씩 훑는다. 반복 횟수는
+        # 행 하나에 들어있는 descriptor 수의 최댓값이다.
+        stride = self.raw.shape[1]
+        if stride <= 8:
+            return
+        rows = np.flatnonzero(rows_mask)
+        pos = np.full(len(rows), 8, dtype=np.int64)
+        end = 8 + np.minimum(self.raw[rows, 7].astype(np.int64), stride - 8)
+        sks = np.full(len(self), -1, dtype=np.int32)
+        while len(rows):
+            head, _ = self._gather(rows, pos, 2)
+            dtype_ = head[:, 0]
+            short = pos + 1 >= end
+            dlen = head[:, 1].astype(np.int64)
+
+            info = (dtype_ == 0x00) & ~short & (dlen == 0x0a)
+            info &= ~self.info_valid[rows]
+            if info.any():
+                body, ok = self._gather(rows[info], pos[info], 12)
+                ok &= (body[:, 2] & 0x80) != 0
+                target = rows[info][ok]
+                self.information[target] = self._be(body[ok, 4:12])
+                self.info_valid[target] = True
+
+            key = (dtype_ == 0x02) & ~short & (dlen == 6)
+            key &= sks[rows] < 0
+            if key.any():
+                body, ok = self._gather(rows[key], pos[key], 8)
+                ok &= (body[:, 4] & 0x80) != 0
+                sks[rows[key][ok]] = self._be(body[ok, 5:7]).astype(np.int32)
+
+            prog = (dtype_ == 0x0a) & ~short & (dlen == 6)
+            prog &= self.progress[rows] < 0
+            if prog.any():
+                body, ok = self._gather(rows[prog], pos[prog], 8)
+                self.progress[rows[prog][ok]] = self._be(body[ok, 6:8]).astype(np.int32)
+
+            pos = pos + dlen + 2
+            more = ~short & (pos < end)
+            rows, pos, end = rows[more], pos[more], end[more]
+
+        # sense key specific descriptor 의 progress 가 우선한다.
+        use = (sks >= 0) & ((self.sense_key == 0) | (self.sense_key == 2))
+        self.progress[use] = sks[use]
+
+    def sense(self, idx: int) -> Sense:
+        """
+        `idx` 번째 항목을 복사한 `Sense`
+        """
+        return Sense(init=self.raw[idx].tobytes())
+
+    def sense_key_histogram(self) -> Dict[Union[SenseKeyCodes, int], int]:
+        """
+        올바른 sense 들의 sense key 별 개수
+        """
+        keys = self.sense_key[self.valid].astype(np.int64)
+        counts = np.bincount(keys, minlength=16)
+        hist = {}
+        for value in np.flatnonzero(counts):
+            sk = int(value)
+            try:
+                sk = SenseKeyCodes(sk)
+            except ValueError:
+                pass
+            hist[sk] = int(counts[value])
+        return hist
+
+    def histogram(self) -> List[SenseLogEntry]:
+        """
+        (sense key, ASC, ASCQ) 별 개수. 많은 것부터 정렬된다.
+        ASC/ASCQ 설명은 서로 다른 쌍마다 한 번만 구한다.
+
+        :rtype: List[SenseLogEntry]
+        """
+        valid = self.valid
+        keys = (self.sense_key[valid].astype(np.int64) << 16 |
+                self.asc[valid].astype(np.int64) << 8 |
+                self.ascq[valid].astype(np.int64))
+        uniq, counts = np.unique(keys, return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+
+        entries = []
+        for key, count in zip(uniq[order].tolist(), counts[order].tolist()):
+            sk = key >> 16
+            try:
+                sk = SenseKeyCodes(sk)
+            except ValueError:
+                pass
+            asc, ascq = (key >> 8) & 0xff, key & 0xff
+            entries.append(SenseLogEntry(sk, asc, ascq, count,
+                                         asc_ascq_str(asc, ascq)))
+        return entries
@@ -0,0 +1,142 @@
+from . import _pysg
+from .aio import request_buffer, result_category, set_data
+from .device import PTObject, _transferred
+from .enum import DoPTResult, PTResult, StatusCodes
+from .sense import Sense
+import errno
+import fcntl
+import os
+import stat
+import time
+
+# linux/scsi/sg.h
+SG_IO = 0x2285
+
+# linux/major.h 의 SCSI_GENERIC_MAJOR
+_SG_MAJOR = 21
+
+# linux/scsi.h 의 DID_TIME_OUT
+_DID_TIME_OUT = 0x03
+
+# sg_pt_linux 와 같은 기본 timeout (초)
+_DEFAULT_TIMEOUT = 60
+
+
+def is_sg_device(fd: int) -> bool:
+    """
+    `fd` 가 sg 드라이버의 장치 (`/dev/sg*`) 인지 확인한다.
+    """
+    if fd is None or fd < 0:
+        return False
+    try:
+        st = os.fstat(fd)
+    except OSError:
+        return False
+    return stat.S_ISCHR(st.st_mode) and os.major(st.st_rdev) == _SG_MAJOR
+
+
+class SGIOPTObject(PTObject):
+    """
+    sg_pt 대신 `sg_io_hdr_t` 를 직접 만들어 SG_IO ioctl 로 실행하는 `PTObject`
+
+    data 를 list 나 tuple 로 주면 `pysg.aio.IovecArray` 로 만들어
+    `iovec_count` 와 함께 전송하므로, 각 buffer 로 직접 읽고 쓰며 bounce
+    buffer 를 거치지 않는다. sg 장치에서 buffer 의 list 로 실행한 command 는
+    `BareDevice` 가 이 클래스로 만든다.
+
+    결과는 header 에서 읽으며 `sg_cmds_process_resp()` 는 호출하지 않는다.
+    tag, task management, task attribute 는 sg v3 interface 에 없으므로
+    무시된다. sg_pt object 는 만들지 않는다.
+    """
+
+    def _construct(self, sense_size: int):
+        self._objects[id(self)] = self
+        self._pool = None
+        self._obj = None
+        self._sense = Sense(size=sense_size)
+
+    def _clear(self):
+        pass
+
+    def _setup(self, cmd, data_in, data_out, packet_id=None, tag=None,
+               task_management=None, task_attrs=None, flags=None):
+        ffi = _pysg.ffi
+        self._data_in = request_buffer(data_in, True)
+        self._data_out = request_buffer(data_out)
+        self.task_attrs = task_attrs if task_attrs is not None else {}
+        self.cmd = cmd
+        self.packet_id = packet_id
+        self.tag = tag
+        self.task_management = task_management
+
+        hdr = ffi.new('sg_io_hdr_t *')
+        hdr.interface_id = ord('S')
+        hdr.cmd_len = len(cmd)
+        hdr.cmdp = ffi.cast('unsigned char *', cmd._cdb_ptr)
+        hdr.mx_sb_len = len(self._sense)
+        hdr.sbp = self._sense.ptr
+        set_data(hdr, self._data_in, self._data_out)
+        if packet_id is not None:
+            hdr.pack_id = packet_id
+        # SCSI_PT_FLAGS_QUEUE_AT_TAIL/HEAD 는 SG_FLAG_Q_AT_TAIL/HEAD 와 값이 같다.
+        if flags is not None:
+            hdr.flags = int(flags)
+        self._hdr = hdr
+        self._os_err = 0
+
+    def _ioctl(self, fd: int):
+        fcntl.ioctl(fd, SG_IO, _pysg.ffi.buffer(self._hdr))
+
+    def _execute(self, device: 'Device', timeout: int, noisy: bool,
+                 verbose: bool, quiet: bool, profiler=None) -> int:
+        hdr = self._hdr
+        hdr.timeout = int((timeout or _DEFAULT_TIMEOUT) * 1000)
+        start = time.perf_counter_ns()
+        self._os_err = 0
+        try:
+            self._ioctl(device.fileno())
+        except OSError as e:
+            self._os_err = e.errno or errno.EIO
+        self._sense.invalidate()
+        if self._data_in is not None:
+            self._data_in.flush(_transferred(len(self._data_in), hdr.resid))
+        if profiler is not None:
+            profiler.add('ioctl', time.perf_counter_ns() - start)
+        if hdr.host_status == _DID_TIME_OUT:
+            return DoPTResult.TIMEOUT
+        return DoPTResult.START_OK
+
+    @property
+    def sense_size(self) -> int:
+        return self._hdr.sb_len_wr
+
+    @property
+    def result_category(self) -> PTResult:
+        hdr = self._hdr
+        return result_category(hdr.status, hdr.host_status, hdr.driver_status,
+                               self._os_err)
+
+    @property
+    def resid(self) -> int:
+        return self._hdr.resid
+
+    @property
+    def status_response(self) -> StatusCodes:
+        return StatusCodes(self._hdr.status)
+
+    @property
+    def os_err(self) -> int:
+        return self._os_err
+
+    @property
+    def transport_err(self) -> int:
+        return (self._hdr.host_status << 8) | self._hdr.driver_status
+
+    @property
+    def transport_err_str(self) -> str:
+        return "host_status={:#x}, driver_status={:#x}".format(
+                self._hdr.host_status, self._hdr.driver_status)
+
+    @property
+    def duration_ms(self) -> int:
+        return self._hdr.duration
@@ -0,0 +1,318 @@
+from . import Buffer
+from .aio import Request
+from .cmd.sbc import Read16, Write16
+from .device import BareDevice
+from .discovery import inquiry, read_capacity
+from collections import deque
+from typing import Iterator, NamedTuple, Optional
+import os
+
+VPD_BLOCK_LIMITS = 0xb0
+
+# Block Limits VPD page 가 없거나 제한이 없을 때 사용하는 chunk 크기
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+class Geometry(NamedTuple):
+    """
+    READ CAPACITY 와 Block Limits VPD page 로 얻은 장치의 크기와 전송 제한
+    """
+    block_size: int
+    blocks: int
+    # 0 이면 제한 없음
+    max_transfer_blocks: int
+    optimal_transfer_blocks: int
+
+    def chunk_blocks(self, chunk_size: Optional[int]=None) -> int:
+        """
+        command 하나로 전송할 block 수. `chunk_size` (byte, 생략하면
+        `DEFAULT_CHUNK_SIZE`) 와 maximum transfer length 중 작은 값이다.
+        """
+        blocks = max(1, (chunk_size or DEFAULT_CHUNK_SIZE) // self.block_size)
+        if self.max_transfer_blocks:
+            blocks = min(blocks, self.max_transfer_blocks)
+        return blocks
+
+
+def geometry(device: BareDevice) -> Geometry:
+    """
+    장치의 block 크기, block 수, 최대/최적 전송 길이를 얻는다.
+    """
+    blocks, block_size = read_capacity(device)
+    if blocks is None:
+        raise ValueError("{} does not report its capacity".format(device._path))
+    max_transfer = optimal = 0
+    page = inquiry(device, VPD_BLOCK_LIMITS, 64)
+    if page is not None and len(page) >= 16:
+        optimal = int.from_bytes(page[12:16], 'big')
+        max_transfer = int.from_bytes(page[8:12], 'big')
+    return Geometry(block_size, blocks, max_transfer, optimal)
+
+
+class _Slot(object):
+    # ring 의 buffer 하나와 그 buffer 를 사용하는 command
+    __slots__ = ('buf', 'view', 'cmd', 'req', 'nbytes')
+
+    def __init__(self, cmd, size: int, timeout: int, data_in: bool):
+        self.buf = Buffer(size=size)
+        self.view = memoryview(self.buf.buffer)
+        self.cmd = cmd
+        if data_in:
+            self.req = Request(self.cmd, data_in=self.buf, timeout=timeout)
+        else:
+            self.req = Request(self.cmd, data_out=self.buf, timeout=timeout)
+        self.nbytes = 0
+
+
+class _Stream(object):
+    # command 의 클래스와 CDB, 방향
+    command_class = None
+    cdb = None
+    data_in = False
+
+    def __init__(self, device: BareDevice, lba: int=0, blocks: Optional[int]=None,
+                 depth: int=4, chunk_size: Optional[int]=None,
+                 geometry_: Optional[Geometry]=None):
+        if geometry_ is None:
+            geometry_ = geometry(device)
+        if blocks is None:
+            blocks = geometry_.blocks - lba
+        if lba < 0 or blocks < 0 or lba + blocks > geometry_.blocks:
+            raise ValueError("Range {}+{} exceeds the device ({} blocks)".format(
+                             lba, blocks, geometry_.blocks))
+        self.device = device
+        self.geometry = geometry_
+        self.block_size = geometry_.block_size
+        self.chunk_blocks = geometry_.chunk_blocks(chunk_size)
+        self.depth = depth
+        self.lba = lba
+        self.blocks = blocks
+        # 장치의 공유 queue 는 depth 가 다를 수 있고 다른 command 와 완료가
+        # 섞이므로 stream 마다 queue 를 따로 만든다.
+        self._queue = device.command_queue(depth, private=True)
+        # 사용자가 들고 있는 buffer 하나를 빼고도 `depth` 개를 진행시킬 수 있게
+        # 하나 더 만든다.
+        size = self.chunk_blocks * self.block_size
+        self._slots = [_Slot(self.command_class(self.cdb), size, device.timeout, self.data_in)
+                       for _ in range(depth + 1)]
+        self._inflight = deque()
+        self._next = lba
+        self._end = lba + blocks
+
+    def _submit(self, slot: _Slot, lba: int, count: int):
+        slot.cmd.set(lba=lba, transfer_length=count)
+        slot.nbytes = count * self.block_size
+        slot.req.reset(slot.nbytes)
+        self._queue.submit(slot.req)
+        self._inflight.append(slot)
+
+    def _complete(self) -> _Slot:
+        slot = self._inflight.popleft()
+        self._queue.wait(slot.req)
+        slot.req.check()
+        return slot
+
+    def _drain(self):
+        # 장치가 아직 buffer 를 사용 중일 수 있으므로 진행 중인 command 는
+        # 오류와 상관없이 끝날 때까지 기다린 뒤 queue 를 닫는다.
+        try:
+            while self._inflight:
+                self._queue.wait(self._inflight.popleft().req)
+        finally:
+            self._queue.close()
+
+
+class StreamReader(_Stream):
+    """
+    연속된 LBA 범위를 chunk 단위로 미리 읽는 iterator
+
+    범위를 maximum transfer length 이하의 chunk 로 나누어 `depth` 개의
+    READ (16) 을 동시에 진행시키며, 정렬된 buffer `depth + 1` 개를 돌려가며
+    사용한다. 반복할 때마다 LBA 순서대로 chunk 의 `memoryview` 를 돌려준다.
+
+        with Device('/dev/sg1') as dev:
+            for chunk in dev.read_stream(depth=8):
+                digest.update(chunk)
+
+    .. note::
+        돌려받은 `memoryview` 는 다음 chunk 를 요청하면 다른 command 가
+        사용하므로, 그 전에 필요한 만큼 사용하거나 복사해야 한다.
+    """
+
+    command_class = Read16
+    cdb = b'\x88'
+    data_in = True
+
+    def __iter__(self) -> Iterator[memoryview]:
+        free = deque(self._slots)
+        try:
+            self._fill_queue(free)
+            while self._inflight:
+                slot = self._complete()
+                # 사용자가 chunk 를 처리하는 동안에도 `depth` 개가 진행되도록
+                # 남은 buffer 로 먼저 제출한다.
+                self._fill_queue(free)
+                yield slot.view[:slot.nbytes]
+                free.append(slot)
+                self._fill_queue(free)
+        finally:
+            self._drain()
+
+    def _fill_queue(self, free: deque):
+        while free and len(self._inflight) < self.depth and self._next < self._end:
+            count = min(self.chunk_blocks, self._end - self._next)
+            self._submit(free.popleft(), self._next, count)
+            self._next += count
+
+    def to_fd(self, fd: int) -> int:
+        """
+        읽은 data 를 file descriptor 에 바로 쓴다.
+
+        :return: 쓴 byte 수
+        :rtype: int
+        """
+        total = 0
+        for chunk in self:
+            while chunk:
+                n = os.write(fd, chunk)
+                chunk = chunk[n:]
+                total += n
+        return total
+
+
+class StreamWriter(_Stream):
+    """
+    byte stream 을 받아 연속된 LBA 범위에 쓰는 sink
+
+    받은 data 를 정렬된 buffer 에 채우고, buffer 가 chunk 크기만큼 차면
+    WRITE (16) 을 제출한다. 최대 `depth` 개의 command 가 동시에 진행되며,
+    이미 `depth` 개가 진행 중이면 가장 먼저 제출한 command 가 끝날 때까지
+    기다린다.
+
+        with dev.write_stream(lba=0) as sink:
+            sink.write_from_fd(image_fd)
+
+    `close()` 할 때 남은 data 를 쓰고 모든 command 가 끝날 때까지 기다린다.
+    전체 길이는 block 크기의 배수여야 한다.
+    """
+
+    command_class = Write16
+    cdb = b'\x8a'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._free = deque(self._slots)
+        self._current = None
+        self._fill = 0
+        self._closed = False
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._drain()
+            self._closed = True
+
+    def _remaining(self) -> int:
+        # 아직 buffer 에 받지 않은 byte 수
+        return (self._end - self._next) * self.block_size - self._fill
+
+    def _buffer(self) -> memoryview:
+        # data 를 채울 buffer 의 남은 부분
+        if self._closed:
+            raise ValueError("Stream is closed")
+        if self._current is None:
+            if not self._free:
+                self._free.append(self._complete())
+            self._current = self._free.popleft()
+            self._fill = 0
+        limit = min(self.chunk_blocks, self._end - self._next) * self.block_size
+        return self._current.view[self._fill:limit]
+
+    def _advance(self, n: int):
+        self._fill += n
+        self.written += n
+        count = min(self.chunk_blocks, self._end - self._next)
+        if self._fill == count * self.block_size:
+            self._submit_current(count)
+
+    def _submit_current(self, count: int):
+        # `depth` 개를 넘게 진행시키지 않도록 가장 먼저 제출한 command 가
+        # 끝나기를 기다린다.
+        if len(self._inflight) >= self.depth:
+            self._free.append(self._complete())
+        self._submit(self._current, self._next, count)
+        self._next += count
+        self._current = None
+        self._fill = 0
+
+    def write(self, data) -> int:
+        """
+        data 를 쓴다. 범위를 넘어서는 data 는 `ValueError`
+
+        :param data: buffer protocol 을 지원하는 객체
+        :return: 받은 byte 수
+        :rtype: int
+        """
+        data = memoryview(data).cast('B')
+        if len(data) > self._remaining():
+            raise ValueError("Data exceeds the stream range")
+        total = len(data)
+        while data:
+            buf = self._buffer()
+            n = min(len(buf), len(data))
+            buf[:n] = data[:n]
+            self._advance(n)
+            data = data[n:]
+        return total
+
+    def write_from_fd(self, fd: int, length: Optional[int]=None) -> int:
+        """
+        file descriptor 에서 읽은 data 를 중간 복사 없이 buffer 에 바로 받아
+        쓴다. EOF 또는 `length` byte 까지 읽는다.
+
+        :return: 쓴 byte 수
+        :rtype: int
+        """
+        remaining = self._remaining()
+        if length is not None:
+            if length > remaining:
+                raise ValueError("Data exceeds the stream range")
+            remaining = length
+        total = 0
+        while remaining:
+            buf = self._buffer()
+            if len(buf) > remaining:
+                buf = buf[:remaining]
+            n = os.readv(fd, [buf])
+            if n == 0:
+                break
+            self._advance(n)
+            remaining -= n
+            total += n
+        return total
+
+    def close(self):
+        """
+        남은 data 를 쓰고 모든 command 가 끝날 때까지 기다린다.
+        """
+        if self._closed:
+            return
+        try:
+            if self._current is not None:
+                if self._fill % self.block_size:
+                    raise ValueError("Stream length is not a multiple of the "
+                                     "block size ({})".format(self.block_size))
+                if self._fill:
+                    self._submit_current(self._fill // self.block_size)
+                else:
+                    self._current = None
+            while self._inflight:
+                self._complete()
+        finally:
+            self._drain()
+            self._closed = True
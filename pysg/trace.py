@@ -0,0 +1,361 @@
+from . import Buffer
+from .cmd import command
+from typing import Optional
+import array
+import os
+import struct
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 파일 구조
+#
+#   header (64 byte): magic, version, 한 block 의 record 수, 시작 시각 (ns)
+#   block 0, block 1, ...
+#
+# block 은 8 byte 의 record 수 뒤에 column 들이 차례로 놓인 고정 크기
+# 영역이다. 마지막 block 만 record 수가 `block_records` 보다 작을 수 있다.
+MAGIC = b'PYSGTRC1'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQ40x')
+_BLOCK_HEADER = 8
+
+CDB_WIDTH = 32
+SENSE_WIDTH = 32
+
+# 전송 방향
+DIR_NONE = 0
+DIR_IN = 1
+DIR_OUT = 2
+
+# (이름, memoryview format, NumPy dtype, 항목 당 개수)
+# 파일의 값은 항상 little endian 이다. 기록할 때는 native byte order 로
+# 채우고, big endian 시스템에서는 파일에 쓰기 전에 byte 순서를 바꾼다.
+COLUMNS = (
+    ('t_ns', 'Q', '<u8', 1),
+    ('duration_ns', 'Q', '<u8', 1),
+    ('length', 'I', '<u4', 1),
+    ('resid', 'i', '<i4', 1),
+    ('cdb_len', 'B', 'u1', 1),
+    ('direction', 'B', 'u1', 1),
+    ('status', 'B', 'u1', 1),
+    ('result', 'B', 'u1', 1),
+    ('sense_len', 'B', 'u1', 1),
+    ('cdb', 'B', 'u1', CDB_WIDTH),
+    ('sense', 'B', 'u1', SENSE_WIDTH),
+)
+
+
+_NATIVE_LE = sys.byteorder == 'little'
+
+
+def _swap_columns(block, offsets, block_records: int) -> bytearray:
+    # native byte order 로 채운 block 의 여러 byte 값들의 byte 순서를 바꾼
+    # 사본을 만든다.
+    block = bytearray(block)
+    for name, fmt, _, width in COLUMNS:
+        itemsize = struct.calcsize(fmt)
+        if itemsize == 1:
+            continue
+        off = offsets[name]
+        size = itemsize * width * block_records
+        values = array.array(fmt, block[off:off + size])
+        values.byteswap()
+        block[off:off + size] = values.tobytes()
+    return block
+
+
+def _layout(block_records: int):
+    # column 별 block 안의 offset 과 block 크기. offset 은 8 byte 단위로 맞춘다.
+    offsets = {}
+    pos = _BLOCK_HEADER
+    for name, fmt, _, width in COLUMNS:
+        offsets[name] = pos
+        size = struct.calcsize(fmt) * width * block_records
+        pos += (size + 7) & ~7
+    return offsets, pos
+
+
+class TraceRecorder(object):
+    """
+    `BareDevice.command()` 로 실행된 command 를 고정 크기 record 로 기록한다.
+
+    record 는 메모리의 block 에 column 별로 채워지고, block 이 가득 차거나
+    `flush()` 할 때 파일의 제자리에 쓰인다. 문자열 변환이나 직렬화 없이
+    값만 복사하므로 `command()` 에 주는 부담이 작다. `BareDevice.enable_trace()`
+    로 켠다.
+
+    CDB 와 sense 는 앞쪽 32 byte 까지만 기록하며, data 는 기록하지 않는다.
+    """
+
+    def __init__(self, path: str, block_records: int=4096):
+        """
+        :param path: 기록할 파일. 이미 있으면 덮어쓴다.
+        :type path: str
+        :param block_records: block 하나에 담을 record 수
+        :type block_records: int
+        """
+        self.path = path
+        self.block_records = block_records
+        self._offsets, self._block_size = _layout(block_records)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.start_ns = time.perf_counter_ns()
+        os.pwrite(self._fd, _HEADER.pack(MAGIC, VERSION, block_records,
+                                         time.time_ns()), 0)
+        self._lock = threading.Lock()
+        self._block = bytearray(self._block_size)
+        self._zero = bytes(self._block_size)
+        view = memoryview(self._block)
+        self._view = view
+        self._cols = {}
+        for name, fmt, _, width in COLUMNS:
+            off = self._offsets[name]
+            size = struct.calcsize(fmt) * width * block_records
+            self._cols[name] = view[off:off + size].cast(fmt)
+        self._count = 0
+        self._blocks = 0
+        self.records = 0
+
+    def record(self, obj, start_ns: int, elapsed_ns: int):
+        """
+        완료된 command 하나를 기록한다.
+
+        :param obj: 실행된 `PTObject`
+        :param start_ns: `time.perf_counter_ns()` 로 잰 시작 시각
+        :param elapsed_ns: 걸린 시간
+        """
+        cdb = obj.cmd._cdb
+        cdb_len = min(len(cdb), CDB_WIDTH)
+        data_in = obj._data_in
+        if data_in is not None:
+            direction, length = DIR_IN, len(data_in)
+        elif obj._data_out is not None:
+            direction, length = DIR_OUT, len(obj._data_out)
+        else:
+            direction, length = DIR_NONE, 0
+        sense_len = min(obj.sense_size, SENSE_WIDTH)
+        status = obj.status_response
+        result = obj.result_category
+        resid = obj.resid
+
+        with self._lock:
+            if self._fd is None:
+                return
+            i = self._count
+            c = self._cols
+            c['t_ns'][i] = max(0, start_ns - self.start_ns)
+            c['duration_ns'][i] = elapsed_ns
+            c['length'][i] = length
+            c['resid'][i] = resid
+            c['cdb_len'][i] = cdb_len
+            c['direction'][i] = direction
+            c['status'][i] = status
+            c['result'][i] = result
+            c['sense_len'][i] = sense_len
+            pos = i * CDB_WIDTH
+            c['cdb'][pos:pos + cdb_len] = cdb[:cdb_len]
+            if sense_len:
+                pos = i * SENSE_WIDTH
+                c['sense'][pos:pos + sense_len] = obj.sense.buffer[:sense_len]
+            self._count = i + 1
+            self.records += 1
+            if self._count == self.block_records:
+                self._write_block()
+                self._blocks += 1
+                self._count = 0
+                self._view[:] = self._zero
+
+    def _write_block(self):
+        block = self._block
+        if not _NATIVE_LE:
+            block = _swap_columns(block, self._offsets, self.block_records)
+        struct.pack_into('<Q', block, 0, self._count)
+        os.pwrite(self._fd, block,
+                  _HEADER.size + self._blocks * self._block_size)
+
+    def flush(self):
+        """
+        아직 가득 차지 않은 block 도 파일에 쓴다.
+        """
+        with self._lock:
+            if self._fd is not None and self._count:
+                self._write_block()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class Trace(object):
+    """
+    `TraceRecorder` 가 기록한 파일을 읽은 결과
+
+    column 마다 NumPy 배열을 속성으로 가진다. `cdb` 와 `sense` 는
+    `(N, 32)` 모양이며 나머지는 길이 N 의 배열이다.
+
+        trace = Trace('trace.bin')
+        slow = trace.duration_ns > 10_000_000
+        print(np.unique(trace.opcode[slow], return_counts=True))
+    """
+
+    def __init__(self, path: str):
+        if np is None:
+            raise ImportError("Trace requires NumPy")
+        with open(path, 'rb') as f:
+            magic, version, block_records, wall_ns = _HEADER.unpack(
+                    f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a pysg trace file".format(path))
+        offsets, block_size = _layout(block_records)
+        self.path = path
+        self.block_records = block_records
+        self.start_wall_ns = wall_ns
+
+        size = os.path.getsize(path) - _HEADER.size
+        nblocks = size // block_size
+        if nblocks:
+            blocks = np.memmap(path, dtype=np.uint8, mode='r', offset=_HEADER.size,
+                               shape=(nblocks, block_size))
+            counts = blocks[:, :_BLOCK_HEADER].copy().view('<u8')[:, 0]
+        else:
+            blocks = np.zeros((0, block_size), dtype=np.uint8)
+            counts = np.zeros(0, dtype=np.uint64)
+        counts = np.minimum(counts, block_records).astype(np.int64)
+        # block 마다 유효한 record 만 골라 이어 붙인다.
+        valid = np.arange(block_records)[None, :] < counts[:, None]
+        for name, fmt, dtype, width in COLUMNS:
+            off = offsets[name]
+            nbytes = np.dtype(dtype).itemsize * width * block_records
+            col = np.ascontiguousarray(blocks[:, off:off + nbytes]).view(dtype)
+            if width == 1:
+                col = col.reshape(nblocks, block_records)[valid]
+            else:
+                col = col.reshape(nblocks, block_records, width)[valid]
+            setattr(self, name, col)
+
+    def __len__(self):
+        return len(self.t_ns)
+
+    @property
+    def opcode(self) -> 'np.ndarray':
+        return self.cdb[:, 0]
+
+    def cdb_bytes(self, i: int) -> bytes:
+        return bytes(self.cdb[i, :self.cdb_len[i]])
+
+    def command(self, i: int):
+        """
+        `i` 번째 record 의 CDB 를 `pysg.cmd.command()` 로 해석한다.
+        """
+        return command(self.cdb_bytes(i))
+
+
+class ReplayResult(object):
+    """
+    `replay()` 의 결과. 배열은 trace 와 같은 길이이며, 실행하지 않은 record
+    는 `issued` 가 False 이다.
+    """
+
+    def __init__(self, count: int):
+        self.issued = np.zeros(count, dtype=bool)
+        self.status = np.zeros(count, dtype=np.uint8)
+        self.result = np.zeros(count, dtype=np.uint8)
+        self.latency_ns = np.zeros(count, dtype=np.uint64)
+        self.elapsed = 0.0
+
+    def mismatches(self, trace: Trace) -> 'np.ndarray':
+        """
+        실행한 record 중 status 가 기록과 다른 것들의 index
+        """
+        return np.nonzero(self.issued & (self.status != trace.status))[0]
+
+
+def replay(trace: Trace, device, speed: Optional[float]=1.0, depth: int=1,
+           allow_writes: bool=False) -> ReplayResult:
+    """
+    trace 의 command 들을 장치에 다시 실행한다.
+
+    CDB 는 `pysg.cmd.command()` 로 다시 해석되고 `device.command_queue()` 의
+    private queue 로 최대 `depth` 개까지 동시에 실행된다. data 는 기록되지
+    않으므로 읽기는 버려지는 buffer 로 받고, 쓰기는 0 으로 채운 data 를
+    보낸다.
+
+    :param trace: 다시 실행할 trace
+    :param device: 실행할 장치
+    :param speed: 기록된 간격을 이 배율로 재현한다 (2.0 이면 두 배 빠르게).
+                  None 이면 간격 없이 최대한 빨리 제출한다.
+    :type speed: Optional[float]
+    :param depth: 동시에 진행할 최대 command 수
+    :type depth: int
+    :param allow_writes: False 면 data 를 보내는 command 는 실행하지 않는다.
+    :type allow_writes: bool
+    :rtype: ReplayResult
+    """
+    from .aio import Request
+
+    n = len(trace)
+    res = ReplayResult(n)
+    queue = device.command_queue(depth, private=True)
+    size = int(trace.length.max()) if n else 0
+    free = [Buffer(size=max(size, 1)) for _ in range(depth)]
+    inflight = {}
+    clock = time.perf_counter_ns
+
+    def complete(reqs):
+        for req in reqs:
+            entry = inflight.pop(id(req), None)
+            if entry is None:
+                continue
+            i, buf, issued = entry
+            res.latency_ns[i] = clock() - issued
+            res.status[i] = req.status_response
+            res.result[i] = req.result_category
+            free.append(buf)
+
+    start = clock()
+    try:
+        for i in range(n):
+            direction = trace.direction[i]
+            if direction == DIR_OUT and not allow_writes:
+                continue
+            if speed is not None:
+                due = start + int(trace.t_ns[i] / speed)
+                while True:
+                    now = clock()
+                    if now >= due:
+                        break
+                    if inflight:
+                        complete(queue.reap(1, block=False))
+                    time.sleep(min((due - now) / 1e9, 0.001))
+            while not free:
+                complete(queue.reap(1))
+
+            buf = free.pop()
+            length = int(trace.length[i])
+            cmd = trace.command(i)
+            if direction == DIR_IN:
+                req = Request(cmd, data_in=buf, timeout=device.timeout)
+            elif direction == DIR_OUT:
+                buf.buffer[:length] = bytes(length)
+                req = Request(cmd, data_out=buf, timeout=device.timeout)
+            else:
+                req = Request(cmd, timeout=device.timeout)
+            if direction != DIR_NONE:
+                req.reset(length)
+            inflight[id(req)] = (i, buf, clock())
+            res.issued[i] = True
+            queue.submit(req)
+        while inflight:
+            complete(queue.reap(1))
+    finally:
+        queue.close()
+    res.elapsed = (clock() - start) / 1e9
+    return res
@@ -0,0 +1,96 @@
+from . import sg_pt
+from abc import ABC, abstractmethod
+from typing import Optional, List
+import os
+
+
+class Transport(ABC):
+    """
+    `BareDevice` 가 장치를 열고 command 를 실행하는 방법
+
+    `pt_class` 는 `BareDevice.command()` 가 만드는 `PTObject` 의 클래스이며,
+    command 의 실제 실행은 이 클래스의 `do_scsi_pt()` 가 담당한다.
+    `queue_backends()` 는 `BareDevice.command_queue()` 가 사용할
+    `pysg.aio.Backend` 들을 만든다.
+    """
+
+    @property
+    def pt_class(self) -> type:
+        from .device import PTObject
+        return PTObject
+
+    def iovec_pt_class(self, device) -> Optional[type]:
+        """
+        buffer 의 list 를 bounce buffer 없이 전송하는 `PTObject` 의 클래스.
+        None 이면 list 는 `ScatterGatherBuffer` 로 모아서 `pt_class` 로
+        실행한다.
+        """
+        return None
+
+    @abstractmethod
+    def open(self, path: str, readonly: bool, verbose: bool,
+             flags: Optional[int]) -> int:
+        """
+        장치를 열고 `BareDevice.fileno()` 가 반환할 값을 반환한다.
+        """
+
+    @abstractmethod
+    def close(self, fd: int):
+        """
+        `open()` 이 반환한 장치를 닫는다.
+        """
+
+    @abstractmethod
+    def queue_backends(self, device, depth: int,
+                       private: bool=False) -> List['Backend']:
+        """
+        `depth` 개의 command 를 진행할 backend 들을 만든다. `private` 이면
+        다른 queue 와 완료를 나누어 받지 않도록 장치의 fd 를 공유하지 않는다.
+        """
+
+
+class SGTransport(Transport):
+    """
+    sg_pt 로 장치를 열고 SG_IO ioctl 로 command 를 실행하는 기본 transport
+    """
+
+    def open(self, path: str, readonly: bool, verbose: bool,
+             flags: Optional[int]) -> int:
+        if flags is not None:
+            fd = sg_pt.lib.scsi_pt_open_flags(path.encode('utf-8'), flags,
+                                              1 if verbose else 0)
+        else:
+            fd = sg_pt.lib.scsi_pt_open_device(path.encode('utf-8'),
+                                               1 if readonly else 0,
+                                               1 if verbose else 0)
+        if fd < 0:
+            raise OSError(-fd, "Can't open device {}".format(path))
+        return fd
+
+    def close(self, fd: int):
+        sg_pt.lib.scsi_pt_close_device(fd)
+
+    def iovec_pt_class(self, device) -> Optional[type]:
+        # sg_pt 는 iovec 을 지원하지 않으므로 sg 장치에서는 SG_IO 를 직접 사용한다.
+        from .sgio import SGIOPTObject, is_sg_device
+        return SGIOPTObject if is_sg_device(device.fileno()) else None
+
+    def queue_backends(self, device, depth: int,
+                       private: bool=False) -> List['Backend']:
+        # fd 하나 당 `SG_MAX_QUEUE` 개 이상의 command 를 진행할 수 없으므로
+        # `depth` 에 맞춰 같은 장치를 추가로 연다.
+        from .aio import SGBackend, SG_MAX_QUEUE
+
+        if device._flags is not None:
+            oflags = device._flags | os.O_NONBLOCK
+        elif device._readonly:
+            oflags = os.O_RDONLY | os.O_NONBLOCK
+        else:
+            oflags = os.O_RDWR | os.O_NONBLOCK
+
+        # 같은 fd 로 제출한 command 의 완료는 어느 queue 가 읽을지 알 수 없으므로
+        # private queue 는 장치의 fd 를 사용하지 않는다.
+        backends = [] if private else [SGBackend(device.fileno())]
+        for _ in range(len(backends), -(-depth // SG_MAX_QUEUE)):
+            backends.append(SGBackend(os.open(device._path, oflags), owned=True))
+        return backends
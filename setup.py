@@ -20,6 +20,7 @@ setup(
         'pysg/build.py:sg_cmds_builder',
         'pysg/build.py:_pysg_builder'],
     install_requires=['cffi>=1.0.0'],
+    extras_require={'numpy': ['numpy']},
     dependency_links=[
         'git+https://github.com/gwangyi/pycparserlibc#egg=pycparserlibc',
     ],
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+
+import pytest
+
+from pysg import _pysg
+from pysg.aio import Backend, CommandQueue, LoopbackBackend
+from pysg.batch import Batch
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+
+BLOCK = 512
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+def filled_target(blocks=64):
+    # 각 block 은 자신의 LBA 로 채워진다.
+    target = EmulatedTarget(blocks=blocks)
+    for lba in range(blocks):
+        target.storage[lba * BLOCK:(lba + 1) * BLOCK] = bytes([lba]) * BLOCK
+    return target
+
+
+class CountingBackend(LoopbackBackend):
+    # 동시에 진행 중인 command 수의 최댓값을 기록한다.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outstanding = 0
+        self.peak = 0
+        self.submitted = 0
+
+    def submit(self, hdr):
+        self.outstanding += 1
+        self.submitted += 1
+        self.peak = max(self.peak, self.outstanding)
+        super().submit(hdr)
+
+    def reap(self, block=False):
+        hdr = super().reap(block)
+        if hdr is not None:
+            self.outstanding -= 1
+        return hdr
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        Backend()
+
+    class NoReap(Backend):
+        def fileno(self):
+            return -1
+
+        def submit(self, hdr):
+            pass
+
+    with pytest.raises(TypeError):
+        NoReap()
+
+
+def test_submit_and_reap_in_completion_order():
+    target = filled_target()
+    seen = []
+
+    def handler(cdb, data_in, data_out):
+        seen.append(cdb[5])
+        return target.handle(cdb, data_in, data_out)
+
+    queue = CommandQueue(LoopbackBackend(handler, latency=1e-3), depth=8)
+    reqs = [queue.submit(read10(lba), data_in=bytearray(BLOCK)) for lba in range(8)]
+    assert len(queue) == 8
+    assert len({req.pack_id for req in reqs}) == 8
+
+    done = []
+    while len(done) < len(reqs):
+        done.extend(queue.reap())
+    queue.close()
+
+    # latency 가 같으므로 제출한 순서대로 처리되고 완료된다.
+    assert seen == list(range(8))
+    assert done == reqs
+    for lba, req in enumerate(reqs):
+        req.check()
+        assert bytes(req.data.buffer) == bytes([lba]) * BLOCK
+
+
+def test_wait_is_not_reaped():
+    target = filled_target()
+    queue = CommandQueue(LoopbackBackend(target.handle), depth=4)
+    first = queue.submit(read10(1), data_in=bytearray(BLOCK))
+    second = queue.submit(read10(2), data_in=bytearray(BLOCK))
+    assert queue.wait(second) is second
+    assert queue.reap() == [first]
+    assert queue.reap(block=False) == []
+    queue.close()
+
+
+def test_depth_limits_commands_in_flight():
+    target = filled_target()
+    backend = CountingBackend(target.handle, latency=1e-3)
+    queue = CommandQueue(backend, depth=3)
+    reqs = [queue.submit(read10(lba), data_in=bytearray(BLOCK)) for lba in range(10)]
+    assert len(queue) <= 3
+    queue.reap(len(reqs))
+    while any(not req.done for req in reqs):
+        queue.reap()
+    queue.close()
+    assert backend.submitted == 10
+    assert backend.peak == 3
+
+
+def test_backend_max_queue_spreads_commands():
+    target = filled_target()
+    backends = [CountingBackend(target.handle, latency=1e-3, max_queue=2)
+                for _ in range(2)]
+    queue = CommandQueue(backends, depth=8)
+    reqs = [queue.submit(read10(lba), data_in=bytearray(BLOCK)) for lba in range(12)]
+    while any(not req.done for req in reqs):
+        queue.reap()
+    queue.close()
+    assert [b.peak for b in backends] == [2, 2]
+    assert sum(b.submitted for b in backends) == 12
+    for lba, req in enumerate(reqs):
+        assert bytes(req.data.buffer) == bytes([lba]) * BLOCK
+
+
+def test_completions_are_routed_by_pack_id():
+    target = filled_target()
+    # 두 번째 backend 가 더 빨리 끝나므로 완료 순서와 제출 순서가 다르다.
+    slow = LoopbackBackend(target.handle, latency=20e-3)
+    fast = LoopbackBackend(target.handle)
+    queue = CommandQueue([slow, fast], depth=4)
+    reqs = [queue.submit(read10(lba), data_in=bytearray(BLOCK)) for lba in (10, 11, 12, 13)]
+    done = []
+    while len(done) < len(reqs):
+        done.extend(queue.reap())
+    queue.close()
+    assert done[:2] == [reqs[1], reqs[3]]
+    for lba, req in zip((10, 11, 12, 13), reqs):
+        assert bytes(req.data.buffer) == bytes([lba]) * BLOCK
+
+
+class StrayBackend(LoopbackBackend):
+    # 다른 곳에서 제출된 command 처럼 모르는 pack_id 로 완료를 돌려준다.
+    stray = True
+
+    def reap(self, block=False):
+        hdr = super().reap(block)
+        if hdr is not None and self.stray:
+            self.stray = False
+            hdr.pack_id = 0x7fff0000
+        return hdr
+
+
+def test_unknown_pack_id_frees_the_slot(caplog):
+    target = filled_target()
+    queue = CommandQueue(StrayBackend(target.handle), depth=1)
+    lost = queue.submit(read10(0), data_in=bytearray(BLOCK))
+    with caplog.at_level(logging.WARNING, logger='pysg.aio'):
+        # 자리가 반환되지 않으면 여기서 영원히 기다린다.
+        req = queue.submit(read10(1), data_in=bytearray(BLOCK))
+    assert 'unknown pack_id' in caplog.text
+    queue.wait(req)
+    assert not lost.done
+    assert queue._inflight == [0]
+    queue.close()
+
+
+def test_run_batch_fills_columns():
+    target = filled_target()
+    backend = CountingBackend(target.handle, latency=1e-3)
+    queue = CommandQueue(backend, depth=4)
+    bufs = [bytearray(BLOCK) for _ in range(9)]
+    batch = Batch.from_commands((read10(lba), buf) for lba, buf in enumerate(bufs))
+    result = queue.run_batch(batch)
+    queue.close()
+    assert backend.peak == 4
+    assert result.failed() == []
+    for lba, buf in enumerate(bufs):
+        assert buf == bytes([lba]) * BLOCK
+
+
+def test_command_async_respects_depth():
+    target = filled_target()
+    backend = CountingBackend(target.handle, latency=1e-3)
+    queue = CommandQueue(backend, depth=2)
+
+    async def main():
+        return await asyncio.gather(*[
+            queue.command_async(read10(lba), data_in=bytearray(BLOCK))
+            for lba in range(6)])
+
+    reqs = asyncio.run(main())
+    queue.close()
+    assert backend.peak == 2
+    for lba, req in enumerate(reqs):
+        assert req.done
+        assert bytes(req.data.buffer) == bytes([lba]) * BLOCK
@@ -0,0 +1,110 @@
+import pytest
+
+from pysg import BounceBuffer, Buffer
+from pysg.aio import CommandQueue, LoopbackBackend
+from pysg.batch import Batch
+from pysg.cmd import command
+from pysg.device import CheckConditionError
+from pysg.emulation import EmulatedTarget, TargetError
+from pysg.enum import PTResult, SenseKeyCodes, StatusCodes
+
+BLOCK = 512
+TUR = b'\x00' * 6
+INQUIRY = bytes([0x12, 0, 0, 0, 36, 0])
+
+
+def read10_cdb(lba, blocks=1):
+    return bytes([0x28, 0]) + lba.to_bytes(4, 'big') + bytes([0]) + \
+        blocks.to_bytes(2, 'big') + bytes(1)
+
+
+def test_from_commands_and_capacity():
+    batch = Batch.from_commands([command(TUR), (command(INQUIRY), bytearray(36))])
+    assert len(batch) == 2
+    with pytest.raises(IndexError):
+        batch.add(command(TUR))
+    with pytest.raises(IndexError):
+        batch.add_cdbs(memoryview(bytearray(6)).cast('B', (1, 6)))
+
+
+def test_run_batch_reads_into_buffers():
+    target = EmulatedTarget(blocks=16)
+    for lba in range(16):
+        target.storage[lba * BLOCK:(lba + 1) * BLOCK] = bytes([lba]) * BLOCK
+    bufs = [bytearray(BLOCK) for _ in range(4)]
+    with target.device() as dev:
+        result = dev.submit_batch([(command(read10_cdb(lba)), buf)
+                                   for lba, buf in zip((3, 1, 4, 1), bufs)])
+    assert len(result) == 4
+    assert result.failed() == []
+    result.check()
+    assert [buf[0] for buf in bufs] == [3, 1, 4, 1]
+
+
+def test_add_cdbs_shares_one_buffer():
+    target = EmulatedTarget(blocks=16)
+    for lba in range(16):
+        target.storage[lba * BLOCK:(lba + 1) * BLOCK] = bytes([lba]) * BLOCK
+    cdbs = bytearray(b''.join(read10_cdb(lba) for lba in (5, 6, 7)))
+    data = bytearray(3 * BLOCK)
+    batch = Batch(3)
+    batch.add_cdbs(memoryview(cdbs).cast('B', (3, 10)), data_in=data,
+                   transfer_size=BLOCK)
+    with target.device() as dev:
+        result = dev.submit_batch(batch)
+    assert result.failed() == []
+    assert data == bytes([5]) * BLOCK + bytes([6]) * BLOCK + bytes([7]) * BLOCK
+    assert str(result.entry(1).cmd) == str(command(read10_cdb(6)))
+
+
+def test_add_cdbs_flushes_only_transferred_bytes():
+    # 각 항목은 CDB 의 LBA 만큼만 채우고 나머지는 resid 로 보고한다.
+    def partial(cdb, data_in, data_out):
+        n = cdb[5]
+        data_in[:n] = bytes([n]) * n
+        return StatusCodes.GOOD, b'', len(data_in) - n
+
+    size = 8
+    target = bytearray(b'\xee' * (3 * size + 1))
+    data_in = Buffer.from_buffer(memoryview(target)[1:], True, alignment=4096)
+    assert isinstance(data_in, BounceBuffer)
+    cdbs = bytearray(b''.join(read10_cdb(n) for n in (8, 3, 0)))
+    batch = Batch(3)
+    batch.add_cdbs(memoryview(cdbs).cast('B', (3, 10)), data_in=data_in,
+                   transfer_size=size)
+    queue = CommandQueue(LoopbackBackend(partial), depth=2)
+    result = queue.run_batch(batch)
+    queue.close()
+    assert list(result.resid) == [0, 5, 8]
+    assert target == b'\xee' + b'\x08' * 8 + b'\x03' * 3 + b'\xee' * 5 + b'\xee' * 8
+
+
+def test_errors_are_built_for_failed_entries():
+    target = EmulatedTarget()
+
+    def handler(cdb, data_in, data_out):
+        if cdb[0] == 0x12:
+            raise TargetError("link down")
+        return target.handle(cdb, data_in, data_out)
+
+    target.inject(SenseKeyCodes.MEDIUM_ERROR, 0x11, 0x00, opcode=0x00)
+    batch = Batch.from_commands([command(TUR), command(TUR),
+                                 (command(INQUIRY), bytearray(36))])
+    queue = CommandQueue(LoopbackBackend(handler), depth=1)
+    result = queue.run_batch(batch)
+    queue.close()
+
+    assert result.failed() == [0, 2]
+    assert result.category(0) is PTResult.SENSE
+    assert result.category(1) is PTResult.GOOD
+    assert result.category(2) is PTResult.TRANSPORT_ERR
+    assert result.sense(1) is None
+    assert result.sense(0).record.asc == 0x11
+
+    errors = list(result.errors())
+    assert [idx for idx, _ in errors] == [0, 2]
+    assert isinstance(errors[0][1], CheckConditionError)
+    assert errors[0][1].sense.record.sense_key == SenseKeyCodes.MEDIUM_ERROR
+    assert type(errors[1][1]) is RuntimeError
+    with pytest.raises(CheckConditionError):
+        result.check()
@@ -0,0 +1,90 @@
+import mmap
+
+import pytest
+
+from pysg import BounceBuffer, Buffer, _pysg, as_buffer
+from pysg.cmd import command
+
+BLOCK = 512
+
+
+def address(obj):
+    return int(_pysg.ffi.cast('uintptr_t', _pysg.ffi.from_buffer(obj)))
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+@pytest.mark.parametrize('make', [lambda: bytearray(64),
+                                  lambda: memoryview(bytearray(65))[1:],
+                                  lambda: mmap.mmap(-1, 64)])
+def test_from_buffer_is_zero_copy(make):
+    obj = make()
+    buf = Buffer.from_buffer(obj, True)
+    assert type(buf) is Buffer
+    assert len(buf) == 64
+    assert int(_pysg.ffi.cast('uintptr_t', buf.ptr)) == address(obj)
+    buf.buffer[:4] = b'abcd'
+    assert bytes(memoryview(obj)[:4]) == b'abcd'
+
+
+def test_from_numpy_array():
+    np = pytest.importorskip('numpy')
+    arr = np.zeros(16, dtype=np.uint32)
+    buf = Buffer.from_buffer(arr, True)
+    assert len(buf) == 64
+    buf.buffer[:4] = b'\x01\x00\x00\x00'
+    assert arr[0] == 1
+    with pytest.raises(ValueError):
+        Buffer.from_buffer(arr[::2])
+
+
+def test_read_only_memory_is_rejected_for_data_in():
+    assert len(Buffer.from_buffer(b'abc')) == 3
+    with pytest.raises(TypeError):
+        Buffer.from_buffer(b'abc', True)
+
+
+def test_misaligned_data_in_is_bounced_and_flushed():
+    target = bytearray(b'\xee' * 17)
+    buf = Buffer.from_buffer(memoryview(target)[1:], True, alignment=4096)
+    assert isinstance(buf, BounceBuffer)
+    assert int(_pysg.ffi.cast('uintptr_t', buf.ptr)) % 4096 == 0
+    buf.buffer[:] = bytes(range(16))
+    assert target == b'\xee' * 17
+    buf.flush(4)
+    assert target == b'\xee' + bytes(range(4)) + b'\xee' * 12
+    buf.flush()
+    assert target == b'\xee' + bytes(range(16))
+
+
+def test_misaligned_data_out_is_copied_once():
+    source = bytearray(b'x' + bytes(range(16)))
+    buf = Buffer.from_buffer(memoryview(source)[1:], alignment=4096)
+    assert isinstance(buf, BounceBuffer)
+    assert bytes(buf.buffer) == bytes(range(16))
+    source[1] = 0xff
+    buf.flush()
+    assert bytes(buf.buffer) == bytes(range(16))
+
+
+def test_as_buffer():
+    assert as_buffer(None) is None
+    own = Buffer(size=8)
+    assert as_buffer(own) is own
+    assert len(as_buffer(32)) == 32
+    assert type(as_buffer(bytearray(8), True)) is Buffer
+
+
+def test_command_reads_into_user_memory():
+    from pysg.emulation import EmulatedTarget
+
+    target = EmulatedTarget(blocks=16)
+    target.storage[2 * BLOCK:3 * BLOCK] = b'\x42' * BLOCK
+    backing = bytearray(BLOCK + 1)
+    with target.device() as dev:
+        obj = dev.command(read10(2), data_in=memoryview(backing)[1:])
+        assert type(obj.data) is Buffer
+    assert backing == b'\x00' + b'\x42' * BLOCK
@@ -0,0 +1,154 @@
+import pytest
+
+from pysg.cmd import Command, command
+from pysg.cmd import sbc, spc
+
+READ_16 = bytes([0x88]) + bytes(15)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # 등록은 전역 상태이므로 test 가 끝나면 되돌린다.
+    for c in (Command, sbc.ServiceActionIn16):
+        monkeypatch.setattr(c, '_command_map', list(c._command_map))
+        monkeypatch.setattr(c, '_index', dict((k, list(v)) for k, v in c._index.items()))
+        monkeypatch.setattr(c, '_dispatch_key', c._dispatch_key)
+        monkeypatch.setattr(c, '_dispatch_cache', {})
+    monkeypatch.setattr(sbc, '_registered', False)
+    monkeypatch.setattr(spc, '_registered', False)
+    return Command
+
+
+def test_catalog_is_not_registered_on_import():
+    assert type(command(READ_16)) is Command
+    assert type(command(b'\x12' + bytes(5))) is Command
+
+
+def test_catalog_register(registry):
+    sbc.register()
+    spc.register()
+    sbc.register()
+    cmd = command(READ_16)
+    assert type(cmd) is sbc.Read16
+    assert type(command(bytes([0x9e, 0x10]) + bytes(14))) is sbc.ReadCapacity16
+    assert type(command(b'\x12' + bytes(5))) is spc.Inquiry
+    assert len(registry._index[(0x88, None)]) == 1
+
+
+def test_template_uses_class_fields():
+    np = pytest.importorskip('numpy')
+    from pysg.cmd.template import CommandTemplate
+
+    tpl = CommandTemplate(sbc.Read16(b'\x88'), transfer_length=8, fua=True)
+    cdbs = tpl.sequential(0x100, 3, 8)
+    assert cdbs.shape == (3, 16)
+    for i, row in enumerate(cdbs):
+        cmd = sbc.Read16(row.tobytes())
+        assert (cmd.lba, cmd.transfer_length, cmd.fua) == (0x100 + 8 * i, 8, True)
+    assert np.all(cdbs[:, 0] == 0x88)
+
+
+def test_dispatch_by_service_action_property(registry):
+    @Command.register(opcode=0xa3)
+    class MaintenanceIn(Command):
+        @property
+        def service_action(self):
+            return self._cdb[1] & 0x1f
+
+    @MaintenanceIn.register(service_action=0x0c)
+    class ReportSupportedOpcodes(MaintenanceIn):
+        pass
+
+    @MaintenanceIn.register(service_action=range(0x10, 0x20))
+    class VendorMaintenanceIn(MaintenanceIn):
+        pass
+
+    assert type(command(bytes([0xa3, 0x0c]) + bytes(10))) is ReportSupportedOpcodes
+    assert type(command(bytes([0xa3, 0x12]) + bytes(10))) is VendorMaintenanceIn
+    assert type(command(bytes([0xa3, 0x05]) + bytes(10))) is MaintenanceIn
+
+
+def test_dispatch_by_service_action_field(registry):
+    sbc.register()
+    cdb = bytearray(16)
+    cdb[0] = 0x9e
+    for sa, cls in ((0x10, sbc.ReadCapacity16), (0x11, sbc.ServiceActionIn16)):
+        cdb[1] = 0xe0 | sa
+        assert type(command(bytes(cdb))) is cls
+
+
+def test_name_cache_ignores_flags_of_plain_opcodes(monkeypatch):
+    from pysg.cmd import _name_cache
+
+    monkeypatch.setattr(_name_cache, '_data', {})
+    read10 = bytes([0x28]) + bytes(9)
+    names = set()
+    for flags in (0x00, 0x08, 0x10, 0x18, 0xe0):
+        names.add(command(bytes([0x28, flags]) + read10[2:]).name)
+    assert len(names) == 1
+    assert len(_name_cache) == 1
+
+    # SERVICE ACTION IN (16) 은 service action 마다 이름이 다르다.
+    command(bytes([0x9e, 0x10]) + bytes(14)).name
+    command(bytes([0x9e, 0x11]) + bytes(14)).name
+    command(bytes([0x9e, 0xf1]) + bytes(14)).name
+    assert len(_name_cache) == 3
+
+
+LAYOUTS = [((1, 3), None), (2, None), ((1, 7), (1, 5)), ((6, 4), 6), (2, 3),
+           (2, 5), (2, 9), ((1, 4), (3, 0)), ((4, 2), (6, 5)), ((8, 6), (9, 1))]
+
+
+def field_bits(msb, lsb):
+    if lsb is None:
+        lsb = msb
+    msb = (msb, 7) if isinstance(msb, int) else msb
+    lsb = (lsb, 0) if isinstance(lsb, int) else lsb
+    for byte in range(msb[0], lsb[0] + 1):
+        high = msb[1] if byte == msb[0] else 7
+        low = lsb[1] if byte == lsb[0] else 0
+        for bit in range(high, low - 1, -1):
+            yield byte, bit
+
+
+@pytest.mark.parametrize('msb, lsb', LAYOUTS)
+def test_cdb_field_matches_bitwise_layout(msb, lsb):
+    import random
+
+    field = Command.command_property(msb, lsb)
+    bits = list(field_bits(msb, lsb))
+    rng = random.Random(repr((msb, lsb)))
+    for _ in range(50):
+        cdb = bytearray(rng.getrandbits(8) for _ in range(16))
+        before = bytes(cdb)
+        expected = 0
+        for byte, bit in bits:
+            expected = expected << 1 | (cdb[byte] >> bit) & 1
+        assert int(field.read(cdb)) == expected
+
+        # 한 bit 필드는 bool 로 쓰고, 그 외에는 넘치는 bit 가 잘린다.
+        val = rng.getrandbits(1 if len(bits) == 1 else len(bits) + 4)
+        field.write(cdb, val)
+        val &= (1 << len(bits)) - 1
+        for i, (byte, bit) in enumerate(reversed(bits)):
+            assert (cdb[byte] >> bit) & 1 == (val >> i) & 1
+        # 필드 밖의 bit 는 바뀌지 않는다.
+        inside = set(bits)
+        for byte in range(16):
+            for bit in range(8):
+                if (byte, bit) not in inside:
+                    assert (cdb[byte] >> bit) & 1 == (before[byte] >> bit) & 1
+
+
+def test_command_set_and_fields():
+    cmd = sbc.Read16(READ_16)
+    assert cmd.set(lba=0x0102030405060708, transfer_length=0x10, fua=True) is cmd
+    assert bytes(cmd._cdb) == bytes([0x88, 0x08, 1, 2, 3, 4, 5, 6, 7, 8,
+                                     0, 0, 0, 0x10, 0, 0])
+    assert (cmd.lba, cmd.transfer_length, cmd.fua, cmd.dpo) == \
+        (0x0102030405060708, 0x10, True, False)
+    cmd.fua = False
+    assert cmd._cdb[1] == 0
+    with pytest.raises(AttributeError):
+        cmd.set(bogus=1)
+    assert 'lba' in sbc.Read16._fields and 'lba' not in Command._fields
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+from pysg.cmd import command
+from pysg.device import Device
+from pysg.emulation import EmulatedTarget
+
+THREADS = 8
+TASKS = 16
+ITERATIONS = 50
+
+
+def rw16(opcode, lba, blocks):
+    return command(bytes([opcode, 0]) + lba.to_bytes(8, 'big') +
+                   blocks.to_bytes(4, 'big') + b'\x00\x00')
+
+
+def run_threads(fn, count):
+    errors = []
+
+    def run(idx):
+        try:
+            fn(idx)
+        except Exception as e:
+            errors.append((idx, e))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_current_is_per_thread():
+    # 모든 thread 가 장치를 연 상태에서 동시에 `current()` 를 확인한다.
+    targets = [EmulatedTarget(blocks=64) for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS, timeout=30)
+
+    def run(idx):
+        outer = targets[idx].device('outer{}'.format(idx))
+        inner = targets[idx].device('inner{}'.format(idx))
+        with outer:
+            barrier.wait()
+            for _ in range(ITERATIONS):
+                assert Device.current() is outer
+                with inner:
+                    assert Device.current() is inner
+                assert Device.current() is outer
+        assert Device.current() is None
+
+    run_threads(run, THREADS)
+    assert Device.current() is None
+
+
+def test_current_is_per_task():
+    target = EmulatedTarget(blocks=64)
+
+    async def run(idx):
+        with target.device('task{}'.format(idx)) as dev:
+            for _ in range(ITERATIONS):
+                await asyncio.sleep(0)
+                assert Device.current() is dev
+        assert Device.current() is None
+
+    async def main():
+        await asyncio.gather(*(run(i) for i in range(TASKS)))
+
+    asyncio.run(main())
+
+
+def test_activate_does_not_close():
+    target = EmulatedTarget()
+    dev = target.device()
+    with dev.activate():
+        assert Device.current() is dev
+    assert Device.current() is None
+    assert dev.fileno() is not None
+    dev.close()
+
+
+def test_threads_share_one_device():
+    # thread 마다 다른 LBA 에 쓰고 읽어서 data 가 섞이지 않는지 확인한다.
+    blocks = 8
+    target = EmulatedTarget(blocks=THREADS * blocks)
+    dev = target.device('shared')
+    dev.enable_pt_pool()
+    metrics = dev.enable_metrics()
+    size = blocks * target.block_size
+
+    def run(idx):
+        lba = idx * blocks
+        buf = bytearray(size)
+        for i in range(ITERATIONS):
+            pattern = bytes([(idx + i) & 0xff]) * size
+            dev.command(rw16(0x8a, lba, blocks), data_out=pattern).release()
+            dev.command(rw16(0x88, lba, blocks), data_in=buf).release()
+            assert buf == pattern
+
+    run_threads(run, THREADS)
+    dev.close()
+    assert sum(metrics.results.values()) == THREADS * ITERATIONS * 2
@@ -0,0 +1,27 @@
+from pysg.discovery import DeviceIdentity, InventoryCache
+
+
+def anonymous(path, blocks, serial=None):
+    # LU designator 가 없는 장치
+    return DeviceIdentity(path, 0, 'ACME', 'DISK', '0001', serial, (), blocks, 512)
+
+
+def test_identical_models_without_serial_do_not_collide(tmp_path):
+    a = anonymous('/dev/sg1', 1000)
+    b = anonymous('/dev/sg2', 2000)
+    assert a.identifier != b.identifier
+
+    cache = InventoryCache(str(tmp_path / 'inventory.json'))
+    cache.store(a, [1, 1, 1])
+    cache.store(b, [2, 2, 2])
+    cache.save()
+
+    cache = InventoryCache(str(tmp_path / 'inventory.json'))
+    assert cache.lookup('/dev/sg1', [1, 1, 1]).blocks == 1000
+    assert cache.lookup('/dev/sg2', [2, 2, 2]).blocks == 2000
+
+
+def test_serial_identifies_device_across_paths():
+    a = anonymous('/dev/sg1', 1000, serial='S1')
+    assert a.identifier == a._replace(path='/dev/sg7').identifier
+    assert a.identifier != anonymous('/dev/sg1', 1000, serial='S2').identifier
@@ -0,0 +1,89 @@
+import pytest
+
+from pysg.cmd import command
+from pysg.emulation import EmulatedPTObject, EmulatedTarget, TargetError
+from pysg.enum import PTResult, SenseKeyCodes
+
+TUR = b'\x00' * 6
+
+
+def test_handler_bug_propagates():
+    target = EmulatedTarget()
+
+    def broken(cdb, data_in, data_out):
+        raise ZeroDivisionError
+
+    target._handlers[0x00] = broken
+    with target.device() as dev:
+        with pytest.raises(ZeroDivisionError):
+            dev.try_command(command(TUR))
+
+
+def test_target_error_is_a_transport_error():
+    target = EmulatedTarget()
+
+    def failing(cdb, data_in, data_out):
+        raise TargetError("link down")
+
+    target._handlers[0x00] = failing
+    with target.device() as dev:
+        status = dev.try_command(command(TUR))
+    assert status.category is PTResult.TRANSPORT_ERR
+
+
+def test_shorter_sense_clears_previous_tail():
+    target = EmulatedTarget()
+    with target.device() as dev:
+        obj = EmulatedPTObject(command(TUR))
+        target.inject(SenseKeyCodes.MEDIUM_ERROR, 0x11, 0x00)
+        assert obj.try_scsi_pt(dev).category is PTResult.SENSE
+        assert obj.sense.record.asc == 0x11
+
+        # descriptor 형식은 fixed 형식보다 짧다.
+        target.descriptor_sense = True
+        target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        assert obj.try_scsi_pt(dev).category is PTResult.SENSE
+        assert bytes(obj.sense.buffer[8:]) == bytes(len(obj.sense.buffer) - 8)
+        rec = obj.sense.record
+        assert (rec.sense_key, rec.asc, rec.ascq) == (SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+
+        assert obj.try_scsi_pt(dev).ok
+        assert bytes(obj.sense.buffer) == bytes(len(obj.sense.buffer))
+
+
+def test_queue_handler_bug_propagates():
+    target = EmulatedTarget()
+
+    def broken(cdb, data_in, data_out):
+        raise ZeroDivisionError
+
+    target._handlers[0x00] = broken
+    with target.device() as dev:
+        queue = dev.command_queue(4)
+        with pytest.raises(ZeroDivisionError):
+            queue.command(command(TUR))
+
+        ok = queue.submit(command(bytes([0x12, 0, 0, 0, 36, 0])), data_in=bytearray(36))
+        bad = queue.submit(command(TUR))
+        queue.wait(ok)
+        with pytest.raises(ZeroDivisionError):
+            queue.wait(bad)
+        assert isinstance(bad.error, ZeroDivisionError)
+        assert ok.error is None
+
+        queue.submit(command(TUR))
+        with pytest.raises(ZeroDivisionError):
+            queue.reap(1)
+        assert len(queue) == 0
+
+def test_queue_target_error_is_a_transport_error():
+    target = EmulatedTarget()
+
+    def failing(cdb, data_in, data_out):
+        raise TargetError("link down")
+
+    target._handlers[0x00] = failing
+    with target.device() as dev:
+        req = dev.command_queue(4).wait(dev.command_queue().submit(command(TUR)))
+    assert req.error is None
+    assert req.result_category is PTResult.TRANSPORT_ERR
@@ -0,0 +1,39 @@
+import pickle
+
+from pysg.cmd import command
+from pysg.device import CheckConditionError, SCSIError
+from pysg.enum import SenseKeyCodes, StatusCodes
+from pysg.sense import Sense
+
+TUR = b'\x00' * 6
+MEDIUM_ERROR = bytes([0x70, 0, 0x03, 0, 0, 0, 0, 10, 0, 0, 0, 0, 0x11, 0x00]) + bytes(4)
+
+
+def test_args_hold_the_command():
+    cmd = command(TUR)
+    exc = SCSIError(StatusCodes.BUSY, cmd)
+    assert exc.args == (cmd,)
+    assert str(exc).endswith("{} failed".format(cmd))
+
+
+def test_string_message_is_kept():
+    exc = SCSIError(StatusCodes.BUSY, "TUR failed")
+    assert exc.args == ("TUR failed",)
+    assert str(exc).endswith("TUR failed")
+
+
+def test_scsi_error_pickles():
+    exc = SCSIError(StatusCodes.BUSY, command(TUR))
+    copy = pickle.loads(pickle.dumps(exc))
+    assert type(copy) is SCSIError
+    assert copy.status_code == StatusCodes.BUSY
+    assert str(copy) == str(exc)
+
+
+def test_check_condition_error_pickles():
+    exc = CheckConditionError(Sense(init=MEDIUM_ERROR), command(TUR), None)
+    copy = pickle.loads(pickle.dumps(exc))
+    assert type(copy) is CheckConditionError
+    assert copy.status_code == StatusCodes.CHECK_CONDITION
+    assert copy.sense.sense_key == SenseKeyCodes.MEDIUM_ERROR
+    assert (copy.sense.record.asc, copy.sense.record.ascq) == (0x11, 0x00)
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from pysg.cmd import command
+from pysg.device import CheckConditionError, Device
+from pysg.emulation import EmulatedTarget
+from pysg.enum import SenseKeyCodes
+from pysg.executor import DevicePool
+
+TUR = b'\x00' * 6
+
+
+def test_devices_stick_to_one_worker():
+    devices = [EmulatedTarget().device('emu{}'.format(i)) for i in range(6)]
+    seen = dict((dev._path, []) for dev in devices)
+
+    def task(dev, seq):
+        assert Device.current() is dev
+        seen[dev._path].append((seq, threading.current_thread().name))
+
+    with DevicePool(devices, workers=3) as pool:
+        assert pool.workers == 3 and len(pool) == 6
+        for seq in range(20):
+            pool.map(task, seq)
+    for dev in devices:
+        dev.close()
+
+    workers = {}
+    for path, runs in seen.items():
+        assert [seq for seq, _ in runs] == list(range(20))
+        names = {name for _, name in runs}
+        assert len(names) == 1
+        workers.setdefault(names.pop(), []).append(path)
+    # 장치는 worker 들에 고르게 나뉜다.
+    assert sorted(len(paths) for paths in workers.values()) == [2, 2, 2]
+
+
+def test_command_futures_carry_results_and_errors():
+    target = EmulatedTarget()
+    with DevicePool(device_factory=lambda path: target.device(path)) as pool:
+        key = pool.add('emu')
+        assert pool.command(key, command(TUR)).result().cmd is not None
+        target.inject(SenseKeyCodes.NOT_READY, 0x04, 0x01)
+        with pytest.raises(CheckConditionError):
+            pool.command(key, command(TUR)).result()
+        with pytest.raises(KeyError):
+            pool.add('emu')
+        dev = pool['emu']
+    # 경로로 연 장치는 pool 이 닫는다.
+    assert dev.fileno() is None
+    with pytest.raises(RuntimeError):
+        pool.submit(key, lambda dev: None)
@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+import pysg
+
+
+def test_submodules_are_attributes():
+    for name in pysg._submodules:
+        assert getattr(pysg, name) is sys.modules['pysg.' + name]
+    assert pysg.sg_lib.lib is not None
+
+
+def test_cmd_does_not_import_catalog():
+    code = ("import sys, pysg.cmd; "
+            "assert 'pysg.cmd.spc' not in sys.modules, 'spc'; "
+            "assert 'pysg.cmd.sbc' not in sys.modules, 'sbc'; "
+            "assert 'pysg.device' not in sys.modules, 'device'")
+    subprocess.run([sys.executable, '-c', code], check=True)
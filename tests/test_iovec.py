@@ -0,0 +1,137 @@
+import pytest
+
+from pysg import BounceBuffer, Buffer, ScatterGatherBuffer, _pysg
+from pysg.aio import IovecArray, Request
+from pysg.cmd import command
+from pysg.device import _transferred
+from pysg.sgio import SGIOPTObject
+
+READ_10 = bytes([0x28]) + bytes(9)
+WRITE_10 = bytes([0x2a]) + bytes(9)
+
+
+def address(obj):
+    return int(_pysg.ffi.cast('uintptr_t', _pysg.ffi.from_buffer(obj)))
+
+
+def test_partial_flush_fills_only_transferred_bytes():
+    targets = [bytearray(b'\xee' * n) for n in (3, 0, 4, 5)]
+    buf = ScatterGatherBuffer(targets, True)
+    buf.buffer[:] = bytes(range(1, 13))
+    # 12 byte 중 resid 5 byte 는 전송되지 않았다.
+    buf.flush(_transferred(len(buf), 5))
+    assert targets == [bytearray(b'\x01\x02\x03'), bytearray(),
+                       bytearray(b'\x04\x05\x06\x07'), bytearray(b'\xee' * 5)]
+
+
+def test_flush_at_offset_spans_segments():
+    targets = [bytearray(b'\xee' * n) for n in (3, 0, 4, 5)]
+    buf = ScatterGatherBuffer(targets, True)
+    buf.buffer[:] = bytes(range(1, 13))
+    buf.flush(5, 2)
+    assert targets == [bytearray(b'\xee\xee\x03'), bytearray(),
+                       bytearray(b'\x04\x05\x06\x07'), bytearray(b'\xee' * 5)]
+
+
+def test_flush_of_write_buffer_leaves_sources():
+    sources = [bytearray(b'ab'), bytearray(b'cde')]
+    buf = ScatterGatherBuffer(sources, False)
+    assert bytes(buf.buffer) == b'abcde'
+    buf.buffer[:] = bytes(5)
+    buf.flush()
+    assert sources == [bytearray(b'ab'), bytearray(b'cde')]
+
+
+def test_iovec_array_points_at_segments():
+    segments = [bytearray(3), bytearray(), bytearray(5), bytearray()]
+    iov = IovecArray(segments, True)
+    assert iov.count == 4
+    assert len(iov) == 8
+    for entry, segment in zip(iov.ptr, segments):
+        assert entry.iov_len == len(segment)
+        if segment:
+            assert int(_pysg.ffi.cast('uintptr_t', entry.iov_base)) == address(segment)
+
+
+def test_only_empty_segments():
+    assert len(IovecArray([b'', b''])) == 0
+    assert len(ScatterGatherBuffer([b'', b''], False)) == 0
+
+
+@pytest.mark.parametrize('make', [lambda s: IovecArray(s, True),
+                                  lambda s: ScatterGatherBuffer(s, True)])
+def test_read_only_segment_is_rejected_for_data_in(make):
+    with pytest.raises(TypeError):
+        make([bytearray(4), b'read-only'])
+
+
+def test_read_only_segments_are_accepted_for_data_out():
+    assert len(IovecArray([b'abc', bytearray(2)])) == 5
+
+
+def test_request_reset_keeps_iovec_length():
+    req = Request(command(READ_10), data_in=[bytearray(512), bytearray(512)])
+    assert req._hdr.iovec_count == 2
+    with pytest.raises(ValueError):
+        req.reset(512)
+    with pytest.raises(ValueError):
+        req.reset(2048)
+    req.reset(1024)
+    assert req._hdr.dxfer_len == 1024
+
+
+def test_request_reset_shortens_plain_buffer():
+    req = Request(command(READ_10), data_in=bytearray(1024))
+    req.reset(512)
+    assert req._hdr.dxfer_len == 512
+    assert req._hdr.iovec_count == 0
+
+
+def test_sgio_pt_object_sends_segments_without_bounce_buffer():
+    segments = [bytearray(4), bytearray(), bytearray(8)]
+    obj = SGIOPTObject(command(READ_10), data_in=segments)
+    hdr = obj._hdr
+    assert isinstance(obj.data, IovecArray)
+    assert hdr.iovec_count == 3
+    assert hdr.dxfer_len == 12
+    assert hdr.dxfer_direction == _pysg.lib.SG_DXFER_FROM_DEV
+    assert hdr.dxferp == obj.data.ptr
+
+    obj.reset(command(WRITE_10), data_out=b'single')
+    assert obj._hdr.iovec_count == 0
+    assert obj._hdr.dxfer_direction == _pysg.lib.SG_DXFER_TO_DEV
+
+
+class FakeSGIO(SGIOPTObject):
+    # ioctl 대신 data buffer 앞쪽 `filled` byte 를 채우고 나머지는 resid 로 보고한다.
+    filled = 0
+
+    def _ioctl(self, fd):
+        hdr = self._hdr
+        _pysg.ffi.memmove(hdr.dxferp, bytes(range(1, self.filled + 1)), self.filled)
+        hdr.resid = hdr.dxfer_len - self.filled
+
+
+class NoDevice(object):
+    def fileno(self):
+        return -1
+
+
+def test_sgio_pt_object_flushes_bounce_buffer():
+    target = bytearray(b'\xee' * 9)
+    data_in = Buffer.from_buffer(memoryview(target)[1:], True, alignment=4096)
+    assert isinstance(data_in, BounceBuffer)
+    obj = FakeSGIO(command(READ_10), data_in=data_in)
+    obj.filled = 5
+    assert obj.try_scsi_pt(NoDevice()).ok
+    assert obj.resid == 3
+    assert target == bytearray(b'\xee\x01\x02\x03\x04\x05\xee\xee\xee')
+
+
+def test_sgio_pt_object_has_no_sg_pt_object():
+    obj = SGIOPTObject(command(READ_10), data_in=[bytearray(4)])
+    assert obj._obj is None
+    obj.reset(command(READ_10), data_in=[bytearray(8)])
+    assert obj._hdr.dxfer_len == 8
+    obj.release()
+    obj.close()
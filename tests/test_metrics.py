@@ -0,0 +1,101 @@
+import random
+import re
+
+import pytest
+
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.enum import SenseKeyCodes
+from pysg.metrics import DeviceMetrics, LatencyHistogram
+
+BLOCK = 512
+TUR = b'\x00' * 6
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+@pytest.mark.parametrize('precision', [3, 7])
+def test_buckets_bound_relative_error(precision):
+    hist = LatencyHistogram(precision)
+    rng = random.Random(precision)
+    values = list(range(300)) + [rng.getrandbits(rng.randrange(1, 40)) for _ in range(2000)]
+    for value in values:
+        lo, hi = hist._bounds(hist._index(value))
+        assert lo <= value <= hi
+        assert hi - lo + 1 <= max(1, lo >> (precision - 1))
+    # bucket 들은 겹치지 않고 이어진다.
+    for idx in range(1, hist._index(1 << 40)):
+        assert hist._bounds(idx)[0] == hist._bounds(idx - 1)[1] + 1
+
+
+def test_percentiles_and_cumulative():
+    hist = LatencyHistogram()
+    assert hist.percentile(50) is None
+    for value in range(1, 101):
+        hist.record(value)
+    hist.record(-5)
+    assert (hist.count, hist.min, hist.max, hist.total) == (101, 0, 100, 5050)
+    assert hist.percentile(50) == 50
+    assert hist.percentile(100) == 100
+    assert hist.cumulative(10) == 11
+    assert hist.snapshot()['p99'] == 99
+
+    hist.record(1000)
+    lo, hi = hist._bounds(hist._index(1000))
+    assert hist.cumulative(hi) == hist.count
+    assert hist.cumulative(hi - 1) == hist.count - 1
+    assert hist.percentile(100) == 1000
+
+
+def test_merge():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    for value in (1, 2, 3):
+        a.record(value)
+    for value in (5000, 7):
+        b.record(value)
+    a.merge(b)
+    assert (a.count, a.min, a.max, a.total) == (5, 1, 5000, 5013)
+    assert a.percentile(100) == 5000
+    with pytest.raises(ValueError):
+        a.merge(LatencyHistogram(5))
+
+
+def test_device_metrics_and_prometheus(tmp_path):
+    target = EmulatedTarget(blocks=16)
+    with target.device('disk"0') as dev:
+        metrics = dev.enable_metrics()
+        buf = bytearray(2 * BLOCK)
+        for lba in range(4):
+            dev.command(read10(lba, 2), data_in=buf)
+        dev.command(command(bytes([0x2a, 0, 0, 0, 0, 0, 0, 0, 1, 0])),
+                    data_out=bytes(BLOCK))
+        target.inject(SenseKeyCodes.NOT_READY, 0x04, 0x01)
+        assert not dev.try_command(command(TUR))
+
+    assert metrics.latency(0x28).count == 4
+    assert metrics.latency(0x00).count == 1
+    assert (metrics.bytes_in, metrics.bytes_out) == (8 * BLOCK, BLOCK)
+    outcomes = metrics.snapshot()['outcomes']
+    assert outcomes['result'] == {'GOOD': 5, 'SENSE': 1}
+    assert outcomes['sense_key'] == {SenseKeyCodes.NOT_READY.name: 1}
+    assert set(metrics.snapshot()['commands']) == {'0x00', '0x28', '0x2a'}
+
+    text = metrics.to_prometheus()
+    assert 'device="disk\\"0"' in text
+    buckets = re.findall(r'pysg_command_latency_seconds_bucket\{[^}]*opcode="0x28"'
+                         r'[^}]*le="([^"]+)"\} (\d+)', text)
+    counts = [int(n) for _, n in buckets]
+    assert buckets[-1][0] == '+Inf' and counts[-1] == 4
+    assert counts == sorted(counts)
+    assert 'pysg_transferred_bytes_total{device="disk\\"0",direction="in"} 4096' in text
+
+    path = tmp_path / 'pysg.prom'
+    metrics.write_prometheus(str(path), prefix='test')
+    assert path.read_text().startswith('# HELP test_command_latency_seconds')
+    assert list(tmp_path.iterdir()) == [path]
+
+    metrics.reset()
+    assert metrics.snapshot()['commands'] == {}
@@ -0,0 +1,55 @@
+import errno
+
+import pytest
+
+from pysg import Buffer
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.mmapio import MmapIO
+
+BLOCK = 512
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+class FileDevice(object):
+    def __init__(self, f):
+        self._f = f
+        self._path = f.name
+
+    def fileno(self):
+        return self._f.fileno()
+
+
+def test_emulated_device_falls_back_to_plain_buffer():
+    target = EmulatedTarget(blocks=16)
+    target.storage[3 * BLOCK:5 * BLOCK] = b'\x5a' * (2 * BLOCK)
+    with target.device() as dev:
+        buf = dev.enable_mmap_io(2 * BLOCK)
+        assert type(buf) is Buffer and len(buf) == 2 * BLOCK
+        assert dev.mmap_io is None
+        obj = dev.command(read10(3, 2), data_in=buf)
+        assert obj.data is buf
+        assert bytes(buf.buffer) == b'\x5a' * (2 * BLOCK)
+        # 모드를 켜지 못했으므로 호출할 때마다 새 buffer 를 받는다.
+        assert dev.enable_mmap_io(BLOCK) is not buf
+
+
+def test_mmap_io_requires_sg_device(tmp_path):
+    with EmulatedTarget().device() as dev:
+        with pytest.raises(OSError) as info:
+            MmapIO(dev, BLOCK)
+        assert info.value.errno == errno.ENOTTY
+
+    path = tmp_path / 'disk.img'
+    path.write_bytes(bytes(4 * BLOCK))
+    with open(str(path), 'r+b') as f:
+        with pytest.raises(OSError) as info:
+            MmapIO(FileDevice(f), BLOCK)
+        assert info.value.errno == errno.ENOTTY
+        assert str(path) in str(info.value)
+    # 일반 파일의 내용이 매핑되거나 바뀌지 않는다.
+    assert path.read_bytes() == bytes(4 * BLOCK)
@@ -0,0 +1,77 @@
+import pytest
+
+from pysg.cmd import command
+from pysg.device import CheckConditionError, Device
+from pysg.emulation import EmulatedPTObject, EmulatedTarget, EmulatedTransport
+from pysg.enum import DoPTResult, SenseKeyCodes
+
+TUR = b'\x00' * 6
+
+
+class Scripted(EmulatedPTObject):
+    # 시도마다 'timeout', 'ua', 'ok' 중 하나로 동작하고 받은 timeout 을 남긴다.
+    script = []
+    timeouts = []
+
+    def _execute(self, device, timeout, *args):
+        self.timeouts.append(timeout)
+        step = self.script.pop(0)
+        if step == 'timeout':
+            return DoPTResult.TIMEOUT
+        if step == 'ua':
+            device.transport.target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        return super()._execute(device, timeout, *args)
+
+
+class ScriptedTransport(EmulatedTransport):
+    @property
+    def pt_class(self) -> type:
+        return Scripted
+
+
+def scripted(*steps):
+    Scripted.script = list(steps)
+    Scripted.timeouts = []
+    return Device('scripted', transport=ScriptedTransport(EmulatedTarget()))
+
+
+def test_timeout_grows_with_consecutive_timeouts():
+    with scripted('timeout', 'timeout', 'ua', 'timeout', 'ok') as dev:
+        policy = dev.enable_retry_policy(default_timeout=5, max_timeout=60,
+                                         max_retries=5, backoff=0)
+        dev.command(command(TUR))
+    assert Scripted.timeouts == [5, 10, 20, 5, 10]
+    assert policy.counters['recovered'] == 1
+
+
+def test_float_timeout_grows_and_is_capped():
+    with scripted('timeout', 'timeout', 'timeout', 'ok') as dev:
+        dev.enable_retry_policy(default_timeout=2.5, max_timeout=8,
+                                max_retries=3, backoff=0)
+        dev.command(command(TUR))
+    assert Scripted.timeouts == [2.5, 5.0, 8, 8]
+
+
+def test_exhausted_timeouts_raise():
+    with scripted('timeout', 'timeout') as dev:
+        policy = dev.enable_retry_policy(max_retries=1, backoff=0)
+        with pytest.raises(OSError):
+            dev.command(command(TUR))
+    assert policy.counters['exhausted'] == 1
+
+
+def test_profiled_command_follows_policy():
+    target = EmulatedTarget()
+    with target.device() as dev:
+        profiler = dev.enable_profiler()
+        policy = dev.enable_retry_policy(backoff=0)
+        target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        dev.command(command(TUR))
+        assert policy.counters['recovered'] == 1
+
+        target.inject(SenseKeyCodes.MEDIUM_ERROR, 0x11, 0x00)
+        with pytest.raises(CheckConditionError):
+            dev.command(command(TUR))
+        assert policy.counters['failed'] == 1
+    assert profiler.commands == 2
+    assert profiler.stats()['ioctl']['count'] == 3
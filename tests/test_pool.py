@@ -0,0 +1,98 @@
+import gc
+
+from pysg import _pysg
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+from pysg.enum import SenseKeyCodes
+from pysg.pool import PAGE_SIZE, BufferPool, PooledBuffer
+
+BLOCK = 512
+
+
+def address(buf):
+    return int(_pysg.ffi.cast('uintptr_t', buf.ptr))
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+def test_buffers_are_page_aligned():
+    pool = BufferPool(slab_size=64 << 10)
+    bufs = [pool.acquire(size) for size in (1, 512, 513, 4096, 5000, 65536) * 3]
+    for buf in bufs:
+        assert address(buf) % PAGE_SIZE == 0
+    assert len({address(buf) for buf in bufs}) == len(bufs)
+    assert [len(buf) for buf in bufs[:6]] == [1, 512, 513, 4096, 5000, 65536]
+
+
+def test_released_slot_is_reused():
+    pool = BufferPool()
+    buf = pool.acquire(1000)
+    first = address(buf)
+    with buf:
+        pass
+    buf.release()
+    assert pool.stats()['in_use'] == 0
+    assert address(pool.acquire(700)) == first
+    stats = pool.stats()
+    assert (stats['hits'], stats['misses'], stats['slabs']) == (1, 1, 1)
+
+
+def test_dropped_buffer_returns_on_gc():
+    pool = BufferPool()
+    buf = pool.acquire(4096)
+    first = address(buf)
+    del buf
+    gc.collect()
+    assert pool.stats()['in_use'] == 0
+    assert address(pool.acquire(4096)) == first
+
+
+def test_oversized_and_over_budget_requests_bypass_pool():
+    pool = BufferPool(max_class=4096, slab_size=8192, max_bytes=8192)
+    big = pool.acquire(8192)
+    assert big._slab is None and len(big) == 8192
+    held = [pool.acquire(4096), pool.acquire(4096)]
+    extra = pool.acquire(4096)
+    assert extra._slab is None
+    assert pool.footprint == 8192
+    del held, extra
+    gc.collect()
+    pool.trim()
+    assert pool.footprint == 0
+    assert pool.stats()['evictions'] == 1
+
+
+def test_device_takes_sized_buffers_from_pool():
+    target = EmulatedTarget(blocks=16)
+    target.storage[3 * BLOCK:4 * BLOCK] = b'\x5a' * BLOCK
+    with target.device() as dev:
+        pool = dev.enable_buffer_pool()
+        obj = dev.command(read10(3), data_in=BLOCK)
+        assert isinstance(obj.data, PooledBuffer)
+        assert bytes(obj.data.buffer) == b'\x5a' * BLOCK
+        assert pool.stats()['in_use'] == PAGE_SIZE
+        obj.release()
+        assert pool.stats()['in_use'] == 0
+
+        # 다시 시도해도 같은 buffer 를 사용하고, 사용자의 buffer 는 돌려보내지 않는다.
+        dev.enable_retry_policy(backoff=0)
+        target.inject(SenseKeyCodes.UNIT_ATTENTION, 0x29, 0x00)
+        own = pool.acquire(BLOCK)
+        status = dev.try_command(read10(3), data_in=BLOCK)
+        assert status and bytes(status.obj.data.buffer) == b'\x5a' * BLOCK
+        status.obj.release()
+        with dev.command(read10(3), data_in=own):
+            pass
+        assert pool.stats()['in_use'] == PAGE_SIZE
+
+
+def test_sized_buffer_without_pool():
+    target = EmulatedTarget(blocks=16)
+    target.storage[:BLOCK] = b'\xa5' * BLOCK
+    with target.device() as dev:
+        obj = dev.command(read10(0), data_in=BLOCK)
+    assert not isinstance(obj.data, PooledBuffer)
+    assert bytes(obj.data.buffer) == b'\xa5' * BLOCK
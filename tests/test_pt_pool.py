@@ -0,0 +1,84 @@
+import pytest
+
+from pysg.cmd import command
+from pysg.device import CheckConditionError, PTObjectPool
+from pysg.emulation import EmulatedPTObject, EmulatedTarget
+from pysg.enum import PTResult, SenseKeyCodes
+
+BLOCK = 512
+TUR = b'\x00' * 6
+
+
+def read10(lba, blocks=1):
+    return command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                   bytes([0]) + blocks.to_bytes(2, 'big') + bytes(1))
+
+
+def test_pool_prefills_and_reuses_objects():
+    pool = PTObjectPool(size=2, pt_class=EmulatedPTObject)
+    assert len(pool) == 2
+    obj = pool.acquire(command(TUR))
+    assert len(pool) == 1
+    assert obj.cmd is not None
+    obj.release()
+    assert len(pool) == 2
+    assert obj.cmd is None and obj.data is None
+    assert pool.acquire(command(TUR)) is obj
+    pool.close()
+    assert len(pool) == 0
+
+
+def test_pool_closes_objects_beyond_its_size():
+    pool = PTObjectPool(size=1, prefill=False, pt_class=EmulatedPTObject)
+    first = pool.acquire(command(TUR))
+    second = pool.acquire(command(TUR))
+    first.release()
+    second.release()
+    assert len(pool) == 1
+    assert second._obj is None
+    # 이미 닫힌 객체는 다시 돌려보내도 pool 에 들어가지 않는다.
+    second.release()
+    assert len(pool) == 1
+
+
+def test_reset_clears_previous_command():
+    target = EmulatedTarget(blocks=16)
+    target.storage[BLOCK:2 * BLOCK] = b'\x11' * BLOCK
+    with target.device() as dev:
+        obj = EmulatedPTObject(command(TUR))
+        target.inject(SenseKeyCodes.NOT_READY, 0x04, 0x01)
+        assert obj.try_scsi_pt(dev).category is PTResult.SENSE
+        assert obj.sense.record.asc == 0x04
+
+        buf = bytearray(BLOCK)
+        obj.reset(read10(1), data_in=buf)
+        assert bytes(obj.sense.buffer) == bytes(len(obj.sense.buffer))
+        assert obj.sense.record is None
+        obj.do_scsi_pt(dev)
+        assert buf == b'\x11' * BLOCK
+
+        obj.reset(command(TUR), sense_size=64)
+        assert len(obj.sense) == 64
+        assert obj.data is None
+        assert obj.try_scsi_pt(dev).ok
+        obj.close()
+
+
+def test_device_pool_recycles_successful_commands():
+    target = EmulatedTarget(blocks=16)
+    with target.device() as dev:
+        pool = dev.enable_pt_pool(size=4)
+        assert dev.enable_pt_pool() is pool
+        with dev.command(command(TUR)) as obj:
+            pass
+        assert len(pool) == 4
+        assert dev.command(command(TUR)) is obj
+        obj.release()
+
+        # 실패한 command 의 객체는 예외가 sense 를 참조하므로 돌아오지 않는다.
+        target.inject(SenseKeyCodes.MEDIUM_ERROR, 0x11, 0x00)
+        with pytest.raises(CheckConditionError) as info:
+            dev.command(command(TUR))
+        assert len(pool) == 3
+        assert info.value.sense.record.asc == 0x11
+    assert dev.pt_pool is None
@@ -0,0 +1,84 @@
+from pysg.sense import (ATAReturnDescriptor, CommandSpecificDescriptor,
+                        DescriptorTypes, DescriptorView, InformationDescriptor,
+                        Sense, SenseDescriptor, SenseKeySpecificDescriptor)
+
+INFORMATION = b'\x00\x0a\x80\x00' + (0x1122334455667788).to_bytes(8, 'big')
+COMMAND_SPECIFIC = b'\x01\x0a\x00\x00' + (0xdeadbeef).to_bytes(8, 'big')
+PROGRESS = b'\x02\x06\x00\x00\x80\x40\x00\x00'
+ATA_RETURN = bytes([0x09, 0x0c, 0x01, 0x04, 0x00, 0x08,
+                    0x11, 0x21, 0x12, 0x22, 0x13, 0x23, 0x40, 0x51])
+VENDOR = b'\x80\x02\xaa\xbb'
+
+
+def descriptor_sense(*descs, sense_key=0x02, asc=0x04, ascq=0x04, size=96):
+    body = b''.join(descs)
+    sb = bytes([0x72, sense_key, asc, ascq, 0, 0, 0, len(body)]) + body
+    return Sense(init=sb.ljust(size, b'\x00'))
+
+
+def test_descriptors_are_typed_views():
+    sense = descriptor_sense(INFORMATION, COMMAND_SPECIFIC, PROGRESS,
+                             ATA_RETURN, VENDOR)
+    descs = list(sense.descriptors())
+    assert [type(d) for d in descs] == [InformationDescriptor, CommandSpecificDescriptor,
+                                        SenseKeySpecificDescriptor, ATAReturnDescriptor,
+                                        DescriptorView]
+    assert [d.type for d in descs[:4]] == [DescriptorTypes.Information,
+                                           DescriptorTypes.CommandSpecificInformation,
+                                           DescriptorTypes.SenseKeySpecific,
+                                           DescriptorTypes.ATAReturn]
+    assert descs[4].type == 0x80 and descs[4].additional_length == 2
+
+    info, cmd_specific, sks, ata, _ = descs
+    assert info.valid and info.information == 0x1122334455667788
+    assert cmd_specific.information == 0xdeadbeef
+    assert sks.sksv and sks.progress == 0.25
+    assert sks.sense_key_specific == 0x004000
+    assert (ata.extend, ata.error, ata.count) == (True, 0x04, 0x0008)
+    # SAT 의 ATA Return descriptor 는 LBA byte 들을 번갈아 배치한다.
+    assert ata.lba == 0x131211232221
+    assert (ata.device, ata.status) == (0x40, 0x51)
+
+
+def test_views_alias_the_sense_buffer():
+    sense = descriptor_sense(INFORMATION)
+    info = next(sense.descriptors())
+    sense.buffer[19:20] = b'\x99'
+    assert info.information == 0x1122334455667799
+    copied = sense.descriptor(DescriptorTypes.Information)
+    assert isinstance(copied, SenseDescriptor)
+    sense.buffer[19:20] = b'\x00'
+    assert copied[11] == 0x99
+
+
+def test_unexpected_lengths_fall_back_to_plain_view():
+    short_info = b'\x00\x06\x80\x00\x00\x00\x00\x01'
+    sense = descriptor_sense(short_info, PROGRESS)
+    descs = list(sense.descriptors())
+    assert type(descs[0]) is DescriptorView
+    assert descs[0].type is DescriptorTypes.Information
+    assert type(descs[1]) is SenseKeySpecificDescriptor
+
+
+def test_truncated_descriptor_list():
+    # additional length 가 마지막 descriptor 의 중간에서 끝난다.
+    sb = bytearray(descriptor_sense(INFORMATION, PROGRESS).buffer)
+    sb[7] = len(INFORMATION) + 1
+    descs = list(Sense(init=bytes(sb)).descriptors())
+    assert [len(d) for d in descs] == [12, 1]
+    assert type(descs[1]) is DescriptorView
+
+
+def test_fixed_format_has_no_descriptors():
+    sb = bytearray(18)
+    sb[0], sb[2], sb[7], sb[12] = 0x70, 0x03, 10, 0x11
+    sense = Sense(init=bytes(sb))
+    assert list(sense.descriptors()) == []
+    assert sense.descriptor(DescriptorTypes.Information) is None
+    assert sense.record.asc == 0x11
+
+
+def test_record_uses_descriptors():
+    rec = descriptor_sense(INFORMATION, PROGRESS, sense_key=0x00).record
+    assert rec.information == 0x1122334455667788
+    assert rec.progress == 0x4000
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pysg.sense import decode_sense
+from pysg.senselog import SenseLog
+
+STRIDE = 32
+
+
+def fixed(rc=0x70, sk=0x02, asc=0x04, ascq=0x01, info=None, progress=None,
+          add_len=10):
+    sb = bytearray(STRIDE)
+    sb[0] = rc | (0x80 if info is not None else 0)
+    sb[2] = sk
+    if info is not None:
+        sb[3:7] = info.to_bytes(4, 'big')
+    sb[7] = add_len
+    sb[12], sb[13] = asc, ascq
+    if progress is not None:
+        sb[15] = 0x80
+        sb[16:18] = progress.to_bytes(2, 'big')
+    return bytes(sb)
+
+
+def descriptor(rc=0x72, sk=0x03, asc=0x11, ascq=0x00, info=None, progress=None):
+    descs = b''
+    if info is not None:
+        descs += b'\x00\x0a\x80\x00' + info.to_bytes(8, 'big')
+    if progress is not None:
+        descs += b'\x02\x06\x00\x00\x80' + progress.to_bytes(2, 'big') + b'\x00'
+    sb = bytes([rc, sk, asc, ascq, 0, 0, 0, len(descs)]) + descs
+    return sb.ljust(STRIDE, b'\x00')
+
+
+CRAFTED = [
+    fixed(),
+    fixed(info=0x12345678),
+    fixed(sk=0x02, progress=0x8000),
+    fixed(add_len=4),
+    fixed(rc=0x71, sk=0x06, asc=0x29, ascq=0x00),
+    descriptor(),
+    descriptor(info=0x1122334455667788),
+    descriptor(sk=0x00, progress=0x4000),
+    descriptor(rc=0x73, sk=0x06, asc=0x29, ascq=0x00, info=7),
+    bytes(STRIDE),
+    b'\x74' + fixed()[1:],
+    b'\x7f' + descriptor()[1:],
+    b'\xf5' + fixed()[1:],
+    b'\x6f' + fixed()[1:],
+]
+
+
+def assert_matches(log, rows):
+    for i, sb in enumerate(rows):
+        rec = decode_sense(sb)
+        assert bool(log.valid[i]) == (rec is not None), (i, sb)
+        if rec is None:
+            continue
+        assert log.response_code[i] == rec.response_code, i
+        assert log.sense_key[i] == int(rec.sense_key), i
+        assert (log.asc[i], log.ascq[i]) == (rec.asc, rec.ascq), i
+        if rec.information is None:
+            assert not log.info_valid[i], i
+        else:
+            assert log.info_valid[i] and log.information[i] == rec.information, i
+        expected = -1 if rec.progress is None else rec.progress
+        assert log.progress[i] == expected, i
+
+
+def test_crafted_buffers_match_decode_sense():
+    log = SenseLog(b''.join(CRAFTED), stride=STRIDE)
+    assert len(log) == len(CRAFTED)
+    assert_matches(log, CRAFTED)
+
+
+def test_invalid_response_codes_are_rejected():
+    rows = [bytes([rc]) + fixed()[1:] for rc in range(0x100)]
+    log = SenseLog(np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(-1, STRIDE))
+    expected = [0x70 <= (rc & 0x7f) <= 0x73 for rc in range(0x100)]
+    assert log.valid.tolist() == expected
+    assert_matches(log, rows)
+
+
+def test_random_buffers_match_decode_sense():
+    rng = random.Random(0)
+    rows = []
+    for _ in range(2000):
+        sb = bytearray(rng.getrandbits(8) for _ in range(STRIDE))
+        sb[0] = rng.choice([0x70, 0x71, 0x72, 0x73, 0xf0, 0xf2, 0x74, 0x00]) | \
+                (sb[0] & 0x80)
+        # descriptor 를 포함하도록 additional length 를 buffer 안으로 줄인다.
+        sb[7] %= STRIDE
+        rows.append(bytes(sb))
+    log = SenseLog(b''.join(rows), stride=STRIDE)
+    assert_matches(log, rows)
+
+
+def test_short_buffers_have_sense_key_zero():
+    from pysg.sense import Sense
+
+    rows = [fixed()[:2], descriptor()[:1]]
+    for sb in rows:
+        assert_matches(SenseLog(sb, stride=len(sb)), [sb])
+        # sg_scsi_normalize_sense() 는 0, sg_get_sense_key() 는 -1 이다.
+        assert decode_sense(sb).sense_key == 0
+        assert Sense(init=sb).normalize().sense_key == 0
+        assert Sense(init=sb).sense_key == -1
+    assert Sense(init=descriptor()[:2]).sense_key == 3
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from pysg.emulation import EmulatedTarget
+
+BLOCK = 512
+
+
+@pytest.mark.parametrize('depth', [1, 2, 4])
+def test_writer_keeps_depth_commands_in_flight(depth):
+    target = EmulatedTarget(blocks=256, max_transfer_blocks=8)
+    data = os.urandom(256 * BLOCK)
+    with target.device() as dev:
+        sink = dev.write_stream(depth=depth)
+        submit = sink._submit
+        peak = []
+
+        def counting(slot, lba, count):
+            submit(slot, lba, count)
+            peak.append(len(sink._inflight))
+
+        sink._submit = counting
+        with sink:
+            for offset in range(0, len(data), 1000):
+                sink.write(data[offset:offset + 1000])
+        assert max(peak) <= depth
+        assert sink.written == len(data)
+
+        read = b''.join(bytes(chunk) for chunk in dev.read_stream(depth=depth))
+    assert read == data
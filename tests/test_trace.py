@@ -0,0 +1,43 @@
+import struct
+
+import pytest
+
+from pysg import trace
+from pysg.cmd import command
+from pysg.emulation import EmulatedTarget
+
+
+def test_swapped_block_holds_little_endian_values():
+    offsets, size = trace._layout(2)
+    block = bytearray(size)
+    struct.pack_into('=QQ', block, offsets['t_ns'], 0x0102030405060708, 9)
+    struct.pack_into('=ii', block, offsets['resid'], -2, 0x11223344)
+    block[offsets['cdb']] = 0x28
+
+    swapped = trace._swap_columns(block, offsets, 2)
+    other = '>' if trace._NATIVE_LE else '<'
+    assert struct.unpack_from(other + 'QQ', swapped, offsets['t_ns']) == \
+        (0x0102030405060708, 9)
+    assert struct.unpack_from(other + 'ii', swapped, offsets['resid']) == \
+        (-2, 0x11223344)
+    assert swapped[offsets['cdb']] == 0x28
+
+
+def test_recorded_trace_reads_back(tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'trace.bin')
+    target = EmulatedTarget(blocks=64)
+    with target.device() as dev:
+        dev.enable_trace(path, block_records=4)
+        for lba in range(6):
+            dev.command(command(bytes([0x28, 0]) + lba.to_bytes(4, 'big') +
+                                bytes([0, 0, 1, 0])), data_in=bytearray(512))
+        dev.stop_trace()
+
+    t = trace.Trace(path)
+    assert len(t) == 6
+    assert list(t.length) == [512] * 6
+    assert list(t.opcode) == [0x28] * 6
+    assert [t.cdb_bytes(i)[5] for i in range(6)] == list(range(6))
+    assert (t.duration_ns > 0).all()
+    assert list(t.t_ns) == sorted(t.t_ns)
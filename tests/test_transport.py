@@ -0,0 +1,19 @@
+import pytest
+
+from pysg.emulation import EmulatedTarget, EmulatedTransport
+from pysg.transport import Transport
+
+
+def test_transport_requires_open_close_and_backends():
+    class Incomplete(Transport):
+        def open(self, path, readonly, verbose, flags):
+            return -1
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_emulated_transport_is_complete():
+    transport = EmulatedTransport(EmulatedTarget())
+    assert isinstance(transport, Transport)
+    assert transport.iovec_pt_class(None) is None